@@ -0,0 +1,88 @@
+// ส่งงานหนัก (บันทึกคะแนน / ดาวน์โหลด PDF, Excel) ไปทำงานเบื้องหลัง แล้วรอจนเสร็จ
+(function () {
+    function pollJob(data, onDone, onProgress) {
+        fetch(data.status_url, { credentials: 'same-origin' })
+            .then(function (response) { return response.json(); })
+            .then(function (job) {
+                if (onProgress) onProgress(job);
+                if (job.status === 'done') {
+                    onDone(job);
+                } else if (job.status === 'failed') {
+                    alert('เกิดข้อผิดพลาด: ' + job.error);
+                } else {
+                    setTimeout(function () { pollJob(data, onDone, onProgress); }, 1500);
+                }
+            });
+    }
+
+    function finish(data, job) {
+        if (data.redirect_url) {
+            window.location.href = data.redirect_url;
+        } else if (job.has_file) {
+            window.location.href = data.download_url;
+        } else if (job.result && job.result.rows !== undefined) {
+            var message = 'นำเข้าคะแนน ' + job.result.cells + ' รายการ จาก ' + job.result.imported + ' คน';
+            if (job.result.errors.length) {
+                message += '\nพบข้อผิดพลาด ' + job.result.errors.length + ' รายการ:\n' + job.result.errors.slice(0, 20).join('\n');
+            }
+            alert(message);
+        }
+    }
+
+    function submitInBackground(form, onProgress) {
+        var method = (form.method || 'get').toUpperCase();
+        var formData = new FormData(form);
+        formData.append('background', '1');
+        var url = form.action || window.location.href;
+        var options = { method: method, credentials: 'same-origin' };
+        if (method === 'GET') {
+            url += (url.indexOf('?') === -1 ? '?' : '&') + new URLSearchParams(formData).toString();
+        } else {
+            options.body = formData;
+        }
+        return fetch(url, options).then(function (response) {
+            if (response.status === 400) {
+                return response.json().then(function (data) { alert(data.error); });
+            }
+            if (response.status !== 202) {
+                // เซิร์ฟเวอร์ตอบกลับแบบปกติ (เช่น ข้อมูลไม่ถูกต้อง) ให้ส่งฟอร์มตามปกติแทน
+                form.submit();
+                return;
+            }
+            return response.json().then(function (data) {
+                pollJob(data, function (job) { finish(data, job); }, onProgress);
+            });
+        });
+    }
+
+    function startLink(link, onProgress) {
+        var url = link.href + (link.href.indexOf('?') === -1 ? '?' : '&') + 'background=1';
+        return fetch(url, { credentials: 'same-origin' }).then(function (response) {
+            return response.json().then(function (data) {
+                pollJob(data, function (job) { finish(data, job); }, onProgress);
+            });
+        });
+    }
+
+    document.addEventListener('submit', function (event) {
+        var form = event.target;
+        if (!form.hasAttribute('data-background-job')) return;
+        event.preventDefault();
+        submitInBackground(form, showProgress(form));
+    });
+
+    document.addEventListener('click', function (event) {
+        var link = event.target.closest('a[data-background-job]');
+        if (!link) return;
+        event.preventDefault();
+        startLink(link, showProgress(link));
+    });
+
+    function showProgress(element) {
+        var label = element.querySelector('[data-job-progress]');
+        if (!label) return null;
+        return function (job) {
+            label.textContent = job.total ? ' (' + Math.round(job.progress * 100 / job.total) + '%)' : ' …';
+        };
+    }
+})();
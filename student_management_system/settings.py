@@ -157,6 +157,21 @@ DATABASES = {
 #     }
 # }
 
+# Cache: ใช้ไฟล์ร่วมกันระหว่าง gunicorn workers ทุกตัว
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_DIR', default=os.path.join(BASE_DIR, 'cache')),
+    }
+}
+
+# ไฟล์รายงานที่สร้างแล้ว (MEDIA_ROOT/report_cache) ลบไฟล์ที่ใช้นานที่สุดเมื่อเกินขนาดนี้
+REPORT_CACHE_MAX_BYTES = config('REPORT_CACHE_MAX_BYTES', default=200 * 1024 * 1024, cast=int)
+
+# งานเบื้องหลัง: งานที่ running นานเกินนี้ (วินาที) ถือว่า worker ตาย, งานที่เสร็จแล้วเก็บไว้กี่วัน
+JOB_TIMEOUT = config('JOB_TIMEOUT', default=60 * 60, cast=int)
+JOB_KEEP_DAYS = config('JOB_KEEP_DAYS', default=7, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,83 @@
+# students/academic_years.py
+"""
+Registry of academic years that have results.
+
+The AcademicYear table holds one row per (Gregorian) year seen in
+StudentHistory, and the sorted list is kept in the cache, so year dropdowns
+no longer need a DISTINCT scan of the history table on every request.
+Writers call :func:`register_academic_years`; ``manage.py check_academic_years``
+compares the registry with the history table and can add missing years.
+
+Admins also edit AcademicYear directly (a year set up before its first
+results, sometimes typed as พ.ศ.), so rows are never deleted here and
+Buddhist-era years are read as their Gregorian year.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import AcademicYear, StudentHistory
+
+CACHE_KEY = 'students:academic_years'
+
+
+def gregorian_year(year):
+    year = int(year)
+    return year - 543 if year > 2500 else year  # แปลง พ.ศ. → ค.ศ.
+
+
+def get_academic_years():
+    """Known academic years (Gregorian ints), newest first."""
+    years = cache.get(CACHE_KEY)
+    if years is None:
+        years = sorted(
+            {gregorian_year(year) for year in AcademicYear.objects.values_list('year', flat=True)},
+            reverse=True,
+        )
+        cache.set(CACHE_KEY, years, None)
+    return years
+
+
+def register_academic_years(years):
+    """Make sure every year in ``years`` is in the registry; cheap when already known."""
+    new_years = {int(year) for year in years if str(year).isdigit()} - set(get_academic_years())
+    if not new_years:
+        return
+    AcademicYear.objects.bulk_create(
+        [AcademicYear(year=year) for year in new_years],
+        ignore_conflicts=True,
+    )
+    # ล้าง cache หลัง commit เพื่อไม่ให้ request อื่นอ่านรายการเก่ากลับเข้า cache
+    transaction.on_commit(invalidate_academic_years)
+
+
+def invalidate_academic_years():
+    cache.delete(CACHE_KEY)
+
+
+def history_academic_years():
+    """Years actually present in StudentHistory (the full DISTINCT scan)."""
+    return {
+        int(year)
+        for year in StudentHistory.objects.values_list('academic_year', flat=True).distinct()
+        if year and str(year).isdigit()
+    }
+
+
+def check_academic_years(fix=False):
+    """
+    Compare the registry with StudentHistory.
+
+    Returns:
+        tuple: ``(missing, stale)`` - years in history but not registered, and
+        registered years (as stored) with no history rows yet. With
+        ``fix=True`` missing years are added; stale ones are only reported,
+        since they may be set up ahead of their results.
+    """
+    registered = set(AcademicYear.objects.values_list('year', flat=True))
+    actual = history_academic_years()
+    missing = actual - {gregorian_year(year) for year in registered}
+    stale = {year for year in registered if gregorian_year(year) not in actual}
+    if fix and missing:
+        AcademicYear.objects.bulk_create([AcademicYear(year=year) for year in missing], ignore_conflicts=True)
+        invalidate_academic_years()
+    return sorted(missing), sorted(stale)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import *
+from .search import search_students
 from django import forms
 
 @admin.register(Province)
@@ -137,6 +138,10 @@ class StudentAdmin(admin.ModelAdmin):
         'profile_picture',
         'status',
     ]
+
+    def get_search_results(self, request, queryset, search_term):
+        """ค้นหาจาก search index (ชื่อไทย/อังกฤษ/อาหรับ, รหัสนักเรียน, เลขบัตรประชาชน)"""
+        return search_students(queryset, search_term), False
     
 
     def name_info(self, obj):
@@ -204,11 +209,25 @@ class SubjectToStudyAdmin(admin.ModelAdmin):
 
 @admin.register(StudentHistory)
 class StudentHistoryAdmin(admin.ModelAdmin):
-    list_display = ('student_name', 'level_name', 'category', 'academic_year', 'total_marks', 'obtained_marks','grade_percentage', 'pass_or_fail')
+    list_display = ('student_name', 'level_name', 'category', 'academic_year', 'total_marks', 'obtained_marks','grade_percentage', 'pass_or_fail', 'class_rank')
     search_fields = ['student_name']
     list_filter = ['level_name', 'category']
 
 
+@admin.register(StudentSubjectResult)
+class StudentSubjectResultAdmin(admin.ModelAdmin):
+    list_display = ('history', 'subject', 'marks_obtained')
+    list_filter = ['subject']
+    raw_id_fields = ('history',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'total', 'attempts', 'created_at', 'finished_at')
+    list_filter = ['status', 'kind']
+    readonly_fields = ('error', 'result', 'result_file', 'started_at', 'finished_at')
+
+
 @admin.register(School)
 class SchoolAdmin(admin.ModelAdmin):
     list_display = ('name', 'education_district')
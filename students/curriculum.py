@@ -0,0 +1,75 @@
+# students/curriculum.py
+"""
+Process-level curriculum matrix: level -> ordered SubjectToStudy rows.
+
+The matrix is built with one query (subjects and levels joined in) and kept
+in module memory. Subject, SubjectToStudy and Level signals call
+:func:`invalidate_curriculum`, which bumps a version number in the shared
+cache so that every process (web workers and ``run_worker``) rebuilds its
+copy on the next lookup instead of serving a stale curriculum.
+
+``Level.name`` is not unique: a name maps to every level carrying it, like
+the ``level__name__iexact`` filters used for students.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import SubjectToStudy
+
+VERSION_KEY = 'students:curriculum_version'
+
+_lock = threading.Lock()
+_matrix = {'version': None, 'by_level': {}, 'level_ids': {}}
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def build_matrix():
+    by_level = {}
+    level_ids = {}
+    for sts in SubjectToStudy.objects.select_related('subject', 'level').order_by('id'):
+        by_level.setdefault(sts.level_id, []).append(sts)
+        ids = level_ids.setdefault(sts.level.name.casefold(), [])
+        if sts.level_id not in ids:
+            ids.append(sts.level_id)
+    return by_level, level_ids
+
+
+def get_curriculum():
+    """Return ``{Level id: [SubjectToStudy, ...]}`` (ordered by id, ``subject`` and ``level`` loaded)."""
+    version = current_version()
+    if _matrix['version'] != version:
+        with _lock:
+            if _matrix['version'] != version:
+                by_level, level_ids = build_matrix()
+                _matrix.update(version=version, by_level=by_level, level_ids=level_ids)
+    return _matrix['by_level']
+
+
+def level_subjects(level_name):
+    """SubjectToStudy rows of every level named ``level_name`` (case-insensitive), in curriculum order."""
+    by_level = get_curriculum()
+    level_ids = _matrix['level_ids'].get((level_name or '').casefold(), [])
+    if len(level_ids) == 1:
+        return list(by_level[level_ids[0]])
+    return sorted((sts for level_id in level_ids for sts in by_level[level_id]), key=lambda sts: sts.id)
+
+
+def invalidate_curriculum():
+    def bump():
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        _matrix['version'] = None
+
+    bump()
+    # อีก process อาจสร้าง matrix จากข้อมูลก่อน commit แล้วเก็บไว้ใต้ version ใหม่
+    transaction.on_commit(bump)
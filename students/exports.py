@@ -0,0 +1,97 @@
+# students/exports.py
+"""
+Raw CSV / JSON Lines dumps of result data.
+
+Rows come from ``values_list(...).iterator()`` and are encoded one at a time
+by a generator, so a full-year dump starts streaming at once and needs the
+same memory whatever its size.
+"""
+import csv
+import json
+from decimal import Decimal
+
+from .models import StudentHistory, StudentSubjectResult
+
+CHUNK_SIZE = 2000
+
+DATASETS = {
+    'histories': (
+        StudentHistory,
+        [
+            ('id', 'id'),
+            ('student_id', 'student_id'),
+            ('student_name', 'student_name'),
+            ('school_name', 'school_name'),
+            ('level_name', 'level_name'),
+            ('academic_year', 'academic_year'),
+            ('category', 'category'),
+            ('total_marks', 'total_marks'),
+            ('obtained_marks', 'obtained_marks'),
+            ('grade_percentage', 'grade_percentage'),
+            ('pass_or_fail', 'pass_or_fail'),
+            ('class_rank', 'class_rank'),
+            ('class_size', 'class_size'),
+            ('unit_percentile', 'unit_percentile'),
+        ],
+        {'school': 'school_name', 'level': 'level_name', 'academic_year': 'academic_year'},
+    ),
+    'subject_marks': (
+        StudentSubjectResult,
+        [
+            ('history_id', 'history_id'),
+            ('student_id', 'history__student_id'),
+            ('student_name', 'history__student_name'),
+            ('school_name', 'history__school_name'),
+            ('level_name', 'history__level_name'),
+            ('academic_year', 'history__academic_year'),
+            ('subject_id', 'subject_id'),
+            ('subject_name', 'subject__name'),
+            ('category', 'subject__category'),
+            ('total_marks', 'subject__total_marks'),
+            ('marks_obtained', 'marks_obtained'),
+            ('subject_rank', 'subject_rank'),
+        ],
+        {'school': 'history__school_name', 'level': 'history__level_name', 'academic_year': 'history__academic_year'},
+    ),
+}
+
+
+class Echo:
+    """File-like object whose ``write`` returns the value, for csv.writer in a generator."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(dataset, params):
+    """Return ``(column names, row iterator)`` for ``dataset`` filtered by ``params``."""
+    model, columns, filters = DATASETS[dataset]
+    queryset = model.objects.filter(**{
+        lookup: params[key] for key, lookup in filters.items() if params.get(key)
+    }).order_by('pk')
+    names = [name for name, _ in columns]
+    rows = queryset.values_list(*[field for _, field in columns]).iterator(chunk_size=CHUNK_SIZE)
+    return names, rows
+
+
+def csv_lines(names, rows):
+    # BOM ให้ Excel เปิดภาษาไทยได้ถูกต้อง
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(names)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_value(value):
+    return float(value) if isinstance(value, Decimal) else str(value)
+
+
+def jsonl_lines(names, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), ensure_ascii=False, default=json_value) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv; charset=utf-8'),
+    'jsonl': (jsonl_lines, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,80 @@
+# students/facets.py
+"""
+Student counts for dashboards and list filters, in one query.
+
+:func:`student_counts` totals students per gender and special status with a
+single ``aggregate(Count(..., filter=Q(...)))``. :func:`student_facets`
+groups the (search-filtered) students once by school, level, year, gender
+and special status and rolls the groups up in Python into the count of
+every filter option. The count of an option ignores the filter on its own
+dimension (so other schools still show their counts once a school is
+picked) and applies all the others.
+"""
+from collections import Counter
+
+from django.db.models import Count, Q
+
+from .models import Student
+
+GENDERS = [value for value, _ in Student._meta.get_field('gender').choices]
+SPECIAL_STATUSES = [value for value, _ in Student._meta.get_field('special_status').choices]
+
+FACET_FIELDS = {
+    'school': 'current_study__school_id',
+    'level': 'current_study__level_id',
+    'academic_year': 'current_study__current_semester__year',
+    'gender': 'gender',
+    'special_status': 'special_status',
+}
+
+
+def student_counts(students):
+    """``total``, ``gender`` and ``special_status`` counts of ``students`` from one aggregate query."""
+    aggregates = {'total': Count('pk')}
+    for i, gender in enumerate(GENDERS):
+        aggregates[f'gender_{i}'] = Count('pk', filter=Q(gender=gender))
+    for i, status in enumerate(SPECIAL_STATUSES):
+        aggregates[f'status_{i}'] = Count('pk', filter=Q(special_status=status))
+    result = students.aggregate(**aggregates)
+    return {
+        'total': result['total'],
+        'gender': {gender: result[f'gender_{i}'] for i, gender in enumerate(GENDERS)},
+        'special_status': {status: result[f'status_{i}'] for i, status in enumerate(SPECIAL_STATUSES)},
+    }
+
+
+def student_facets(students, selected):
+    """
+    Filter-option counts of ``students`` under the active filters ``selected``.
+
+    Args:
+        students (QuerySet): students before the facet filters (search only).
+        selected (dict): active filter values by facet name (query-string strings).
+
+    Returns:
+        dict: ``total`` (students matching every filter), ``matched`` (per
+        facet, counts among those students) and ``facets`` (per facet,
+        option value -> count with the other filters applied).
+    """
+    active = {name: str(value) for name, value in selected.items() if name in FACET_FIELDS and value}
+    facets = {name: Counter() for name in FACET_FIELDS}
+    matched = {name: Counter() for name in FACET_FIELDS}
+    total = 0
+    groups = students.values(*FACET_FIELDS.values()).annotate(n=Count('pk')).order_by()
+    for group in groups:
+        values = {name: group[field] for name, field in FACET_FIELDS.items()}
+        misses = [name for name, value in active.items() if str(values[name]) != value]
+        if len(misses) > 1:
+            continue
+        for name, value in values.items():
+            if not misses or misses == [name]:
+                facets[name][value] += group['n']
+        if not misses:
+            total += group['n']
+            for name, value in values.items():
+                matched[name][value] += group['n']
+    return {
+        'total': total,
+        'matched': {name: dict(counts) for name, counts in matched.items()},
+        'facets': {name: dict(counts) for name, counts in facets.items()},
+    }
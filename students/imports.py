@@ -0,0 +1,171 @@
+# students/imports.py
+"""
+Streaming import of marks from an xlsx sheet.
+
+Expected layout (first worksheet)::
+
+    รหัสนักเรียน | ชื่อ-สกุล (optional) | <subject name> | <subject name> | ...
+
+Each row is one student; each subject column is matched by name to the
+SubjectToStudy of that student's current level. The workbook is read in
+openpyxl read-only mode and written in batches, so memory stays bounded
+whatever the file size.
+"""
+import openpyxl
+
+from .curriculum import get_curriculum
+from .marks import save_grade_sheet
+from .models import CurrentStudy
+
+STUDENT_ID_HEADERS = {'รหัสนักเรียน', 'student id', 'student_id', 'id'}
+NAME_HEADERS = {'ชื่อ-สกุล', 'ชื่อ', 'name'}
+MAX_ERRORS = 200
+
+
+class MarkImportError(ValueError):
+    """The sheet cannot be imported at all (bad header)."""
+
+
+def student_id_text(value):
+    """Student ids typed as numbers come back from Excel as int or float."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def read_header(header):
+    """Return ``(student id column, {column: subject name})`` from the header row."""
+    student_col = None
+    subject_cols = {}
+    for col, value in enumerate(header):
+        name = str(value).strip() if value is not None else ''
+        if not name:
+            continue
+        if name.lower() in STUDENT_ID_HEADERS:
+            student_col = col
+        elif name.lower() not in NAME_HEADERS:
+            subject_cols[col] = name
+    if student_col is None:
+        raise MarkImportError("ไม่พบคอลัมน์รหัสนักเรียน")
+    if not subject_cols:
+        raise MarkImportError("ไม่พบคอลัมน์วิชา")
+    return student_col, subject_cols
+
+
+def import_marks_workbook(file, academic_year, batch_size=500, progress=None):
+    """
+    Import marks for a whole exam unit from an xlsx file.
+
+    Args:
+        file: path or binary file object of the workbook.
+        academic_year (int): Gregorian academic year the marks belong to.
+        batch_size (int): rows written per transaction.
+        progress (callable): called as ``progress(rows done, total rows)``.
+
+    Returns:
+        dict: ``rows``, ``imported`` (students saved), ``cells`` and ``errors``
+        (first :data:`MAX_ERRORS` problems as ``"row N: ..."`` strings).
+
+    Raises:
+        MarkImportError: if the header row has no student id or subject column.
+    """
+    curriculum = {}
+    for level_id, level_subjects in get_curriculum().items():
+        for sts in level_subjects:
+            curriculum.setdefault(level_id, {}).setdefault(sts.subject.name, sts)
+    known_subjects = {name for subjects in curriculum.values() for name in subjects}
+
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        student_col, subject_cols = read_header(next(rows, ()))
+        unknown = sorted(set(subject_cols.values()) - known_subjects)
+        if unknown:
+            raise MarkImportError(f"ไม่รู้จักวิชา: {', '.join(unknown)}")
+
+        total_rows = max((ws.max_row or 1) - 1, 0)
+        summary = {'rows': 0, 'imported': 0, 'cells': 0, 'errors': []}
+        batch = []
+        for row_number, row in enumerate(rows, start=2):
+            if not row or all(value is None for value in row):
+                continue
+            batch.append((row_number, row))
+            if len(batch) >= batch_size:
+                flush_batch(batch, student_col, subject_cols, curriculum, academic_year, summary)
+                batch = []
+                if progress:
+                    progress(summary['rows'], total_rows)
+        if batch:
+            flush_batch(batch, student_col, subject_cols, curriculum, academic_year, summary)
+        if progress:
+            progress(summary['rows'], max(total_rows, summary['rows']))
+        return summary
+    finally:
+        wb.close()
+
+
+def flush_batch(batch, student_col, subject_cols, curriculum, academic_year, summary):
+    """Validate one batch of rows and save it through the bulk grade-sheet path."""
+    errors = summary['errors']
+
+    def error(row_number, message):
+        if len(errors) < MAX_ERRORS:
+            errors.append(f"row {row_number}: {message}")
+
+    student_ids = {student_id_text(row[student_col]) for _, row in batch if student_col < len(row)}
+    studies = {
+        study.student_id: study
+        for study in CurrentStudy.objects.filter(
+            student_id__in=student_ids,
+            student__delete_status='not_deleted',
+        ).select_related('student', 'school', 'level')
+    }
+
+    by_level = {}
+    for row_number, row in batch:
+        summary['rows'] += 1
+        student_id = student_id_text(row[student_col]) if student_col < len(row) else ''
+        study = studies.get(student_id)
+        if study is None or study.level_id is None or study.school_id is None:
+            error(row_number, f"ไม่พบนักเรียน {student_id or '-'} หรือยังไม่ได้กำหนดโรงเรียน/ชั้น")
+            continue
+        level_subjects = curriculum.get(study.level_id, {})
+
+        cells = {}
+        valid = True
+        for col, subject_name in subject_cols.items():
+            value = row[col] if col < len(row) else None
+            if value is None or value == '':
+                continue
+            sts = level_subjects.get(subject_name)
+            if sts is None:
+                error(row_number, f"วิชา {subject_name} ไม่อยู่ในหลักสูตรของ {study.level.name}")
+                valid = False
+                break
+            try:
+                marks = int(value)
+                if marks != float(value):
+                    raise ValueError
+            except (TypeError, ValueError):
+                error(row_number, f"คะแนน {subject_name} ไม่ถูกต้อง: {value}")
+                valid = False
+                break
+            if not 0 <= marks <= sts.subject.total_marks:
+                error(row_number, f"คะแนน {subject_name} ต้องอยู่ระหว่าง 0 ถึง {sts.subject.total_marks}")
+                valid = False
+                break
+            cells[(study.student_id, sts.id)] = marks
+        if not valid:
+            continue
+
+        group = by_level.setdefault(study.level_id, ({}, {}))
+        group[0][study.student_id] = study
+        group[1].update(cells)
+
+    for level_id, (level_studies, cells) in by_level.items():
+        save_grade_sheet(list(level_studies.values()), list(curriculum[level_id].values()), academic_year, cells)
+        summary['imported'] += len(level_studies)
+        summary['cells'] += len(cells)
@@ -0,0 +1,166 @@
+# students/jobs.py
+"""
+Database-backed background jobs.
+
+Views call :func:`enqueue` and hand the job id back to the browser; the
+``manage.py run_worker`` process claims queued jobs and runs the task function
+registered under the job's ``kind`` (see ``students/tasks.py``).
+
+A job left ``running`` longer than ``JOB_TIMEOUT`` (its worker was killed) is
+requeued or failed before the next claim, and finished jobs are deleted with
+their result files after ``JOB_KEEP_DAYS``.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+RETRY_DELAY = timedelta(seconds=30)
+STALE_ERROR = "Worker stopped before the job finished"
+
+
+def job_timeout():
+    return timedelta(seconds=getattr(settings, 'JOB_TIMEOUT', 60 * 60))
+
+
+def keep_days():
+    return getattr(settings, 'JOB_KEEP_DAYS', 7)
+
+
+def task(kind):
+    """Register ``fn(job, **params)`` as the handler for jobs of ``kind``."""
+    def register(fn):
+        TASKS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, max_attempts=3, **params):
+    """Queue a job; ``params`` must be JSON serialisable."""
+    return Job.objects.create(kind=kind, params=params, max_attempts=max_attempts)
+
+
+def set_progress(job, progress, total=None):
+    """Record progress with a single UPDATE so status polling sees it immediately."""
+    job.progress = progress
+    fields = {'progress': progress}
+    if total is not None:
+        job.total = total
+        fields['total'] = total
+    Job.objects.filter(pk=job.pk).update(**fields)
+
+
+def save_result_file(job, filename, content):
+    """Attach generated bytes to the job as its downloadable result."""
+    job.result_file.save(filename, ContentFile(content), save=False)
+    Job.objects.filter(pk=job.pk).update(result_file=job.result_file.name)
+
+
+def recover_stale_jobs():
+    """
+    Requeue (or fail, once out of attempts) jobs stuck in ``running`` past ``JOB_TIMEOUT``.
+
+    Returns the number of jobs recovered. Each UPDATE re-checks ``status`` and
+    ``started_at``, so a job that finishes meanwhile is left alone.
+    """
+    stale = Job.objects.filter(status='running', started_at__lt=timezone.now() - job_timeout())
+    now = timezone.now()
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status='queued', run_after=now, error=STALE_ERROR,
+    )
+    failed = stale.update(status='failed', finished_at=now, error=STALE_ERROR)
+    if requeued or failed:
+        logger.warning("Recovered %s stale jobs (%s requeued, %s failed)", requeued + failed, requeued, failed)
+    return requeued + failed
+
+
+def cleanup_jobs(days=None):
+    """Delete done / failed jobs finished more than ``days`` ago, with their result files."""
+    days = keep_days() if days is None else days
+    expired = Job.objects.filter(status__in=['done', 'failed'], finished_at__lt=timezone.now() - timedelta(days=days))
+    count = 0
+    for job in expired.iterator():
+        if job.result_file:
+            job.result_file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest runnable job from ``queued`` to ``running``.
+
+    The claim is a conditional UPDATE, so several workers can poll the same
+    table without taking the same job twice, on SQLite as well as PostgreSQL.
+    Stale ``running`` jobs are recovered first (:func:`recover_stale_jobs`).
+    """
+    recover_stale_jobs()
+    while True:
+        candidate = (
+            Job.objects.filter(status='queued', run_after__lte=timezone.now())
+            .order_by('run_after', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if candidate is None:
+            return None
+        claimed = Job.objects.filter(pk=candidate, status='queued').update(
+            status='running',
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=candidate)
+
+
+def run_job(job):
+    """Run a claimed job, then mark it done, requeue it for a retry, or fail it."""
+    handler = TASKS.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No task registered for job kind '{job.kind}'")
+        result = handler(job, **job.params)
+    except Exception:
+        job.error = traceback.format_exc()
+        if handler is not None and job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_after = timezone.now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+            logger.warning("Job %s failed (attempt %s/%s), retrying", job.pk, job.attempts, job.max_attempts)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            logger.error("Job %s failed: %s", job.pk, job.error)
+        job.save(update_fields=['status', 'run_after', 'error', 'finished_at'])
+        return job
+
+    job.status = 'done'
+    job.result = result
+    job.progress = max(job.progress, job.total)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'progress', 'finished_at'])
+    return job
+
+
+def job_payload(job):
+    """JSON-friendly job status used by the status endpoint."""
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'attempts': job.attempts,
+        'result': job.result,
+        'has_file': bool(job.result_file),
+        'error': job.error.strip().splitlines()[-1] if job.status == 'failed' and job.error else '',
+    }
@@ -0,0 +1,115 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from students.marks import parse_grade_sheet, save_grade_sheet
+from students.models import (
+    CurrentSemester, CurrentStudy, Level, School, Student, StudentHistory,
+    StudentMarkForSubject, Subject, SubjectToStudy,
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_save(studies, subjects, academic_year, data):
+    """The per-cell update_or_create loop the grade form used before the bulk path."""
+    for study in studies:
+        student_subject_marks = {}
+        total_marks = 0
+        obtained_marks = 0
+        for sts in subjects:
+            marks = data.get(f"marks_{study.student.id}_{sts.subject.id}")
+            if marks:
+                marks = int(marks)
+                student_subject_marks[sts.subject.name] = marks
+                total_marks += sts.subject.total_marks
+                obtained_marks += marks
+                StudentMarkForSubject.objects.update_or_create(
+                    student=study.student,
+                    subject_to_study=sts,
+                    category=sts.subject.category or 1,
+                    academic_year=academic_year,
+                    defaults={'marks_obtained': marks},
+                )
+        grade_percentage = (obtained_marks / total_marks) * 100 if total_marks > 0 else 0
+        StudentHistory.objects.update_or_create(
+            student_id=study.student.id,
+            student_name=f"{study.student.first_name} {study.student.last_name}",
+            school_name=study.school.name,
+            level_name=study.level.name,
+            academic_year=academic_year,
+            defaults={
+                'total_marks': total_marks,
+                'obtained_marks': obtained_marks,
+                'grade_percentage': grade_percentage,
+                'subject_marks': student_subject_marks,
+                'pass_or_fail': "ผ่าน" if grade_percentage >= 50 else "ไม่ผ่าน",
+            },
+        )
+
+
+class Command(BaseCommand):
+    help = "Benchmark grade-sheet submission: per-cell update_or_create vs. the bulk upsert path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 40, 200], help="Class sizes (students)")
+        parser.add_argument('--subjects', type=int, default=16, help="Subjects per level")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'students':>9} {'cells':>7} {'legacy (s)':>11} {'bulk (s)':>9} {'speedup':>8}")
+        for size in options['sizes']:
+            legacy = self.run_once(size, options['subjects'], bulk=False)
+            bulk = self.run_once(size, options['subjects'], bulk=True)
+            self.stdout.write(
+                f"{size:>9} {size * options['subjects']:>7} {legacy:>11.3f} {bulk:>9.3f} {legacy / bulk:>7.1f}x"
+            )
+
+    def run_once(self, size, subject_count, bulk):
+        """Build a throwaway class, time one submission (first save + resave), then roll back."""
+        elapsed = 0.0
+        try:
+            with transaction.atomic():
+                studies, subjects, academic_year = self.make_class(size, subject_count)
+                for value in ('50', '75'):
+                    data = {
+                        f"marks_{study.student_id}_{sts.subject_id}": value
+                        for study in studies for sts in subjects
+                    }
+                    started = time.perf_counter()
+                    if bulk:
+                        save_grade_sheet(studies, subjects, academic_year, parse_grade_sheet(data, studies, subjects))
+                    else:
+                        legacy_save(studies, subjects, academic_year, data)
+                    elapsed += time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+        return elapsed
+
+    def make_class(self, size, subject_count):
+        semester = CurrentSemester.objects.first()
+        school = School.objects.create(name="bench-school")
+        level = Level.objects.create(name="bench-level")
+        subjects = []
+        for i in range(subject_count):
+            subject = Subject.objects.create(name=f"bench-subject-{i}", total_marks=100, category=1 + i % 2)
+            subjects.append(SubjectToStudy.objects.create(subject=subject, level=level))
+
+        studies = []
+        for i in range(size):
+            student = Student.objects.create(
+                first_name="bench",
+                last_name=str(i),
+                date_of_birth=date(2012, 1, 1),
+                id_number=f"9{i:012d}",
+                exam_unit_number="99",
+                gender='ชาย',
+            )
+            studies.append(CurrentStudy.objects.create(
+                student=student, school=school, level=level, current_semester=semester,
+            ))
+        return studies, subjects, semester.year if semester else date.today().year
@@ -0,0 +1,130 @@
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from students import pdf_engine
+from students.report_cards import render_report_card
+
+
+def legacy_setup():
+    """Per-report setup of the student list PDF before the shared engine."""
+    styles = getSampleStyleSheet()
+    styles['Normal'].fontName = 'THSarabunNew'
+    styles['Normal'].fontSize = 20
+    styles['Normal'].alignment = 1
+    custom_style = styles['Normal'].clone('CustomNormal')
+    custom_style.fontSize = 18
+    custom_style.leading = 19
+    logo = Image(pdf_engine.LOGO_PATH, width=1 * inch, height=1 * inch)
+    header_style = TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 0.8, colors.grey),
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BOTTOMPADDING', (1, 0), (-1, -1), 15),
+    ])
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'THSarabunNew'),
+        ('FONTSIZE', (0, 0), (-1, 0), 16),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 15),
+        ('FONTSIZE', (0, 1), (-1, -1), 14),
+        ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 1), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 1), (-1, -1), 2),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 12),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ])
+    return styles['Normal'], custom_style, logo, header_style, table_style
+
+
+def legacy_render(rows):
+    title_style, info_style, logo, header_style, table_style = legacy_setup()
+    header = Table([[logo, Paragraph("<b>โรงเรียน</b>", title_style), Paragraph("ชั้น: ทุกชั้น", info_style)]],
+                   colWidths=[2 * inch, 5 * inch, 3 * inch])
+    header.setStyle(header_style)
+    table = Table(rows, colWidths=[50, 150, 150, 100, 250, 100])
+    table.setStyle(table_style)
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, pagesize=landscape(A4), topMargin=0.5 * inch, bottomMargin=0.5 * inch,
+                      leftMargin=0.5 * inch, rightMargin=0.5 * inch).build([header, Spacer(1, 0.3 * inch), table])
+    return buffer.getvalue()
+
+
+def engine_render(rows):
+    styles = pdf_engine.paragraph_styles()
+    header = pdf_engine.header_row(
+        [pdf_engine.logo(1 * inch), Paragraph("<b>โรงเรียน</b>", styles['list_title']),
+         Paragraph("ชั้น: ทุกชั้น", styles['list_info'])],
+        [2 * inch, 5 * inch, 3 * inch],
+    )
+    table = pdf_engine.table(rows, [50, 150, 150, 100, 250, 100], 'student_list')
+    return pdf_engine.render_bytes([header, Spacer(1, 0.3 * inch), table], pagesize=landscape(A4))
+
+
+def large_list(rows, chunked):
+    header = rows[0]
+    if chunked:
+        tables = pdf_engine.chunked_tables(header, rows[1:], [50, 150, 150, 100, 250, 100], 'student_list')
+    else:
+        tables = [pdf_engine.table(rows, [50, 150, 150, 100, 250, 100], 'student_list', repeatRows=1)]
+    return pdf_engine.render_bytes(tables, pagesize=landscape(A4))
+
+
+def sample_card():
+    data = [(f'วิชา {i}', 40 + i, f'{80 + i}%', 'ผ่าน') for i in range(8)]
+    return {
+        'student_id': 1, 'gender': 'ชาย', 'semester_1_data': data, 'semester_2_data': data,
+        'academic_year': '2567', 'student_name': 'ทดสอบ_ระบบ', 'school_name': 'โรงเรียน', 'level_name': 'ชั้น 1',
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark PDF setup and small-report render: per-call reportlab setup vs. the shared pdf_engine"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--rows', type=int, default=30, help="Rows in the sample student list")
+        parser.add_argument('--large-rows', type=int, default=0,
+                            help="Also time one list of this many rows: single table vs. chunked tables")
+
+    def timed(self, label, func, iterations):
+        func()  # warm-up
+        started = time.perf_counter()
+        for _ in range(iterations):
+            result = func()
+        elapsed = (time.perf_counter() - started) / iterations * 1000
+        size = f", {len(result) / 1024:.0f} KB" if isinstance(result, bytes) else ''
+        self.stdout.write(f"{label:<32} {elapsed:8.2f} ms/report{size}")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        rows = [['ลำดับ', 'ชื่อ', 'นามสกุล', 'เพศ', 'โรงเรียน', 'สถานะพิเศษ']] + [
+            [i, 'ชื่อ', 'นามสกุล', 'ชาย', 'โรงเรียน', 'ไม่มีข้อมูล'] for i in range(1, options['rows'] + 1)
+        ]
+        pdf_engine.register_fonts()
+        card = sample_card()
+
+        self.timed('setup: legacy', legacy_setup, iterations)
+        self.timed('setup: engine', lambda: (pdf_engine.paragraph_styles(), pdf_engine.table_styles(),
+                                             pdf_engine.logo(1 * inch)), iterations)
+        self.timed('student list: legacy', lambda: legacy_render(rows), iterations)
+        self.timed('student list: engine', lambda: engine_render(rows), iterations)
+        self.timed('report card: engine', lambda: render_report_card(card)[1], iterations)
+
+        if options['large_rows']:
+            large = rows[:1] + [
+                [i, 'ชื่อ', 'นามสกุล', 'ชาย', 'โรงเรียน', 'ไม่มีข้อมูล'] for i in range(1, options['large_rows'] + 1)
+            ]
+            for label, chunked in (('single table', False), ('chunked tables', True)):
+                started = time.perf_counter()
+                large_list(large, chunked)
+                self.stdout.write(f"{options['large_rows']} rows, {label:<19} {time.perf_counter() - started:8.2f} s")
@@ -0,0 +1,87 @@
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from students.models import StudentHistory, StudentSubjectResult, Subject
+from students.workbooks import build_student_results_workbook
+
+
+class Rollback(Exception):
+    pass
+
+
+def peak_rss_mb():
+    # ru_maxrss เป็น KB บน Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = "Benchmark the streaming results workbook export: time and peak RSS per row count"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help="History rows to export")
+        parser.add_argument('--subjects', type=int, default=8, help="Subject columns per row")
+        parser.add_argument('--rows', type=int, help="Run a single size in this process (used internally)")
+
+    def handle(self, *args, **options):
+        if options['rows']:
+            self.run_once(options['rows'], options['subjects'])
+            return
+
+        # แต่ละขนาดรันใน process ใหม่ เพื่อให้ค่า peak RSS ไม่ปนกัน
+        self.stdout.write(f"{'rows':>8} {'seconds':>8} {'rss before (MB)':>16} {'peak rss (MB)':>14} {'file (MB)':>10}")
+        for size in options['sizes']:
+            result = subprocess.run(
+                [sys.executable, sys.argv[0], 'bench_results_excel', '--rows', str(size), '--subjects', str(options['subjects'])],
+                capture_output=True, text=True, check=True,
+            )
+            self.stdout.write(result.stdout.strip().splitlines()[-1])
+
+    def run_once(self, size, subject_count):
+        try:
+            with transaction.atomic():
+                self.make_histories(size, subject_count)
+                before = peak_rss_mb()
+                with tempfile.TemporaryFile() as output:
+                    started = time.perf_counter()
+                    wb, _ = build_student_results_workbook('bench-school', 'bench-level', '1999')
+                    wb.save(output)
+                    elapsed = time.perf_counter() - started
+                    file_size = output.tell() / (1024 * 1024)
+                self.stdout.write(f"{size:>8} {elapsed:>8.2f} {before:>16.1f} {peak_rss_mb():>14.1f} {file_size:>10.1f}")
+                raise Rollback
+        except Rollback:
+            pass
+
+    def make_histories(self, size, subject_count, batch_size=2000):
+        subjects = [
+            Subject.objects.create(name=f"bench-subject-{i}", total_marks=100, category=1 + i % 2)
+            for i in range(subject_count)
+        ]
+        for offset in range(0, size, batch_size):
+            histories = StudentHistory.objects.bulk_create([
+                StudentHistory(
+                    student_id=i,
+                    student_name=f"bench {i}",
+                    school_name='bench-school',
+                    level_name='bench-level',
+                    academic_year='1999',
+                    total_marks=100 * subject_count,
+                    obtained_marks=50 * subject_count,
+                    grade_percentage=50,
+                    pass_or_fail="ผ่าน",
+                    class_rank=i + 1,
+                    class_size=size,
+                )
+                for i in range(offset, min(offset + batch_size, size))
+            ])
+            StudentSubjectResult.objects.bulk_create([
+                StudentSubjectResult(history=history, subject=subject, marks_obtained=50)
+                for history in histories
+                for subject in subjects
+            ])
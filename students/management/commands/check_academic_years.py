@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from students.academic_years import check_academic_years
+
+
+class Command(BaseCommand):
+    help = "Check the academic-year registry against StudentHistory (use --fix to add missing years)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Add missing years; years without history are only reported")
+
+    def handle(self, *args, **options):
+        missing, stale = check_academic_years(fix=options['fix'])
+        if not missing and not stale:
+            self.stdout.write(self.style.SUCCESS("Academic-year registry is consistent."))
+            return
+
+        action = "added" if options['fix'] else "found"
+        if missing:
+            self.stdout.write(self.style.WARNING(f"Missing from registry ({action}): {', '.join(map(str, missing))}"))
+        if stale:
+            # อาจเป็นปีที่ผู้ดูแลเพิ่มไว้ล่วงหน้า จึงไม่ลบ
+            self.stdout.write(self.style.WARNING(f"Registered without history (kept): {', '.join(map(str, stale))}"))
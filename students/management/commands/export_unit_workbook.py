@@ -0,0 +1,33 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from students.workbooks import build_unit_workbook, write_unit_workbooks_parallel
+
+
+class Command(BaseCommand):
+    help = "Export a whole exam unit's results: one workbook with a sheet per school and level"
+
+    def add_arguments(self, parser):
+        parser.add_argument('academic_year', help="Gregorian academic year, e.g. 2024")
+        parser.add_argument('--level', help="Only this level")
+        parser.add_argument('--output', default='.', help="Output directory")
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="With more than 1, write one workbook per school in parallel processes",
+        )
+
+    def handle(self, *args, **options):
+        os.makedirs(options['output'], exist_ok=True)
+        if options['workers'] > 1:
+            paths = write_unit_workbooks_parallel(
+                options['academic_year'], options['output'], options['level'], options['workers'],
+            )
+        else:
+            wb, filename = build_unit_workbook(options['academic_year'], options['level'])
+            paths = [os.path.join(options['output'], filename)]
+            wb.save(paths[0])
+
+        for path in paths:
+            self.stdout.write(path)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(paths)} workbook(s)."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from students.imports import MarkImportError, import_marks_workbook
+
+
+class Command(BaseCommand):
+    help = "Import marks for a whole exam unit from an xlsx file (student id column + one column per subject)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="Path to the .xlsx file")
+        parser.add_argument('--academic-year', type=int, required=True, help="Thai academic year, e.g. 2568")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows written per transaction")
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f"\r{done}/{total} rows", ending='')
+            self.stdout.flush()
+
+        try:
+            summary = import_marks_workbook(
+                options['file'],
+                options['academic_year'] - 543,
+                batch_size=options['batch_size'],
+                progress=progress,
+            )
+        except MarkImportError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write('')
+        for error in summary['errors']:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['cells']} marks for {summary['imported']} students "
+            f"({summary['rows']} rows, {len(summary['errors'])} errors)."
+        ))
@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from students.marks import rebuild_histories
+from students.models import StudentHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild StudentHistory totals, percentages and subject_marks from the raw marks. "
+        "Chunks run in parallel worker processes (each with its own connection) on PostgreSQL; "
+        "SQLite allows one writer, so there they run one after another."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--academic-year', help="Only rebuild this (Gregorian) academic year")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Histories per chunk")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Worker processes (ignored on SQLite, which runs chunks sequentially)")
+
+    def handle(self, *args, **options):
+        histories = StudentHistory.objects.order_by('id')
+        if options['academic_year']:
+            histories = histories.filter(academic_year=options['academic_year'])
+        ids = list(histories.values_list('id', flat=True))
+        size = options['chunk_size']
+        chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+
+        workers = min(options['workers'], len(chunks))
+        if connection.vendor == 'sqlite':
+            # SQLite รับการเขียนได้ทีละ connection
+            workers = 1
+
+        if workers > 1:
+            # connection ที่เปิดอยู่ห้ามส่งต่อให้ process ลูก แต่ละ process เปิด connection ของตัวเอง
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                self.report(pool.map(rebuild_histories, chunks), len(chunks))
+        else:
+            self.report(map(rebuild_histories, chunks), len(chunks))
+
+    def report(self, results, chunk_count):
+        rebuilt = skipped = 0
+        for done, (chunk_rebuilt, chunk_skipped) in enumerate(results, start=1):
+            rebuilt += chunk_rebuilt
+            skipped += chunk_skipped
+            self.stdout.write(f"chunk {done}/{chunk_count}: {chunk_rebuilt} rebuilt, {chunk_skipped} without marks")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} histories ({skipped} skipped, no raw marks)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from students.models import Student
+from students.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the student name / ID search index from the Student table"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_index(Student.objects.all())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} students."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from students.ranking import exam_units, refresh_unit_rankings
+
+
+class Command(BaseCommand):
+    help = "Recompute class ranks, class sizes, exam-unit percentiles and subject ranks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--academic-year', help="Only refresh this (Gregorian) academic year")
+
+    def handle(self, *args, **options):
+        units = exam_units()
+        if options['academic_year']:
+            units = [unit for unit in units if unit[1] == options['academic_year']]
+
+        changed = 0
+        for level_name, academic_year in units:
+            count = refresh_unit_rankings(level_name, academic_year)
+            changed += count
+            self.stdout.write(f"{level_name} {academic_year}: {count} rows updated")
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {len(units)} exam units ({changed} rows updated)."))
@@ -0,0 +1,27 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from students.report_cards import class_report_cards, render_report_cards
+
+
+class Command(BaseCommand):
+    help = "Render report cards for every student of a class (zip of PDFs or one merged PDF)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('school')
+        parser.add_argument('level')
+        parser.add_argument('academic_year', help="Gregorian academic year, e.g. 2024")
+        parser.add_argument('--format', choices=['zip', 'pdf'], default='zip')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processes (zip only; the merged PDF is rendered in one process)")
+        parser.add_argument('--output', help="Output file (default: report_cards_<year>.<format>)")
+
+    def handle(self, *args, **options):
+        cards = class_report_cards(options['school'], options['level'], options['academic_year'])
+        path = options['output'] or f"report_cards_{options['academic_year']}.{options['format']}"
+        with open(path, 'wb') as output:
+            stats = render_report_cards(cards, output, options['format'], options['workers'])
+        self.stdout.write(
+            f"{stats['cards']} cards, {stats['pages']} pages in {stats['seconds']:.2f}s "
+            f"({stats['pages_per_second']} pages/s) -> {path}"
+        )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+import students.tasks  # noqa: F401  ลงทะเบียน task ทั้งหมด
+from students.jobs import claim_next_job, cleanup_jobs, run_job
+
+CLEANUP_INTERVAL = 60 * 60  # วินาที
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (grade sheets, PDF and Excel exports)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run every runnable job, then exit")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--keep-days', type=int, help="Delete finished jobs and their files after this many days "
+                                                          "(default: settings.JOB_KEEP_DAYS)")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker started")
+        last_cleanup = None
+        while True:
+            close_old_connections()
+            if last_cleanup is None or time.monotonic() - last_cleanup >= CLEANUP_INTERVAL:
+                removed = cleanup_jobs(options['keep_days'])
+                if removed:
+                    self.stdout.write(f"removed {removed} expired jobs")
+                last_cleanup = time.monotonic()
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            started = time.monotonic()
+            job = run_job(job)
+            self.stdout.write(
+                f"job {job.pk} [{job.kind}] {job.status} in {time.monotonic() - started:.1f}s"
+                + (f" (attempt {job.attempts}/{job.max_attempts})" if job.status != 'done' else "")
+            )
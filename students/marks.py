@@ -0,0 +1,371 @@
+# students/marks.py
+from django.db import transaction
+
+from .academic_years import register_academic_years
+from .curriculum import level_subjects
+from .ranking import schedule_ranking_refresh
+from .report_cache import RESULTS, bump_data_version
+from .statistics import invalidate_class_statistics
+from .models import (
+    CurrentStudy, Subject, StudentMarkForSubject, StudentHistory, StudentSubjectResult,
+)
+
+MARK_UNIQUE_FIELDS = ['student', 'subject_to_study', 'academic_year', 'category']
+HISTORY_FIELDS = ['total_marks', 'obtained_marks', 'grade_percentage', 'subject_marks', 'pass_or_fail']
+
+
+class InvalidMarkError(ValueError):
+    """A posted grade-sheet cell that is not a whole number."""
+
+    def __init__(self, study, subject):
+        super().__init__(f"Invalid marks for {study.student.first_name} in {subject.subject.name}.")
+        self.study = study
+        self.subject = subject
+
+
+def get_class_studies(current_semester, school_name, level_name, active_only=False):
+    """Return the CurrentStudy rows of one class (school + level) as a list."""
+    studies = CurrentStudy.objects.filter(
+        current_semester=current_semester,
+        school__name__iexact=school_name,
+        level__name__iexact=level_name,
+    )
+    if active_only:
+        studies = studies.filter(student__delete_status='not_deleted')
+    return list(studies.select_related('student', 'level', 'school').order_by('student_id'))
+
+
+def get_level_subjects(level_name):
+    """Return the SubjectToStudy rows of a level with their Subject joined in."""
+    return level_subjects(level_name)
+
+
+def load_mark_matrix(studies, subjects, academic_year):
+    """
+    Build the student x subject mark grid used by the grade-entry form.
+
+    All marks of the class are fetched in a single query and pivoted in memory,
+    so the cost does not grow with the number of students or subjects.
+
+    Args:
+        studies (list): CurrentStudy rows (with ``student`` selected).
+        subjects (list): SubjectToStudy rows (with ``subject`` selected).
+        academic_year (int): Gregorian academic year stored on the marks.
+
+    Returns:
+        list: One dict per student, ``{'student': Student, <subject id>: marks}``.
+        Cells without a saved mark hold ``''``.
+    """
+    if not studies or not subjects:
+        return []
+
+    subject_ids = {sts.id: sts.subject_id for sts in subjects}
+    marks = {}
+    rows = StudentMarkForSubject.objects.filter(
+        student_id__in=[study.student_id for study in studies],
+        subject_to_study_id__in=subject_ids.keys(),
+        academic_year=academic_year,
+    ).order_by('id').values_list('student_id', 'subject_to_study_id', 'marks_obtained')
+    for student_id, subject_to_study_id, marks_obtained in rows:
+        # เก็บค่าแรกที่พบ เหมือนกับ .first() เดิม
+        marks.setdefault((student_id, subject_to_study_id), marks_obtained)
+
+    matrix = []
+    for study in studies:
+        marks_row = {'student': study.student}
+        for sts in subjects:
+            value = marks.get((study.student_id, sts.id))
+            marks_row[subject_ids[sts.id]] = value if value is not None else ''
+        matrix.append(marks_row)
+    return matrix
+
+
+def parse_grade_sheet(data, studies, subjects):
+    """
+    Read the ``marks_<student id>_<subject id>`` fields posted by the grade form.
+
+    Returns:
+        dict: ``{(student id, SubjectToStudy id): int}`` for every non-empty cell.
+
+    Raises:
+        InvalidMarkError: if a cell is not an integer.
+    """
+    cells = {}
+    for study in studies:
+        for sts in subjects:
+            value = data.get(f"marks_{study.student_id}_{sts.subject_id}")
+            if not value:
+                continue
+            try:
+                cells[(study.student_id, sts.id)] = int(value)
+            except ValueError:
+                raise InvalidMarkError(study, sts)
+    return cells
+
+
+def summarize_marks(entries):
+    """
+    Compute the StudentHistory aggregate fields from raw marks.
+
+    Args:
+        entries: iterable of ``(subject name, subject total_marks, marks obtained)``.
+    """
+    subject_marks = {}
+    total_marks = 0
+    obtained_marks = 0
+    for name, subject_total, marks in entries:
+        subject_marks[name] = marks
+        total_marks += subject_total
+        obtained_marks += marks
+    return grade_values(total_marks, obtained_marks, subject_marks)
+
+
+def grade_values(total_marks, obtained_marks, subject_marks):
+    grade_percentage = (obtained_marks / total_marks) * 100 if total_marks > 0 else 0
+    return {
+        'total_marks': total_marks,
+        'obtained_marks': obtained_marks,
+        'grade_percentage': grade_percentage,
+        'subject_marks': subject_marks,
+        'pass_or_fail': "ผ่าน" if grade_percentage >= 50 else "ไม่ผ่าน",
+    }
+
+
+def apply_mark_deltas(history, subjects_by_id, changes):
+    """
+    Adjust an existing history in place for a student's changed marks.
+
+    Each change moves ``obtained_marks`` by the difference between the value the
+    aggregate currently holds for that subject and the new mark; a subject seen
+    for the first time also adds its ``total_marks``.
+
+    Args:
+        history (StudentHistory): aggregate row to adjust.
+        subjects_by_id (dict): SubjectToStudy rows keyed by id.
+        changes (dict): ``{SubjectToStudy id: new marks}``.
+    """
+    subject_marks = dict(history.subject_marks or {})
+    total_marks = history.total_marks or 0
+    obtained_marks = history.obtained_marks or 0
+    for sts_id, marks in changes.items():
+        subject = subjects_by_id[sts_id].subject
+        previous = subject_marks.get(subject.name)
+        if previous is None:
+            total_marks += subject.total_marks
+            obtained_marks += marks
+        else:
+            obtained_marks += marks - previous
+        subject_marks[subject.name] = marks
+
+    for field, value in grade_values(total_marks, obtained_marks, subject_marks).items():
+        setattr(history, field, value)
+
+
+def sync_subject_results(histories, subject_ids=None):
+    """
+    Rewrite the StudentSubjectResult rows of ``histories`` from their ``subject_marks``.
+
+    Args:
+        histories (list): saved StudentHistory rows.
+        subject_ids (dict): optional ``{subject name: Subject id}``; names it does
+            not cover are resolved against the Subject table.
+    """
+    if not histories:
+        return
+    subject_ids = dict(subject_ids or {})
+    names = {name for history in histories for name in (history.subject_marks or {})}
+    if names - subject_ids.keys():
+        for subject_id, name in Subject.objects.filter(
+            name__in=names - subject_ids.keys(),
+        ).order_by('-id').values_list('id', 'name'):
+            subject_ids[name] = subject_id
+
+    StudentSubjectResult.objects.filter(history__in=[history.pk for history in histories]).delete()
+    StudentSubjectResult.objects.bulk_create([
+        StudentSubjectResult(history_id=history.pk, subject_id=subject_ids[name], marks_obtained=marks)
+        for history in histories
+        for name, marks in (history.subject_marks or {}).items()
+        if name in subject_ids and marks is not None
+    ])
+    invalidate_class_statistics(
+        (history.school_name, history.level_name, history.academic_year) for history in histories
+    )
+    schedule_ranking_refresh(histories)
+    bump_data_version(RESULTS)
+
+
+def load_subject_results(history_ids):
+    """Return ``{history id: {Subject id: marks}}`` from StudentSubjectResult in one query."""
+    results = {}
+    for history_id, subject_id, marks in StudentSubjectResult.objects.filter(
+        history_id__in=history_ids,
+    ).values_list('history_id', 'subject_id', 'marks_obtained'):
+        results.setdefault(history_id, {})[subject_id] = marks
+    return results
+
+
+def attach_subject_columns(histories, column_groups):
+    """
+    Set per-row mark lists on ``histories`` aligned with table columns.
+
+    Args:
+        histories (list): StudentHistory rows.
+        column_groups (dict): ``{attribute name: [Subject id, ...]}``; each
+            history gets ``attribute name`` set to the marks in that column
+            order, ``'-'`` where there is no result.
+    """
+    results = load_subject_results([history.pk for history in histories])
+    for history in histories:
+        marks = results.get(history.pk, {})
+        for attr, subject_ids in column_groups.items():
+            setattr(history, attr, [marks.get(subject_id, '-') for subject_id in subject_ids])
+    return histories
+
+
+def save_grade_sheet(studies, subjects, academic_year, cells):
+    """
+    Save the changed cells of a grade sheet in one transaction.
+
+    The stored marks of the class are read once and compared with ``cells``; only
+    cells whose value differs are upserted, through a single
+    ``bulk_create(update_conflicts=True)`` on the unique (student,
+    subject_to_study, academic_year, category) key. Existing histories are
+    adjusted by delta (:func:`apply_mark_deltas`) for the students that changed
+    and written with one ``bulk_update``; students without a history get one
+    built from their marks.
+
+    Args:
+        studies (list): CurrentStudy rows of the class.
+        subjects (list): SubjectToStudy rows of the level.
+        academic_year (int): Gregorian academic year.
+        cells (dict): ``{(student id, SubjectToStudy id): marks}`` as returned by
+            :func:`parse_grade_sheet`.
+
+    Returns:
+        dict: ``{student id: StudentHistory}`` for every history that was written.
+    """
+    subjects_by_id = {sts.id: sts for sts in subjects}
+    student_ids = [study.student_id for study in studies]
+
+    with transaction.atomic():
+        stored = {}
+        for student_id, sts_id, category, marks in StudentMarkForSubject.objects.filter(
+            student_id__in=student_ids,
+            subject_to_study_id__in=subjects_by_id.keys(),
+            academic_year=academic_year,
+        ).values_list('student_id', 'subject_to_study_id', 'category', 'marks_obtained'):
+            if category == (subjects_by_id[sts_id].subject.category or 1):
+                stored[(student_id, sts_id)] = marks
+
+        changed = {key: value for key, value in cells.items() if stored.get(key) != value}
+        if changed:
+            StudentMarkForSubject.objects.bulk_create(
+                [
+                    StudentMarkForSubject(
+                        student_id=student_id,
+                        subject_to_study_id=sts_id,
+                        category=subjects_by_id[sts_id].subject.category or 1,
+                        academic_year=academic_year,
+                        marks_obtained=value,
+                    )
+                    for (student_id, sts_id), value in changed.items()
+                ],
+                update_conflicts=True,
+                unique_fields=MARK_UNIQUE_FIELDS,
+                update_fields=['marks_obtained'],
+            )
+
+        stored_by_student = {}
+        for (student_id, sts_id), value in stored.items():
+            stored_by_student.setdefault(student_id, {})[sts_id] = value
+        changes_by_student = {}
+        for (student_id, sts_id), value in changed.items():
+            changes_by_student.setdefault(student_id, {})[sts_id] = value
+
+        existing = {}
+        for history in StudentHistory.objects.filter(
+            student_id__in=student_ids,
+            academic_year=str(academic_year),
+        ).order_by('id'):
+            key = (history.student_id, history.student_name, history.school_name, history.level_name)
+            existing.setdefault(key, history)
+
+        to_update = []
+        to_create = []
+        for study in studies:
+            student = study.student
+            key = (
+                int(student.id),
+                f"{student.first_name} {student.last_name}",
+                study.school.name,
+                study.level.name,
+            )
+            history = existing.get(key)
+            if history is not None:
+                if study.student_id in changes_by_student:
+                    apply_mark_deltas(history, subjects_by_id, changes_by_student[study.student_id])
+                    to_update.append(history)
+                continue
+
+            current = dict(stored_by_student.get(study.student_id, {}))
+            current.update(changes_by_student.get(study.student_id, {}))
+            history = StudentHistory(
+                student_id=key[0],
+                student_name=key[1],
+                school_name=key[2],
+                level_name=key[3],
+                academic_year=str(academic_year),
+                **summarize_marks(
+                    (sts.subject.name, sts.subject.total_marks, current[sts.id])
+                    for sts in subjects if current.get(sts.id) is not None
+                ),
+            )
+            to_create.append(history)
+
+        if to_update:
+            StudentHistory.objects.bulk_update(to_update, HISTORY_FIELDS)
+        if to_create:
+            StudentHistory.objects.bulk_create(to_create)
+            register_academic_years([academic_year])
+        sync_subject_results(to_update + to_create, {sts.subject.name: sts.subject_id for sts in subjects})
+
+    return {history.student_id: history for history in to_update + to_create}
+
+
+def rebuild_histories(history_ids):
+    """
+    Recompute the given histories from the raw StudentMarkForSubject rows.
+
+    Marks are matched to a history by student, academic year and level name.
+    Histories with no raw marks left (e.g. after a semester reset cleared the
+    mark table) are left untouched.
+
+    Returns:
+        tuple: ``(rebuilt, skipped)`` counts.
+    """
+    histories = list(StudentHistory.objects.filter(id__in=history_ids).only(
+        'id', 'student_id', 'level_name', 'academic_year', *HISTORY_FIELDS
+    ))
+    marks = {}
+    for student_id, year, level_name, name, subject_total, value in StudentMarkForSubject.objects.filter(
+        student_id__in={str(history.student_id) for history in histories},
+        marks_obtained__isnull=False,
+    ).order_by('subject_to_study_id').values_list(
+        'student_id', 'academic_year', 'subject_to_study__level__name',
+        'subject_to_study__subject__name', 'subject_to_study__subject__total_marks', 'marks_obtained',
+    ):
+        marks.setdefault((int(student_id), str(year), level_name), []).append((name, subject_total, value))
+
+    rebuilt = []
+    for history in histories:
+        entries = marks.get((history.student_id, history.academic_year, history.level_name))
+        if not entries:
+            continue
+        for field, value in summarize_marks(entries).items():
+            setattr(history, field, value)
+        rebuilt.append(history)
+
+    with transaction.atomic():
+        StudentHistory.objects.bulk_update(rebuilt, HISTORY_FIELDS)
+        sync_subject_results(rebuilt)
+    return len(rebuilt), len(histories) - len(rebuilt)
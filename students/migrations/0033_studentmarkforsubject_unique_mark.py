@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+def remove_duplicate_marks(apps, schema_editor):
+    """Keep only the newest mark for each (student, subject, year, category)."""
+    StudentMarkForSubject = apps.get_model('students', 'StudentMarkForSubject')
+    seen = set()
+    duplicate_ids = []
+    rows = StudentMarkForSubject.objects.order_by('-id').values_list(
+        'id', 'student_id', 'subject_to_study_id', 'academic_year', 'category'
+    )
+    for mark_id, *key in rows.iterator():
+        key = tuple(key)
+        if key in seen:
+            duplicate_ids.append(mark_id)
+        else:
+            seen.add(key)
+    StudentMarkForSubject.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0032_studentmarkforsubject_academic_year'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_marks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='studentmarkforsubject',
+            constraint=models.UniqueConstraint(fields=('student', 'subject_to_study', 'academic_year', 'category'), name='unique_student_mark_per_subject_year'),
+        ),
+    ]
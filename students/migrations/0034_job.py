@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0033_studentmarkforsubject_unique_mark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='ประเภทงาน')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='พารามิเตอร์')),
+                ('status', models.CharField(choices=[('queued', 'รอดำเนินการ'), ('running', 'กำลังทำงาน'), ('done', 'เสร็จสิ้น'), ('failed', 'ล้มเหลว')], default='queued', max_length=10, verbose_name='สถานะ')),
+                ('progress', models.PositiveIntegerField(default=0, verbose_name='ความคืบหน้า')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='งานทั้งหมด')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='จำนวนครั้งที่ทำ')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='จำนวนครั้งสูงสุด')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='เริ่มได้หลังเวลา')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='ผลลัพธ์')),
+                ('result_file', models.FileField(blank=True, null=True, upload_to='jobs/', verbose_name='ไฟล์ผลลัพธ์')),
+                ('error', models.TextField(blank=True, default='', verbose_name='ข้อผิดพลาด')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='สร้างเมื่อ')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='เริ่มเมื่อ')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='เสร็จเมื่อ')),
+            ],
+            options={
+                'verbose_name': 'งานเบื้องหลัง',
+                'verbose_name_plural': 'งานเบื้องหลัง',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+def register_existing_years(apps, schema_editor):
+    AcademicYear = apps.get_model('students', 'AcademicYear')
+    StudentHistory = apps.get_model('students', 'StudentHistory')
+    years = {
+        int(year)
+        for year in StudentHistory.objects.values_list('academic_year', flat=True).distinct()
+        if year and str(year).isdigit()
+    }
+    AcademicYear.objects.bulk_create([AcademicYear(year=year) for year in years], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0034_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(register_existing_years, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='studenthistory',
+            index=models.Index(fields=['student_id', 'academic_year'], name='history_student_year_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_subject_results(apps, schema_editor):
+    """Copy every StudentHistory.subject_marks entry into StudentSubjectResult."""
+    Subject = apps.get_model('students', 'Subject')
+    StudentHistory = apps.get_model('students', 'StudentHistory')
+    StudentSubjectResult = apps.get_model('students', 'StudentSubjectResult')
+
+    subject_ids = {}
+    for subject_id, name in Subject.objects.order_by('id').values_list('id', 'name'):
+        subject_ids.setdefault(name, subject_id)
+
+    batch = []
+    for history_id, subject_marks in StudentHistory.objects.values_list('id', 'subject_marks').iterator():
+        for name, marks in (subject_marks or {}).items():
+            if name in subject_ids and marks is not None:
+                batch.append(StudentSubjectResult(history_id=history_id, subject_id=subject_ids[name], marks_obtained=marks))
+        if len(batch) >= 1000:
+            StudentSubjectResult.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    StudentSubjectResult.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0035_academic_year_registry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSubjectResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('marks_obtained', models.IntegerField(verbose_name='คะแนนที่ได้')),
+                ('history', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_results', to='students.studenthistory', verbose_name='ประวัติการศึกษา')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='students.subject', verbose_name='วิชา')),
+            ],
+            options={
+                'verbose_name': 'ผลการเรียนรายวิชา',
+                'verbose_name_plural': 'ผลการเรียนรายวิชา',
+                'indexes': [models.Index(fields=['subject', 'marks_obtained'], name='result_subject_marks_idx')],
+                'constraints': [models.UniqueConstraint(fields=('history', 'subject'), name='unique_history_subject_result')],
+            },
+        ),
+        migrations.RunPython(populate_subject_results, migrations.RunPython.noop),
+    ]
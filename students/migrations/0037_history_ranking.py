@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0036_studentsubjectresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studenthistory',
+            name='class_rank',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='อันดับในชั้น'),
+        ),
+        migrations.AddField(
+            model_name='studenthistory',
+            name='class_size',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='จำนวนนักเรียนในชั้น'),
+        ),
+        migrations.AddField(
+            model_name='studenthistory',
+            name='unit_percentile',
+            field=models.FloatField(blank=True, null=True, verbose_name='เปอร์เซ็นไทล์ในระดับชั้น'),
+        ),
+        migrations.AddField(
+            model_name='studentsubjectresult',
+            name='subject_rank',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='อันดับในวิชา'),
+        ),
+    ]
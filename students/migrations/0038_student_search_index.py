@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:10
+
+from django.db import migrations
+
+from students import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_index(schema_editor)
+    Student = apps.get_model('students', 'Student')
+    search.rebuild_index(Student.objects.all(), schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0037_history_ranking'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -409,6 +409,12 @@ class StudentMarkForSubject(models.Model):
     class Meta:
         verbose_name = _("คะแนนนักเรียนสำหรับวิชา")
         verbose_name_plural = _("คะแนนนักเรียนสำหรับวิชา")
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'subject_to_study', 'academic_year', 'category'],
+                name='unique_student_mark_per_subject_year',
+            ),
+        ]
 
 class StudentHistory(models.Model):
     student_id = models.IntegerField(blank=True, null=True, verbose_name=_("รหัสนักเรียน"))
@@ -427,6 +433,39 @@ class StudentHistory(models.Model):
     subject_marks = models.JSONField(blank=True, null=True, verbose_name=_("คะแนนตามวิชา"))
     #grade_percentage = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True, verbose_name=_("เปอร์เซ็นต์คะแนน"))
     pass_or_fail = models.CharField(max_length=10, blank=True, null=True, verbose_name=_("ผ่าน/ไม่ผ่าน"))
+    # คำนวณโดย students/ranking.py หลังบันทึกคะแนน
+    class_rank = models.PositiveIntegerField(blank=True, null=True, verbose_name=_("อันดับในชั้น"))
+    class_size = models.PositiveIntegerField(blank=True, null=True, verbose_name=_("จำนวนนักเรียนในชั้น"))
+    unit_percentile = models.FloatField(blank=True, null=True, verbose_name=_("เปอร์เซ็นไทล์ในระดับชั้น"))
+
+    # ฟิลด์ที่ StudentSubjectResult, สถิติชั้นเรียน และอันดับอ้างอิง (ดู signals.sync_history_subject_results)
+    RESULT_FIELDS = ('subject_marks', 'school_name', 'level_name', 'academic_year', 'grade_percentage')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_result_fields()
+        return instance
+
+    def remember_result_fields(self):
+        """Snapshot the loaded RESULT_FIELDS so :meth:`result_fields_changed` can compare against them."""
+        deferred = self.get_deferred_fields()
+        self._saved_results = {}
+        for name in self.RESULT_FIELDS:
+            if name not in deferred:
+                value = getattr(self, name)
+                # สำเนา dict เพราะ subject_marks อาจถูกแก้ในที่เดิมก่อน save
+                self._saved_results[name] = dict(value) if isinstance(value, dict) else value
+
+    def result_fields_changed(self, update_fields=None):
+        """Whether a save with ``update_fields`` wrote a RESULT_FIELDS value that differs from the loaded one."""
+        if update_fields is not None and not set(update_fields) & set(self.RESULT_FIELDS):
+            return False
+        saved = getattr(self, '_saved_results', None)
+        if saved is None:
+            return True  # สร้างใหม่ ไม่ได้โหลดจากฐานข้อมูล
+        return any(getattr(self, name) != value for name, value in saved.items())
+
     def calculate_grades(self):
         """Calculate grades based on subject marks and compute grade percentage."""
         if self.subject_marks:
@@ -489,32 +528,36 @@ class StudentHistory(models.Model):
         Returns:
             list: A list of dictionaries containing subject details.
         """
-        from .models import Subject  # Ensure Subject is imported
+        # อ่านจาก StudentSubjectResult ครั้งเดียว แทนการ query Subject ทีละวิชา
+        # (ใช้ผลที่ prefetch_related ไว้แล้ว ถ้ามี)
+        if 'subject_results' in getattr(self, '_prefetched_objects_cache', {}):
+            results = self.subject_results.all()
+        else:
+            results = self.subject_results.select_related('subject').order_by('id')
 
         subject_data = []
-        if self.subject_marks:
-            for subject_name, marks_obtained in self.subject_marks.items():
-                try:
-                    subject = Subject.objects.get(name=subject_name)
-                    
-                    # If a category is provided, filter subjects by category
-                    if category and subject.category != category:
-                        continue
-
-                    total_marks = subject.total_marks
-                    percentage = (marks_obtained / total_marks) * 100 if total_marks else 0
-                    grade = self.calculate_grade(percentage)
-                    status = "ผ่าน" if percentage >= 50 else "ไม่ผ่าน"
-                    subject_data.append({
-                        "name": subject_name,
-                        "marks": marks_obtained,
-                        "total_marks": total_marks,
-                        "percentage": percentage,
-                        "grade": grade,
-                        "status": status,
-                    })
-                except Subject.DoesNotExist:
-                    # Handle missing subjects gracefully
+        found = set()
+        for result in results:
+            subject = result.subject
+            if category and subject.category != category:
+                continue
+            found.add(subject.name)
+            total_marks = subject.total_marks
+            percentage = (result.marks_obtained / total_marks) * 100 if total_marks else 0
+            subject_data.append({
+                "name": subject.name,
+                "marks": result.marks_obtained,
+                "total_marks": total_marks,
+                "percentage": percentage,
+                "grade": self.calculate_grade(percentage),
+                "status": "ผ่าน" if percentage >= 50 else "ไม่ผ่าน",
+                "rank": result.subject_rank,
+            })
+
+        if not category:
+            # วิชาใน subject_marks ที่ไม่มีในตาราง Subject แล้ว
+            for subject_name, marks_obtained in (self.subject_marks or {}).items():
+                if subject_name not in found:
                     subject_data.append({
                         "name": subject_name,
                         "marks": marks_obtained,
@@ -546,5 +589,60 @@ class StudentHistory(models.Model):
     class Meta:
         verbose_name = _("ประวัติการศึกษา")
         verbose_name_plural = _("ประวัติการศึกษา")
+        indexes = [
+            models.Index(fields=['student_id', 'academic_year'], name='history_student_year_idx'),
+        ]
+
+
+class StudentSubjectResult(models.Model):
+    """One subject's mark inside a StudentHistory; the queryable form of ``subject_marks``."""
+    history = models.ForeignKey(StudentHistory, on_delete=models.CASCADE, related_name='subject_results', verbose_name=_("ประวัติการศึกษา"))
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='results', verbose_name=_("วิชา"))
+    marks_obtained = models.IntegerField(verbose_name=_("คะแนนที่ได้"))
+    subject_rank = models.PositiveIntegerField(blank=True, null=True, verbose_name=_("อันดับในวิชา"))
+
+    def __str__(self):
+        return f"{self.history} - {self.subject.name}: {self.marks_obtained}"
+
+    class Meta:
+        verbose_name = _("ผลการเรียนรายวิชา")
+        verbose_name_plural = _("ผลการเรียนรายวิชา")
+        constraints = [
+            models.UniqueConstraint(fields=['history', 'subject'], name='unique_history_subject_result'),
+        ]
+        indexes = [
+            models.Index(fields=['subject', 'marks_obtained'], name='result_subject_marks_idx'),
+        ]
 
- 
\ No newline at end of file
+ 
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'รอดำเนินการ'),
+        ('running', 'กำลังทำงาน'),
+        ('done', 'เสร็จสิ้น'),
+        ('failed', 'ล้มเหลว'),
+    ]
+
+    kind = models.CharField(max_length=50, verbose_name=_("ประเภทงาน"))
+    params = models.JSONField(default=dict, blank=True, verbose_name=_("พารามิเตอร์"))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name=_("สถานะ"))
+    progress = models.PositiveIntegerField(default=0, verbose_name=_("ความคืบหน้า"))
+    total = models.PositiveIntegerField(default=0, verbose_name=_("งานทั้งหมด"))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("จำนวนครั้งที่ทำ"))
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name=_("จำนวนครั้งสูงสุด"))
+    run_after = models.DateTimeField(default=timezone.now, verbose_name=_("เริ่มได้หลังเวลา"))
+    result = models.JSONField(blank=True, null=True, verbose_name=_("ผลลัพธ์"))
+    result_file = models.FileField(upload_to='jobs/', blank=True, null=True, verbose_name=_("ไฟล์ผลลัพธ์"))
+    error = models.TextField(blank=True, default='', verbose_name=_("ข้อผิดพลาด"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("สร้างเมื่อ"))
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name=_("เริ่มเมื่อ"))
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name=_("เสร็จเมื่อ"))
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = _("งานเบื้องหลัง")
+        verbose_name_plural = _("งานเบื้องหลัง")
+        indexes = [models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx')]
@@ -0,0 +1,124 @@
+# students/pagination.py
+"""
+Keyset (cursor) pagination for long lists.
+
+A page is fetched with ``WHERE (sort key) > (last key seen) ... LIMIT n+1``
+instead of ``OFFSET``, so page 500 costs the same as page 1, and no
+``count()`` is needed to know whether there is a next page. Cursors are
+opaque URL-safe tokens holding the boundary key, the direction and the row
+number the page starts at (for the ``ลำดับ`` column).
+"""
+import base64
+import json
+
+from django.db import connections
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+COUNT_ESTIMATE_CAP = 1000
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """``items_per_page`` from the query string, clamped to ``1..maximum``."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def encode_cursor(key, direction, start):
+    raw = json.dumps([key, direction, start], separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """``(key, direction, start)`` from a cursor token, or ``None`` if it is missing or invalid."""
+    if not token:
+        return None
+    try:
+        key, direction, start = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(key, list) or direction not in ('next', 'prev') or not isinstance(start, int):
+        return None
+    return key, direction, start
+
+
+def after_key(ordering, key, reverse=False):
+    """``Q`` for rows after ``key`` in ``ordering`` (before it when ``reverse``)."""
+    q = Q()
+    equal = Q()
+    for field, value in zip(ordering, key):
+        name = field.lstrip('-')
+        ascending = field.startswith('-') == reverse
+        q |= equal & Q(**{f'{name}__{"gt" if ascending else "lt"}': value})
+        equal &= Q(**{name: value})
+    return q
+
+
+def row_key(row, ordering):
+    return [getattr(row, field.lstrip('-')) for field in ordering]
+
+
+def keyset_page(queryset, ordering, cursor, size):
+    """
+    One page of ``queryset`` in ``ordering`` (which must end in a unique field).
+
+    Args:
+        cursor (str): token from a previous page's ``next_cursor`` /
+            ``prev_cursor``, or empty for the first page.
+
+    Returns:
+        dict: ``rows``, ``start`` (row number before the first row),
+        ``next_cursor`` and ``prev_cursor`` (``''`` when there is none).
+    """
+    decoded = decode_cursor(cursor)
+    if decoded is None or len(decoded[0]) != len(ordering):
+        key, direction, start = None, 'next', 0
+    else:
+        key, direction, start = decoded
+
+    if direction == 'prev':
+        reversed_ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        rows = list(queryset.filter(after_key(ordering, key, reverse=True)).order_by(*reversed_ordering)[:size + 1])
+        has_more_before = len(rows) > size
+        rows = rows[:size][::-1]
+        start = max(start - len(rows), 0)
+        has_prev, has_next = has_more_before, True
+    else:
+        page = queryset.order_by(*ordering)
+        if key is not None:
+            page = page.filter(after_key(ordering, key))
+        rows = list(page[:size + 1])
+        has_next = len(rows) > size
+        rows = rows[:size]
+        has_prev = key is not None
+
+    return {
+        'rows': rows,
+        'start': start,
+        'next_cursor': encode_cursor(row_key(rows[-1], ordering), 'next', start + len(rows)) if has_next and rows else '',
+        'prev_cursor': encode_cursor(row_key(rows[0], ordering), 'prev', start) if has_prev and rows else '',
+    }
+
+
+def estimated_count(queryset):
+    """
+    A cheap row count for large lists: ``(count, exact)``.
+
+    PostgreSQL uses the planner's row estimate; other databases count at
+    most ``COUNT_ESTIMATE_CAP + 1`` rows and report ``exact=False`` beyond it.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), False
+    count = queryset.order_by()[:COUNT_ESTIMATE_CAP + 1].count()
+    return min(count, COUNT_ESTIMATE_CAP), count <= COUNT_ESTIMATE_CAP
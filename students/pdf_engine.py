@@ -0,0 +1,184 @@
+# students/pdf_engine.py
+"""
+Shared reportlab setup for every PDF the app produces.
+
+The Thai font, paragraph styles, table styles and the scaled logo are built
+once per process and reused, instead of calling ``getSampleStyleSheet()``,
+building ``ParagraphStyle``/``TableStyle`` objects and decoding the logo on
+every download. Layout helpers (:func:`table`, :func:`header_row`) and the
+render functions keep page setup the same across reports.
+"""
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image as PILImage
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Image, LongTable, SimpleDocTemplate, Table, TableStyle
+
+FONT_NAME = 'THSarabunNew'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'static', 'fonts', 'THSarabunNew.ttf')
+LOGO_PATH = os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.ico')
+MARGIN = 0.5 * inch
+TABLE_CHUNK_ROWS = 200
+
+
+def register_fonts():
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+@lru_cache(maxsize=None)
+def paragraph_styles():
+    """Named ParagraphStyles shared by all reports."""
+    register_fonts()
+    return {
+        # ใบแจ้งผลการเรียน
+        'title': ParagraphStyle(name='Title', fontName=FONT_NAME, fontSize=16, alignment=1),
+        'sub_title': ParagraphStyle(name='SubTitle', fontName=FONT_NAME, fontSize=16, alignment=1),
+        'normal': ParagraphStyle(name='Normal', fontName=FONT_NAME, fontSize=16, alignment=0),
+        # รายชื่อนักเรียน
+        'list_title': ParagraphStyle(name='ListTitle', fontName=FONT_NAME, fontSize=20, alignment=1),
+        'list_info': ParagraphStyle(name='ListInfo', fontName=FONT_NAME, fontSize=18, leading=19, alignment=1),
+    }
+
+
+@lru_cache(maxsize=None)
+def table_styles():
+    """Named TableStyles shared by all reports."""
+    register_fonts()
+    return {
+        'report_card': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+            ('FONTSIZE', (0, 0), (-1, -1), 14),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('TOPPADDING', (0, 0), (-1, 0), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ]),
+        'list_header': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.8, colors.grey),
+            ('BOX', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BOTTOMPADDING', (1, 0), (-1, -1), 15),
+        ]),
+        'student_list': TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), FONT_NAME),
+            ('FONTSIZE', (0, 0), (-1, 0), 16),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 15),
+
+            ('FONTNAME', (0, 1), (-1, -1), FONT_NAME),
+            ('FONTSIZE', (0, 1), (-1, -1), 14),
+            ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 1), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 1), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 12),
+
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ]),
+    }
+
+
+@lru_cache(maxsize=None)
+def logo_png(pixels):
+    """The logo scaled to ``pixels`` square; embedding the full 256px icon took most of a small report's render time."""
+    with PILImage.open(LOGO_PATH) as source:
+        buffer = BytesIO()
+        source.convert('RGBA').resize((pixels, pixels), PILImage.LANCZOS).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def logo(size):
+    """Logo flowable ``size`` points square (pre-scaled to about 144 dpi)."""
+    return Image(BytesIO(logo_png(round(size * 2))), width=size, height=size)
+
+
+def table(data, col_widths, style, cls=Table, **kwargs):
+    """A Table with one of :func:`table_styles` (by name) or an explicit TableStyle."""
+    result = cls(data, colWidths=col_widths, **kwargs)
+    result.setStyle(table_styles()[style] if isinstance(style, str) else style)
+    return result
+
+
+def chunked_tables(header, rows, col_widths, style, chunk_rows=TABLE_CHUNK_ROWS, progress=None):
+    """
+    Lay out a long list as consecutive ``LongTable``s of ``chunk_rows`` rows.
+
+    Every table repeats ``header`` on each page it spans. Splitting a single
+    Table re-measures all of its remaining rows at every page break, so one
+    table of thousands of rows takes minutes; bounded chunks keep the
+    layout linear in the number of rows.
+
+    Args:
+        rows: iterable of row lists, consumed once.
+        progress (callable): called after each table with the number of rows laid out so far.
+    """
+    tables = []
+    chunk = []
+    done = 0
+
+    def add_table():
+        nonlocal done
+        tables.append(table([header] + chunk, col_widths, style, repeatRows=1, cls=LongTable))
+        done += len(chunk)
+        if progress:
+            progress(done)
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_rows:
+            add_table()
+            chunk = []
+    if chunk or not tables:
+        add_table()
+    return tables
+
+
+def header_row(cells, col_widths, style='list_header'):
+    """A one-row boxed header (e.g. logo | title | filter summary)."""
+    return table([cells], col_widths, style)
+
+
+def doc_template(output, pagesize=A4):
+    return SimpleDocTemplate(
+        output,
+        pagesize=pagesize,
+        topMargin=MARGIN,
+        bottomMargin=MARGIN,
+        leftMargin=MARGIN,
+        rightMargin=MARGIN,
+    )
+
+
+def render(elements, output, pagesize=A4):
+    """Build ``elements`` into ``output`` (path or binary file object); returns the page count."""
+    doc = doc_template(output, pagesize)
+    doc.build(elements)
+    return doc.page
+
+
+def render_bytes(elements, pagesize=A4):
+    buffer = BytesIO()
+    render(elements, buffer, pagesize)
+    return buffer.getvalue()
+
+
+def warm_up():
+    """Build everything cached here; used as a process-pool initializer."""
+    paragraph_styles()
+    table_styles()
+    logo_png(160)
@@ -0,0 +1,98 @@
+# students/ranking.py
+"""
+Class ranks and exam-unit percentiles, precomputed with SQL window functions.
+
+An exam unit is one level in one academic year across every school. For a
+unit, a single window query over StudentHistory gives each history its
+``RANK()`` inside its class (school, level, year, category), the class size
+and its ``PERCENT_RANK()`` inside the unit; a second one over
+StudentSubjectResult gives the rank inside the class for each subject. The
+values are stored on the rows, so pages and exports only read columns.
+
+Saving marks does not re-rank inline: :func:`schedule_ranking_refresh` queues
+one ``refresh_rankings`` background job per exam unit after commit, and skips
+units that already have one waiting, so a burst of autosaves costs one refresh.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import PercentRank, Rank
+
+from .jobs import enqueue
+from .models import Job, StudentHistory, StudentSubjectResult
+from .report_cache import RESULTS, bump_data_version
+
+
+def refresh_unit_rankings(level_name, academic_year):
+    """Recompute the ranking columns of one exam unit; returns the number of rows changed."""
+    class_partition = [F('school_name'), F('category')]
+    histories = list(
+        StudentHistory.objects.filter(level_name=level_name, academic_year=academic_year)
+        .annotate(
+            new_rank=Window(Rank(), partition_by=class_partition, order_by=F('grade_percentage').desc(nulls_last=True)),
+            new_size=Window(Count('id'), partition_by=class_partition),
+            new_percentile=Window(PercentRank(), partition_by=[F('category')], order_by=F('grade_percentage').asc(nulls_first=True)),
+        )
+        .only('id', 'class_rank', 'class_size', 'unit_percentile')
+    )
+    changed = []
+    for history in histories:
+        percentile = round(history.new_percentile * 100, 2)
+        if (history.class_rank, history.class_size, history.unit_percentile) != (history.new_rank, history.new_size, percentile):
+            history.class_rank, history.class_size, history.unit_percentile = history.new_rank, history.new_size, percentile
+            changed.append(history)
+    StudentHistory.objects.bulk_update(changed, ['class_rank', 'class_size', 'unit_percentile'], batch_size=500)
+
+    results = [
+        result for result in StudentSubjectResult.objects.filter(
+            history__level_name=level_name, history__academic_year=academic_year,
+        ).annotate(
+            new_rank=Window(
+                Rank(),
+                partition_by=[F('history__school_name'), F('subject_id')],
+                order_by=F('marks_obtained').desc(),
+            ),
+        ).only('id', 'subject_rank')
+        if result.subject_rank != result.new_rank
+    ]
+    for result in results:
+        result.subject_rank = result.new_rank
+    StudentSubjectResult.objects.bulk_update(results, ['subject_rank'], batch_size=500)
+    if changed or results:
+        bump_data_version(RESULTS)
+    return len(changed) + len(results)
+
+
+def enqueue_ranking_refresh(level_name, academic_year):
+    """Queue a ``refresh_rankings`` job for the unit unless one is already waiting; returns the job."""
+    params = {'level_name': level_name, 'academic_year': academic_year}
+    # งานที่ running อยู่อาจอ่านข้อมูลก่อนการแก้ไขนี้ไปแล้ว จึงนับเฉพาะงานที่ยังรออยู่
+    waiting = Job.objects.filter(
+        kind='refresh_rankings', status='queued',
+        params__level_name=level_name, params__academic_year=academic_year,
+    ).first()
+    return waiting or enqueue('refresh_rankings', **params)
+
+
+def schedule_ranking_refresh(histories):
+    """Queue a ranking refresh of the exam units of ``histories`` after the current transaction commits."""
+    units = {
+        (history.level_name, str(history.academic_year))
+        for history in histories
+        if history.level_name and history.academic_year
+    }
+    if not units:
+        return
+
+    def schedule():
+        for unit in sorted(units):
+            enqueue_ranking_refresh(*unit)
+
+    transaction.on_commit(schedule)
+
+
+def exam_units():
+    """Every (level, year) that has histories."""
+    return list(
+        StudentHistory.objects.exclude(level_name=None).exclude(academic_year=None)
+        .values_list('level_name', 'academic_year').distinct().order_by('academic_year', 'level_name')
+    )
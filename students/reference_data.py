@@ -0,0 +1,109 @@
+# students/reference_data.py
+"""
+Two-tier cache of small, rarely-changing reference tables.
+
+Schools, levels, subjects, provinces and the current semester are read on
+almost every page. They are loaded together with a few queries and kept:
+
+1. in module memory of each process (no I/O on a hit), and
+2. in the shared cache under a *versioned* key, so a process that starts or
+   falls behind loads the snapshot once instead of querying the database.
+
+Signals on the reference models call :func:`invalidate_reference_data`,
+which writes a new version to the shared cache. Every process compares
+its local version with the shared one on lookup, so all gunicorn workers
+(and ``run_worker``) drop stale data right after an admin edit.
+"""
+import json
+import threading
+import uuid
+from copy import copy
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import CurrentSemester, Level, Province, School, Subject
+
+VERSION_KEY = 'students:reference_version'
+DATA_KEY = 'students:reference_data:{}'
+DATA_TIMEOUT = 60 * 60 * 24
+
+_lock = threading.Lock()
+_local = {'version': None, 'data': None}
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def build_reference_data():
+    schools = list(School.objects.all())
+    provinces = list(Province.objects.all())
+    return {
+        'schools': schools,
+        'levels': list(Level.objects.all()),
+        'subjects': list(Subject.objects.all()),
+        'provinces': provinces,
+        'current_semester': CurrentSemester.objects.first(),
+        # JSON ของ dropdown ที่เรียกผ่าน AJAX
+        'schools_json': json.dumps([{'id': s.id, 'name': s.name} for s in schools], ensure_ascii=False),
+        'provinces_json': json.dumps([{'id': p.id, 'name': p.name} for p in provinces], ensure_ascii=False),
+    }
+
+
+def get_reference_data():
+    version = current_version()
+    if _local['version'] != version:
+        with _lock:
+            if _local['version'] != version:
+                data = cache.get(DATA_KEY.format(version))
+                if data is None:
+                    data = build_reference_data()
+                    cache.set(DATA_KEY.format(version), data, DATA_TIMEOUT)
+                _local.update(version=version, data=data)
+    return _local['data']
+
+
+def schools():
+    """All schools; the instances are copies, safe to annotate."""
+    return [copy(school) for school in get_reference_data()['schools']]
+
+
+def levels():
+    """All levels; the instances are copies, safe to annotate."""
+    return [copy(level) for level in get_reference_data()['levels']]
+
+
+def subjects():
+    return list(get_reference_data()['subjects'])
+
+
+def provinces():
+    return list(get_reference_data()['provinces'])
+
+
+def current_semester():
+    return get_reference_data()['current_semester']
+
+
+def schools_json():
+    return get_reference_data()['schools_json']
+
+
+def provinces_json():
+    return get_reference_data()['provinces_json']
+
+
+def invalidate_reference_data():
+    def bump():
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        _local['version'] = None
+
+    bump()
+    # อีก process อาจโหลดข้อมูลเก่าก่อน commit แล้วเก็บไว้ใต้ version ใหม่
+    transaction.on_commit(bump)
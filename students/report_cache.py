@@ -0,0 +1,177 @@
+# students/report_cache.py
+"""
+On-disk cache of generated report files (Excel / PDF) under ``MEDIA_ROOT``.
+
+A report is keyed by its kind, its parameters and the current *data
+version* of the scopes it reads. Scope versions live in the shared cache and
+are bumped after commit by signals and the bulk mark path (see
+:func:`bump_data_version`), so a changed mark makes every dependent key new
+while untouched reports keep being served from disk. The key doubles as the
+HTTP ETag. Entries are evicted least-recently-used once the directory grows
+past ``REPORT_CACHE_MAX_BYTES``.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+RESULTS = 'results'    # คะแนน, StudentHistory, วิชา
+STUDENTS = 'students'  # ข้อมูลนักเรียน, โรงเรียน, ชั้น
+
+VERSION_KEY = 'students:data_version:{}'
+
+
+def cache_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'report_cache')
+
+
+def max_bytes():
+    return getattr(settings, 'REPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+
+
+def data_version(scope):
+    version = cache.get(VERSION_KEY.format(scope))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY.format(scope), version, None):
+            version = cache.get(VERSION_KEY.format(scope), version)
+    return version
+
+
+def bump_data_version(*scopes):
+    """Give ``scopes`` a new version once the current transaction commits."""
+    def bump():
+        for scope in scopes:
+            cache.set(VERSION_KEY.format(scope), uuid.uuid4().hex, None)
+
+    transaction.on_commit(bump)
+
+
+def report_key(kind, params, scopes):
+    raw = json.dumps(
+        [kind, sorted((k, str(v)) for k, v in params.items() if v not in (None, '')), [data_version(s) for s in scopes]],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def cached_entry(key):
+    """``(path, file name)`` of a cached report, or ``None``."""
+    entry = os.path.join(cache_dir(), key)
+    try:
+        names = os.listdir(entry)
+    except FileNotFoundError:
+        return None
+    names = [name for name in names if not name.startswith('.')]
+    if not names:
+        return None
+    try:
+        os.utime(entry)  # ใช้ mtime ของโฟลเดอร์เป็นเวลาที่ใช้ล่าสุด (LRU)
+    except FileNotFoundError:
+        return None  # worker อื่น evict ไปแล้ว
+    return os.path.join(entry, names[0]), names[0]
+
+
+def open_entry(key, build, entry=None):
+    """
+    Open the cached file of ``key`` (building it on a miss); returns ``(file, file name)``.
+
+    Another worker sharing ``MEDIA_ROOT`` may evict the entry between listing
+    and opening it, so a vanished file is rebuilt once.
+    """
+    entry = entry or cached_entry(key)
+    for _ in range(2):
+        if entry is None:
+            entry = store_entry(key, build)
+        if entry is not None:
+            try:
+                return open(entry[0], 'rb'), entry[1]
+            except FileNotFoundError:
+                pass
+        entry = None
+    raise FileNotFoundError(f"Report cache entry {key} was evicted while it was being served")
+
+
+def store_entry(key, build):
+    """Run ``build(output)`` (returns the file name) and move the file into the cache atomically."""
+    root = cache_dir()
+    os.makedirs(root, exist_ok=True)
+    work = tempfile.mkdtemp(prefix='.tmp-', dir=root)
+    try:
+        with tempfile.NamedTemporaryFile(dir=work, delete=False) as output:
+            filename = build(output)
+        os.rename(output.name, os.path.join(work, filename.replace(os.sep, '-')))
+        try:
+            os.rename(work, os.path.join(root, key))
+        except OSError:
+            # อีก request สร้างไฟล์เดียวกันเสร็จก่อน
+            shutil.rmtree(work, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    evict(keep=key)
+    return cached_entry(key)
+
+
+def evict(keep=None):
+    """Delete least recently used entries (except ``keep``) until the cache fits ``REPORT_CACHE_MAX_BYTES``."""
+    root = cache_dir()
+    entries = []
+    total = 0
+    for entry in os.scandir(root):
+        if not entry.is_dir() or entry.name.startswith('.') or entry.name == keep:
+            continue
+        try:
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            mtime = entry.stat().st_mtime
+        except OSError:
+            continue  # worker อื่นลบไปแล้ว
+        entries.append((mtime, size, entry.path))
+        total += size
+    for _, size, path in sorted(entries):
+        if total <= max_bytes():
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def cached_report_response(request, kind, params, scopes, build, content_type):
+    """
+    Serve a report from the disk cache, building it on a miss.
+
+    Args:
+        kind (str): report name, part of the key.
+        params (dict): the parameters that select the report's data.
+        scopes (tuple): data-version scopes the report reads (:data:`RESULTS`, :data:`STUDENTS`).
+        build (callable): ``build(output)`` writes the file and returns its name.
+        content_type (str): response content type.
+
+    Returns a 304 when the client's ETag (or Last-Modified) is still current.
+    """
+    key = report_key(kind, params, scopes)
+    etag = f'"{key}"'
+    entry = cached_entry(key)
+    try:
+        last_modified = os.path.getmtime(entry[0]) if entry else None
+    except FileNotFoundError:
+        entry = last_modified = None
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    file, filename = open_entry(key, build, entry)
+    response = FileResponse(file, as_attachment=True, filename=filename, content_type=content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(os.fstat(file.fileno()).st_mtime)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,198 @@
+# students/report_cards.py
+"""
+Student report cards (ผลการเรียน PDF), one student or a whole class.
+
+:func:`report_card_elements` builds the flowables used by the single
+download in ``views.download_result_pdfs``. For a class,
+:func:`class_report_cards` collects every card's data with a few queries
+into plain dicts, and :func:`render_report_cards` renders them either as one
+merged PDF or as a zip of per-student PDFs spread over a
+``ProcessPoolExecutor``. Fonts, styles and the scaled logo come from
+:mod:`students.pdf_engine` and are built once per process, not once per card.
+
+Only the zip is rendered in parallel: reportlab cannot append one PDF to
+another and no PDF merge library is a dependency, so the merged PDF is laid
+out as one document in a single process.
+"""
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.db import connections
+from django.db.models import Prefetch
+from reportlab.platypus import PageBreak, Paragraph, Spacer
+
+from . import pdf_engine
+from .models import Student, StudentHistory, StudentSubjectResult
+
+LOGO_SIZE = 80
+
+
+def format_subject_data(data):
+    """Rows for the report-card table from ``StudentHistory.get_subject_data`` output."""
+    return [(s['name'], s['marks'], f"{round(s['percentage'])}%", s['status']) for s in data]
+
+
+def report_card_elements(gender, semester_1_data, semester_2_data, academic_year, student_name,
+                         school_name, level_name, selected_semester=None):
+    """Flowables of one report card."""
+    styles = pdf_engine.paragraph_styles()
+    title_style, sub_title_style, normal_style = styles['title'], styles['sub_title'], styles['normal']
+
+    # Logo
+    logo = pdf_engine.logo(LOGO_SIZE)
+    logo.hAlign = 'CENTER'
+
+    # Header
+    header = Paragraph("สมาคมคุรุสัมพันธ์อิสลามแห่งประเทศไทย ประจำหน่วยสอบที่ 80", title_style)
+    school_name_paragraph = Paragraph(f"โรงเรียน {school_name}", sub_title_style)
+    prefix = 'เด็กชาย' if gender == 'ชาย' else 'เด็กหญิง' if gender == 'หญิง' else ''
+    student_info = Paragraph(f"ผลการเรียนของ {prefix} {student_name} {level_name}", normal_style)
+    academic_year_text = Paragraph(f"ประจำปีการศึกษา {academic_year}", normal_style)
+
+    # Tables
+    def generate_table(data):
+        if not data:
+            return Paragraph("ยังไม่มีข้อมูลสำหรับภาคนี้", sub_title_style)
+        return pdf_engine.table(
+            [['วิชา', 'คะแนน', 'เกรด', 'ผ่าน/ไม่ผ่าน']] + list(data), [200, 100, 100, 100], 'report_card',
+        )
+
+    elements = [
+        logo,
+        Spacer(1, 10),
+        header,
+        Spacer(1, 20),
+        school_name_paragraph,
+        Spacer(1, 20),
+        student_info,
+        Spacer(1, 10),
+        academic_year_text,
+        Spacer(1, 20),
+    ]
+
+    if selected_semester == '1':
+        if semester_1_data:
+            elements += [Paragraph("ผลการเรียนภาคทฤษฎี", title_style), Spacer(1, 20), generate_table(semester_1_data)]
+    elif selected_semester == '2':
+        if semester_2_data:
+            elements += [Paragraph("ผลการเรียนภาคปฏิบัติ", title_style), Spacer(1, 20), generate_table(semester_2_data)]
+    else:
+        if semester_1_data:
+            elements += [
+                Paragraph("ผลการเรียนภาคทฤษฎี", title_style),
+                Spacer(1, 20),
+                generate_table(semester_1_data),
+                Spacer(1, 15),
+            ]
+        if semester_2_data:
+            elements += [Paragraph("ผลการเรียนภาคปฏิบัติ", title_style), Spacer(1, 20), generate_table(semester_2_data)]
+    return elements
+
+
+def class_report_cards(school_name, level_name, academic_year):
+    """
+    Report-card data for every student of a class, as picklable dicts.
+
+    Uses three queries (histories, their subject results, students) whatever
+    the class size.
+    """
+    histories = (
+        StudentHistory.objects.filter(school_name=school_name, level_name=level_name, academic_year=str(academic_year))
+        .prefetch_related(Prefetch(
+            'subject_results', queryset=StudentSubjectResult.objects.select_related('subject').order_by('id'),
+        ))
+        .order_by('student_name', 'id')
+    )
+    cards = {}
+    for history in histories:
+        card = cards.setdefault(history.student_id, {
+            'student_id': history.student_id,
+            'semester_1_data': [],
+            'semester_2_data': [],
+        })
+        category = history.category or 1
+        card[f'semester_{category}_data'] = format_subject_data(history.get_subject_data(category=category))
+
+    students = Student.objects.in_bulk([str(student_id) for student_id in cards])
+    thai_year = str(int(academic_year) + 543)
+    payloads = []
+    for student_id, card in cards.items():
+        student = students.get(str(student_id))
+        if student is None:
+            continue
+        card.update({
+            'gender': student.gender,
+            'academic_year': thai_year,
+            'student_name': f"{student.first_name}_{student.last_name}",
+            'school_name': school_name,
+            'level_name': level_name,
+        })
+        payloads.append(card)
+    return payloads
+
+
+def card_filename(card):
+    return f"{card['student_id']}_{card['student_name']}_results_{card['academic_year']}.pdf".replace('/', '-')
+
+
+def card_elements(card):
+    return report_card_elements(
+        card['gender'], card['semester_1_data'], card['semester_2_data'], card['academic_year'],
+        card['student_name'], card['school_name'], card['level_name'],
+    )
+
+
+def render_report_card(card):
+    """Render one card; returns ``(file name, PDF bytes, pages)``."""
+    buffer = BytesIO()
+    pages = pdf_engine.render(card_elements(card), buffer)
+    return card_filename(card), buffer.getvalue(), pages
+
+
+def render_report_cards(cards, output, fmt='zip', workers=1):
+    """
+    Write the cards of a class to ``output``.
+
+    Args:
+        cards (list): dicts from :func:`class_report_cards`.
+        output: binary file object.
+        fmt (str): ``'pdf'`` for one merged document (a page break between
+            students, always built in this process; ``workers`` is ignored)
+            or ``'zip'`` for a zip of per-student PDFs rendered by
+            ``workers`` processes.
+
+    Returns:
+        dict: ``cards``, ``pages``, ``seconds`` and ``pages_per_second``.
+    """
+    started = time.perf_counter()
+    if fmt == 'pdf':
+        elements = []
+        for card in cards:
+            if elements:
+                elements.append(PageBreak())
+            elements += card_elements(card)
+        pages = pdf_engine.render(elements or [Paragraph("ไม่มีข้อมูล", pdf_engine.paragraph_styles()['normal'])], output)
+    else:
+        pages = 0
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            if workers > 1:
+                # connection ที่เปิดอยู่ห้ามส่งต่อให้ process ลูก
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=workers, initializer=pdf_engine.warm_up) as pool:
+                    rendered = pool.map(render_report_card, cards, chunksize=max(1, len(cards) // (workers * 4)))
+                    for filename, content, card_pages in rendered:
+                        archive.writestr(filename, content)
+                        pages += card_pages
+            else:
+                for filename, content, card_pages in map(render_report_card, cards):
+                    archive.writestr(filename, content)
+                    pages += card_pages
+    seconds = time.perf_counter() - started
+    return {
+        'cards': len(cards),
+        'pages': pages,
+        'seconds': round(seconds, 3),
+        'pages_per_second': round(pages / seconds, 1) if seconds else 0,
+    }
@@ -0,0 +1,175 @@
+# students/search.py
+"""
+Student name / ID search index.
+
+Each student has one normalized *document* (Thai, English and Arabic names,
+the student ID and ``id_number``) in ``students_student_search``:
+
+* SQLite: an FTS5 table with the ``trigram`` tokenizer.
+* PostgreSQL: a plain table with a ``pg_trgm`` GIN index.
+
+Thai is written without spaces between words, so the index is built on
+character trigrams rather than word tokens: any part of a name of three or
+more characters is an indexed lookup, and "สมชายใจดี" matches as well as
+"สมชาย ใจดี". Text is normalized the same way on both sides (NFKC, case
+folding, zero-width characters, Arabic diacritics and Thai title prefixes
+removed). Signals keep the index in sync; ``manage.py rebuild_search_index``
+rebuilds it.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'students_student_search'
+DOCUMENT_FIELDS = (
+    'first_name', 'last_name', 'english_first_name', 'english_last_name',
+    'arabic_first_name', 'arabic_last_name', 'id', 'id_number',
+)
+MIN_INDEXED_LENGTH = 3  # trigram
+# ยาวก่อนสั้น ("นางสาว" ก่อน "นาง")
+THAI_TITLES = ('เด็กหญิง', 'เด็กชาย', 'นางสาว', 'ด.ช.', 'ด.ญ.', 'นาย', 'นาง', 'น.ส.')
+IGNORED_CHARACTERS = re.compile(
+    '[\u200b-\u200d\ufeff'      # zero-width
+    '\u0640\u064b-\u065f\u0670]'  # ตัทวีล / ฮะเราะกาตภาษาอาหรับ
+)
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return ' '.join(IGNORED_CHARACTERS.sub('', text).split())
+
+
+def student_document(student):
+    """Normalized search text of a student (any object with the ``Student`` fields)."""
+    values = [getattr(student, field) for field in DOCUMENT_FIELDS]
+    # ชื่อ+นามสกุลติดกัน ให้ค้นแบบไม่เว้นวรรคได้
+    values.append(f"{student.first_name}{student.last_name}")
+    return normalize(' '.join(str(value) for value in values if value))
+
+
+def query_terms(text):
+    """Normalized search terms of ``text`` with Thai titles removed ("เด็กชาย สมชาย" and "เด็กชายสมชาย" -> ["สมชาย"])."""
+    terms = []
+    for term in normalize(text).split():
+        for title in THAI_TITLES:
+            if term.startswith(title):
+                term = term[len(title):]
+                break
+        if term:
+            terms.append(term)
+    return terms
+
+
+def create_index(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+            f"USING fts5(student_id UNINDEXED, document, tokenize='trigram')"
+        )
+    elif schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (student_id varchar(9) PRIMARY KEY, document text NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_trgm ON {SEARCH_TABLE} USING gin (document gin_trgm_ops)"
+        )
+
+
+def drop_index(schema_editor):
+    if has_index(schema_editor.connection):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def has_index(conn=connection):
+    return conn.vendor in ('sqlite', 'postgresql')
+
+
+def index_students(students, conn=connection):
+    """Add or replace the index entries of ``students``."""
+    if not has_index(conn):
+        return
+    rows = [(str(student.pk), student_document(student)) for student in students]
+    if not rows:
+        return
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (student_id, document) VALUES (%s, %s) "
+                f"ON CONFLICT (student_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+        else:
+            # FTS5 ไม่มี upsert
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE student_id = %s", [(pk,) for pk, _ in rows])
+            cursor.executemany(f"INSERT INTO {SEARCH_TABLE} (student_id, document) VALUES (%s, %s)", rows)
+
+
+def remove_students(student_ids, conn=connection):
+    if not has_index(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE student_id = %s", [(str(pk),) for pk in student_ids])
+
+
+def rebuild_index(students, conn=connection, batch_size=2000):
+    """Replace the whole index with ``students`` (a queryset); returns the number indexed."""
+    if not has_index(conn):
+        return 0
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    batch = []
+    total = 0
+    for student in students.only(*DOCUMENT_FIELDS).iterator(chunk_size=batch_size):
+        batch.append(student)
+        if len(batch) == batch_size:
+            index_students(batch, conn)
+            total += len(batch)
+            batch = []
+    index_students(batch, conn)
+    return total + len(batch)
+
+
+def like_pattern(term):
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def search_filter(text):
+    """
+    A ``Q`` matching students whose names or IDs contain every term of ``text``.
+
+    Returns ``None`` for an empty search.
+    """
+    terms = query_terms(text)
+    if not terms:
+        return None
+
+    if not has_index():
+        q = Q()
+        for term in terms:
+            term_q = Q()
+            for field in DOCUMENT_FIELDS:
+                term_q |= Q(**{f'{field}__icontains': term})
+            q &= term_q
+        return q
+
+    conditions, params = [], []
+    long_terms = [term for term in terms if len(term) >= MIN_INDEXED_LENGTH]
+    if long_terms and connection.vendor == 'sqlite':
+        conditions.append(f"{SEARCH_TABLE} MATCH %s")
+        params.append(' AND '.join('"{}"'.format(term.replace('"', '""')) for term in long_terms))
+        terms = [term for term in terms if len(term) < MIN_INDEXED_LENGTH]
+    for term in terms:
+        # สั้นกว่า 3 ตัวอักษร (หรือ PostgreSQL ที่ LIKE ใช้ index trigram ได้เอง)
+        conditions.append("document LIKE %s ESCAPE '\\'")
+        params.append(like_pattern(term))
+    sql = f"SELECT student_id FROM {SEARCH_TABLE} WHERE " + ' AND '.join(conditions)
+    return Q(pk__in=RawSQL(sql, params))
+
+
+def search_students(queryset, text):
+    q = search_filter(text)
+    return queryset if q is None else queryset.filter(q)
@@ -1,12 +1,19 @@
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_migrate, post_save, post_delete
 from django.dispatch import receiver
 from .models import *
+from .academic_years import invalidate_academic_years, register_academic_years
+from .curriculum import invalidate_curriculum
+from .reference_data import invalidate_reference_data
+from .marks import sync_subject_results
+from .report_cache import RESULTS, STUDENTS, bump_data_version
+from .search import index_students, remove_students
+from .statistics import invalidate_class_statistics
 from django.utils import timezone
 
 @receiver(post_migrate)
 def create_default_current_semester(sender, **kwargs):
     if not CurrentSemester.objects.exists():
-        CurrentSemester.objects.create(semester=1, year=timezone.now().year)
+        CurrentSemester.objects.create(category=1, year=timezone.now().year)
         print("Default CurrentSemester (เทอม 1) created.")
 
 @receiver(post_migrate)
@@ -60,4 +67,79 @@ def create_default_subject_to_study(sender, **kwargs):
                     level=level
                 )
 
-    print("Default SubjectToStudy records created.")
\ No newline at end of file
+    print("Default SubjectToStudy records created.")
+
+@receiver(post_save, sender=StudentHistory)
+def register_history_academic_year(sender, instance, **kwargs):
+    register_academic_years([instance.academic_year])
+
+
+@receiver(post_save, sender=StudentHistory)
+def sync_history_subject_results(sender, instance, update_fields=None, **kwargs):
+    # แก้ชื่อนักเรียนหรือบันทึกซ้ำโดยคะแนนไม่เปลี่ยน ไม่ต้องสร้างผลรายวิชา/อันดับใหม่
+    if instance.result_fields_changed(update_fields):
+        sync_subject_results([instance])
+    instance.remember_result_fields()
+
+
+@receiver(post_delete, sender=StudentHistory)
+def history_deleted(sender, instance, **kwargs):
+    invalidate_class_statistics([(instance.school_name, instance.level_name, instance.academic_year)])
+    bump_data_version(RESULTS)
+
+
+@receiver(post_save, sender=AcademicYear)
+@receiver(post_delete, sender=AcademicYear)
+def academic_years_changed(sender, **kwargs):
+    invalidate_academic_years()
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=SubjectToStudy)
+@receiver(post_delete, sender=SubjectToStudy)
+@receiver(post_save, sender=Level)
+@receiver(post_delete, sender=Level)
+def curriculum_changed(sender, **kwargs):
+    invalidate_curriculum()
+    bump_data_version(RESULTS)
+
+
+# ทุกอย่างที่แสดงในรายงานรายชื่อนักเรียน (ชื่อโรงเรียน, ชั้น, ปีการศึกษา)
+# bump_data_version เปลี่ยน version หลัง commit เท่านั้น
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=CurrentStudy)
+@receiver(post_delete, sender=CurrentStudy)
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+@receiver(post_save, sender=Level)
+@receiver(post_delete, sender=Level)
+@receiver(post_save, sender=CurrentSemester)
+@receiver(post_delete, sender=CurrentSemester)
+def student_data_changed(sender, **kwargs):
+    bump_data_version(STUDENTS)
+
+
+@receiver(post_save, sender=Student)
+def index_student(sender, instance, **kwargs):
+    index_students([instance])
+
+
+@receiver(post_delete, sender=Student)
+def unindex_student(sender, instance, **kwargs):
+    remove_students([instance.pk])
+
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+@receiver(post_save, sender=Level)
+@receiver(post_delete, sender=Level)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Province)
+@receiver(post_delete, sender=Province)
+@receiver(post_save, sender=CurrentSemester)
+@receiver(post_delete, sender=CurrentSemester)
+def reference_data_changed(sender, **kwargs):
+    invalidate_reference_data()
@@ -0,0 +1,92 @@
+# students/statistics.py
+"""
+Per-subject statistics for one class (school, level, academic year).
+
+All marks of the class are fetched with a single ``values_list`` query on
+StudentSubjectResult and summarised with NumPy, then the result is cached
+until marks of that class change (see :func:`invalidate_class_statistics`,
+called from ``marks.sync_subject_results`` and the history delete signal).
+"""
+import hashlib
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import StudentSubjectResult, Subject
+
+CACHE_PREFIX = 'students:class_stats'
+HISTOGRAM_BINS = np.linspace(0, 100, 11)  # ช่วงละ 10% ของคะแนนเต็ม
+PASS_PERCENTAGE = 50
+
+
+def cache_key(school_name, level_name, academic_year):
+    # ชื่อโรงเรียน/ชั้นมีช่องว่างและอักษรไทย จึงใช้ hash เป็น key
+    raw = f"{school_name}\0{level_name}\0{academic_year}".encode()
+    return f"{CACHE_PREFIX}:{hashlib.md5(raw).hexdigest()}"
+
+
+def invalidate_class_statistics(classes):
+    """Drop cached statistics for ``classes``, an iterable of (school, level, year), after commit."""
+    keys = [cache_key(*key) for key in set(classes)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def summarize_subject(marks, total_marks):
+    """Statistics of one subject's marks (a NumPy array)."""
+    percentages = marks / total_marks * 100 if total_marks else np.zeros_like(marks)
+    histogram, _ = np.histogram(np.clip(percentages, 0, 100), bins=HISTOGRAM_BINS)
+    return {
+        'count': int(marks.size),
+        'mean': round(float(marks.mean()), 2),
+        'median': round(float(np.median(marks)), 2),
+        'std': round(float(marks.std()), 2),
+        'min': int(marks.min()),
+        'max': int(marks.max()),
+        'pass_rate': round(float((percentages >= PASS_PERCENTAGE).mean() * 100), 1),
+        'histogram': histogram.tolist(),
+    }
+
+
+def compute_class_statistics(school_name, level_name, academic_year):
+    rows = StudentSubjectResult.objects.filter(
+        history__school_name=school_name,
+        history__level_name=level_name,
+        history__academic_year=str(academic_year),
+    ).values_list('subject_id', 'marks_obtained')
+    data = np.array(list(rows), dtype=float).reshape(-1, 2)
+    subject_ids, marks = data[:, 0].astype(int), data[:, 1]
+
+    subjects = []
+    for subject in Subject.objects.filter(id__in=np.unique(subject_ids).tolist()).order_by('category', 'id'):
+        stats = summarize_subject(marks[subject_ids == subject.id], float(subject.total_marks))
+        stats.update({
+            'id': subject.id,
+            'name': subject.name,
+            'category': subject.category,
+            'total_marks': float(subject.total_marks),
+        })
+        subjects.append(stats)
+    return {
+        'histogram_bins': HISTOGRAM_BINS.astype(int).tolist(),
+        'subjects': subjects,
+    }
+
+
+def get_class_statistics(school_name, level_name, academic_year):
+    """
+    Cached per-subject statistics for a class.
+
+    Returns:
+        dict: ``histogram_bins`` (percentage edges) and ``subjects``, a list of
+        dicts with ``id``, ``name``, ``category``, ``total_marks``, ``count``,
+        ``mean``, ``median``, ``std``, ``min``, ``max``, ``pass_rate`` (%) and
+        ``histogram`` (students per 10% band).
+    """
+    key = cache_key(school_name, level_name, academic_year)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_class_statistics(school_name, level_name, academic_year)
+        cache.set(key, stats, None)
+    return stats
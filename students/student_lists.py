@@ -0,0 +1,75 @@
+# students/student_lists.py
+"""
+Student list reports (sp_student_report) - shared data.
+
+:func:`build_student_list` reads the filtered students once, with one joined
+``values_list`` query, and derives everything a list report shows from those
+rows in memory: the numbered table rows, the header summary (one school /
+level / year / gender / special status, or "all") and the counts. The PDF
+and the Excel list both render from it.
+"""
+from collections import Counter
+
+STUDENT_LIST_FIELDS = (
+    'first_name', 'last_name', 'gender', 'current_study__school__name', 'special_status',
+    'current_study__level__name', 'current_study__current_semester__year',
+)
+STUDENT_LIST_HEADERS = ['ลำดับ', 'ชื่อ', 'นามสกุล', 'เพศ', 'โรงเรียน', 'สถานะพิเศษ']
+MISSING = 'ไม่มีข้อมูล'
+
+
+def single_or(values, default):
+    """The value when every row shares one, else ``default``."""
+    return next(iter(values)) if len(values) == 1 else default
+
+
+def thai_year(academic_year):
+    return str(int(academic_year) + 543) if str(academic_year).isdigit() else academic_year
+
+
+def build_student_list(students):
+    """
+    Rows and summaries of a student list from one query.
+
+    Args:
+        students (QuerySet): filtered ``Student`` queryset, in output order.
+
+    Returns:
+        dict: ``rows`` (lists matching :data:`STUDENT_LIST_HEADERS`),
+        ``school``, ``level``, ``academic_year`` (พ.ศ.), ``gender``,
+        ``special_status``, ``total`` and ``gender_counts``.
+    """
+    rows = []
+    genders, statuses, schools, levels, years = set(), set(), set(), set(), set()
+    gender_counts = Counter()
+    values = students.values_list(*STUDENT_LIST_FIELDS).iterator(chunk_size=2000)
+    for i, (first_name, last_name, gender, school, special_status, level, year) in enumerate(values, start=1):
+        rows.append([i, first_name, last_name, gender or MISSING, school or MISSING, special_status or MISSING])
+        genders.add(gender)
+        statuses.add(special_status)
+        schools.add(school)
+        levels.add(level)
+        years.add(year)
+        gender_counts[gender] += 1
+
+    return {
+        'rows': rows,
+        'school': single_or(schools, "ทุกโรงเรียน"),
+        'level': single_or(levels, "ทุกชั้น"),
+        'academic_year': thai_year(single_or(years, "ทุกปี")),
+        'gender': single_or(genders, "ทุกเพศ"),
+        'special_status': single_or(statuses, "ทุกสถานะพิเศษ"),
+        'total': len(rows),
+        'gender_counts': dict(gender_counts),
+    }
+
+
+def header_text(student_list):
+    return (
+        f"ชั้น: {student_list['level']} | ปีการศึกษา: {student_list['academic_year']} | "
+        f"เพศ: {student_list['gender']} | สถานะพิเศษ: {student_list['special_status']}"
+    )
+
+
+def report_filename(student_list, extension):
+    return f"students_report_{student_list['academic_year'] or 'all'}.{extension}"
@@ -0,0 +1,101 @@
+# students/tasks.py
+"""Task handlers run by ``manage.py run_worker``."""
+from io import BytesIO
+
+from . import reference_data
+from .jobs import save_result_file, set_progress, task
+from .marks import get_class_studies, get_level_subjects, save_grade_sheet
+from .models import StudentHistory
+from .ranking import refresh_unit_rankings
+
+
+@task('grade_sheet')
+def grade_sheet_task(job, school_name, level_name, academic_year, cells):
+    studies = get_class_studies(reference_data.current_semester(), school_name, level_name, active_only=True)
+    subjects = get_level_subjects(level_name)
+    set_progress(job, 0, len(studies))
+    written = save_grade_sheet(
+        studies, subjects, academic_year,
+        {(student_id, sts_id): value for student_id, sts_id, value in cells},
+    )
+    return {'histories_written': len(written)}
+
+
+@task('refresh_rankings')
+def refresh_rankings_task(job, level_name, academic_year):
+    return {'rows_updated': refresh_unit_rankings(level_name, academic_year)}
+
+
+@task('students_pdf')
+def students_pdf_task(job, filters):
+    from .views import filter_students, render_students_pdf
+
+    students = filter_students(filters)
+    set_progress(job, 0, students.count())
+    buffer = BytesIO()
+    filename = render_students_pdf(students, buffer, progress=lambda done: set_progress(job, done))
+    save_result_file(job, filename, buffer.getvalue())
+    return {'filename': filename}
+
+
+@task('student_results_excel')
+def student_results_excel_task(job, school_name, level_name, academic_year):
+    from .workbooks import build_student_results_workbook
+
+    histories = StudentHistory.objects.all()
+    if school_name:
+        histories = histories.filter(school_name=school_name)
+    if level_name:
+        histories = histories.filter(level_name=level_name)
+    if academic_year:
+        histories = histories.filter(academic_year=academic_year)
+    set_progress(job, 0, histories.count())
+
+    wb, filename = build_student_results_workbook(
+        school_name, level_name, academic_year, progress=lambda done: set_progress(job, done),
+    )
+    buffer = BytesIO()
+    wb.save(buffer)
+    save_result_file(job, filename, buffer.getvalue())
+    return {'filename': filename}
+
+
+@task('unit_results_excel')
+def unit_results_excel_task(job, level_name, academic_year):
+    from .workbooks import build_unit_workbook, filtered_histories
+
+    set_progress(job, 0, filtered_histories(level_name=level_name, academic_year=academic_year).count())
+    wb, filename = build_unit_workbook(academic_year, level_name, progress=lambda done: set_progress(job, done))
+    buffer = BytesIO()
+    wb.save(buffer)
+    save_result_file(job, filename, buffer.getvalue())
+    return {'filename': filename}
+
+
+@task('report_cards')
+def report_cards_task(job, school_name, level_name, academic_year, fmt='zip'):
+    import os
+    from .report_cards import class_report_cards, render_report_cards
+
+    cards = class_report_cards(school_name, level_name, academic_year)
+    set_progress(job, 0, len(cards))
+    buffer = BytesIO()
+    stats = render_report_cards(cards, buffer, fmt, workers=min(4, os.cpu_count() or 1))
+    filename = f"ผลการเรียน_{school_name}_{level_name}_{int(academic_year) + 543}.{fmt}"
+    save_result_file(job, filename, buffer.getvalue())
+    return {'filename': filename, **stats}
+
+
+@task('import_marks')
+def import_marks_task(job, path, academic_year):
+    from django.core.files.storage import default_storage
+    from .imports import import_marks_workbook
+
+    try:
+        with default_storage.open(path, 'rb') as upload:
+            return import_marks_workbook(
+                upload, academic_year,
+                progress=lambda done, total: set_progress(job, done, total),
+            )
+    finally:
+        default_storage.delete(path)
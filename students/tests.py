@@ -1,3 +1,790 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+import openpyxl
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import pdf_engine, reference_data, report_cache, tasks  # noqa: F401
+from .academic_years import check_academic_years, get_academic_years
+from .facets import student_counts, student_facets
+from .imports import import_marks_workbook
+from .jobs import TASKS, claim_next_job, cleanup_jobs, enqueue, run_job, save_result_file, task
+from .marks import (
+    InvalidMarkError, get_class_studies, get_level_subjects, load_mark_matrix,
+    parse_grade_sheet, rebuild_histories, save_grade_sheet,
+)
+from .models import *
+from .report_cache import STUDENTS, cache_dir, data_version
+from .report_cards import class_report_cards, render_report_cards
+from .search import search_students
+from .statistics import get_class_statistics
+from .student_lists import build_student_list
+from .views import render_students_pdf
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class GradeSheetTestCase(TestCase):
+    """Shared fixture: one school/level with a handful of students and subjects."""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.semester = CurrentSemester.objects.first()
+        self.academic_year = self.semester.year
+        self.school = School.objects.create(name="โรงเรียนทดสอบ")
+        self.level = Level.objects.create(name="ระดับทดสอบ")
+        self.subjects = [
+            SubjectToStudy.objects.create(
+                subject=Subject.objects.create(name=f"วิชา {i}", total_marks=100, category=1),
+                level=self.level,
+            )
+            for i in range(4)
+        ]
+        self.students = []
+        self.add_students(3)
+
+    def add_students(self, count):
+        for _ in range(count):
+            student = Student.objects.create(
+                first_name="นักเรียน",
+                last_name=str(len(self.students)),
+                date_of_birth=date(2012, 1, 1),
+                id_number=str(1000000000000 + len(self.students)),
+                gender='ชาย',
+            )
+            CurrentStudy.objects.create(student=student, school=self.school, level=self.level)
+            self.students.append(student)
+
+    def post_sheet(self, value):
+        studies = get_class_studies(self.semester, self.school.name, self.level.name, active_only=True)
+        subjects = get_level_subjects(self.level.name)
+        data = {f"marks_{s.id}_{sts.subject_id}": value for s in self.students for sts in self.subjects}
+        save_grade_sheet(studies, subjects, self.academic_year, parse_grade_sheet(data, studies, subjects))
+
+    def login_teacher(self):
+        session = self.client.session
+        session['user_type'] = 'teacher'
+        session.save()
+
+
+class MarkMatrixTests(GradeSheetTestCase):
+    def test_matrix_pivots_saved_marks(self):
+        StudentMarkForSubject.objects.create(
+            student=self.students[0],
+            subject_to_study=self.subjects[1],
+            marks_obtained=42,
+            academic_year=self.academic_year,
+        )
+        studies = get_class_studies(self.semester, self.school.name, self.level.name)
+        subjects = get_level_subjects(self.level.name)
+
+        with self.assertNumQueries(1):
+            matrix = load_mark_matrix(studies, subjects, self.academic_year)
+
+        self.assertEqual(len(matrix), 3)
+        self.assertEqual(matrix[0]['student'], self.students[0])
+        self.assertEqual(matrix[0][self.subjects[1].subject_id], 42)
+        self.assertEqual(matrix[0][self.subjects[0].subject_id], '')
+        self.assertEqual(matrix[1][self.subjects[1].subject_id], '')
+
+    def test_grade_form_query_count_is_constant(self):
+        self.login_teacher()
+        url = reverse('ingr_student')
+        params = {
+            'school': self.school.name,
+            'level': self.level.name,
+            'academic_year': self.academic_year + 543,
+        }
+
+        self.client.get(url, params)  # เติม cache ก่อนนับ query
+        with CaptureQueriesContext(connection) as small_class:
+            self.client.get(url, params)
+        self.add_students(20)
+        with CaptureQueriesContext(connection) as large_class:
+            response = self.client.get(url, params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['student_marks_data']), 23)
+        self.assertEqual(len(small_class), len(large_class))
+
+
+class CurriculumMatrixTests(GradeSheetTestCase):
+    def test_matrix_is_reused_until_curriculum_changes(self):
+        self.assertEqual(len(get_level_subjects(self.level.name)), 4)
+        with self.assertNumQueries(0):
+            subjects = get_level_subjects(self.level.name)
+        self.assertEqual([sts.subject.name for sts in subjects], [f"วิชา {i}" for i in range(4)])
+
+        self.subjects[0].delete()
+        self.assertEqual(len(get_level_subjects(self.level.name)), 3)
+
+    def test_levels_sharing_a_name_keep_all_subjects(self):
+        twin = Level.objects.create(name=self.level.name)
+        extra = SubjectToStudy.objects.create(
+            subject=Subject.objects.create(name="วิชาเพิ่ม", total_marks=100, category=1), level=twin,
+        )
+        subjects = get_level_subjects(self.level.name.upper())
+        self.assertEqual([sts.id for sts in subjects], [sts.id for sts in self.subjects] + [extra.id])
+
+
+class GradeSheetSaveTests(GradeSheetTestCase):
+    def test_resubmitting_updates_marks_in_place(self):
+        self.post_sheet('40')
+        self.post_sheet('60')
+
+        self.assertEqual(StudentMarkForSubject.objects.count(), 3 * 4)
+        self.assertEqual(set(StudentMarkForSubject.objects.values_list('marks_obtained', flat=True)), {60})
+        self.assertEqual(StudentHistory.objects.count(), 3)
+        history = StudentHistory.objects.get(student_id=self.students[0].id)
+        self.assertEqual(history.obtained_marks, 240)
+        self.assertEqual(history.total_marks, 400)
+        self.assertEqual(history.pass_or_fail, "ผ่าน")
+        self.assertEqual(history.subject_marks["วิชา 0"], 60)
+
+    def test_invalid_cell_is_rejected_before_saving(self):
+        studies = get_class_studies(self.semester, self.school.name, self.level.name)
+        data = {f"marks_{self.students[0].id}_{self.subjects[0].subject_id}": 'abc'}
+
+        with self.assertRaises(InvalidMarkError):
+            parse_grade_sheet(data, studies, get_level_subjects(self.level.name))
+
+    def test_changed_cell_adjusts_only_that_student(self):
+        self.post_sheet('40')
+        other = StudentHistory.objects.get(student_id=self.students[1].id)
+        studies = get_class_studies(self.semester, self.school.name, self.level.name, active_only=True)
+        subjects = get_level_subjects(self.level.name)
+        data = {f"marks_{s.id}_{sts.subject_id}": '40' for s in self.students for sts in self.subjects}
+        data[f"marks_{self.students[0].id}_{self.subjects[2].subject_id}"] = '90'
+
+        written = save_grade_sheet(studies, subjects, self.academic_year, parse_grade_sheet(data, studies, subjects))
+
+        self.assertEqual(list(written), [int(self.students[0].id)])
+        history = written[int(self.students[0].id)]
+        self.assertEqual(history.obtained_marks, 40 * 3 + 90)
+        self.assertEqual(history.total_marks, 400)
+        other.refresh_from_db()
+        self.assertEqual(other.obtained_marks, 160)
+
+    def test_rebuild_repairs_drifted_history(self):
+        self.post_sheet('40')
+        StudentHistory.objects.update(obtained_marks=0, subject_marks={})
+        ids = list(StudentHistory.objects.values_list('id', flat=True))
+
+        self.assertEqual(rebuild_histories(ids), (3, 0))
+        history = StudentHistory.objects.get(student_id=self.students[2].id)
+        self.assertEqual(history.obtained_marks, 160)
+        self.assertEqual(len(history.subject_marks), 4)
+
+    def test_rebuild_command_runs_every_chunk(self):
+        self.post_sheet('40')
+        StudentHistory.objects.update(obtained_marks=0)
+        out = StringIO()
+
+        call_command('rebuild_histories', chunk_size=2, workers=4, stdout=out)
+        self.assertIn("chunk 2/2", out.getvalue())
+        self.assertEqual(set(StudentHistory.objects.values_list('obtained_marks', flat=True)), {160})
+
+
+class SubjectResultTests(GradeSheetTestCase):
+    def test_result_rows_follow_saved_marks(self):
+        self.post_sheet('40')
+        self.post_sheet('70')
+
+        self.assertEqual(StudentSubjectResult.objects.count(), 3 * 4)
+        self.assertEqual(set(StudentSubjectResult.objects.values_list('marks_obtained', flat=True)), {70})
+        history = StudentHistory.objects.get(student_id=self.students[0].id)
+        data = history.get_subject_data(category=1)
+        self.assertEqual([row['name'] for row in data], [f"วิชา {i}" for i in range(4)])
+        self.assertEqual(data[0]['grade'], "B")
+
+    def test_history_save_syncs_only_when_marks_change(self):
+        self.post_sheet('40')
+        history = StudentHistory.objects.get(student_id=self.students[0].id)
+
+        with patch('students.signals.sync_subject_results') as sync:
+            history.student_name = "ชื่อใหม่"
+            history.save()
+            history.save(update_fields=['pass_or_fail'])
+            sync.assert_not_called()
+
+            history.subject_marks["วิชา 0"] = 90
+            history.save()
+            history.save()
+            sync.assert_called_once_with([history])
+
+    def test_report_reads_marks_from_result_table(self):
+        self.post_sheet('55')
+        self.login_teacher()
+
+        response = self.client.get(reverse('gr_student'), {
+            'school': self.school.name,
+            'level': self.level.name,
+            'academic_year': self.academic_year,
+        })
+        self.assertEqual(response.status_code, 200)
+        rows = response.context['students']
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0].theory_marks, [55] * 4)
+
+
+class ResultsTablePagingTests(GradeSheetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post_sheet('50')
+        self.login_teacher()
+        self.params = {'school': self.school.name, 'level': self.level.name, 'academic_year': self.academic_year}
+
+    @patch('students.views.GR_PAGE_SIZE', 2)
+    def test_keyset_pages_cover_every_row(self):
+        first = self.client.get(reverse('gr_student'), self.params)
+        self.assertEqual(len(first.context['students']), 2)
+        self.assertTrue(first.context['next_url'])
+
+        second = self.client.get(reverse('gr_student') + first.context['next_url'])
+        self.assertEqual(len(second.context['students']), 1)
+        self.assertEqual(second.context['next_url'], '')
+        self.assertEqual(second.context['start'], 2)
+        self.assertNotEqual(second.context['students'][0].id, first.context['students'][-1].id)
+
+    @patch('students.views.GR_STREAM_CHUNK', 2)
+    def test_stream_renders_all_rows(self):
+        response = self.client.get(reverse('gr_student'), {**self.params, 'stream': 1})
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('<td class="border text-left">นักเรียน'), 3)
+        self.assertNotIn('gr-student-rows', content)
+
+
+class RankingTests(GradeSheetTestCase):
+    def test_ranks_refresh_after_marks_are_saved(self):
+        studies = get_class_studies(self.semester, self.school.name, self.level.name, active_only=True)
+        subjects = get_level_subjects(self.level.name)
+        cells = {(study.student_id, sts.id): 30 + 20 * i for i, study in enumerate(studies) for sts in subjects}
+        cells[(studies[0].student_id, subjects[0].id)] = 100
+
+        with self.captureOnCommitCallbacks(execute=True):
+            save_grade_sheet(studies, subjects, self.academic_year, cells)
+        with self.captureOnCommitCallbacks(execute=True):
+            save_grade_sheet(studies[:1], subjects, self.academic_year, cells)
+
+        self.assertFalse(StudentHistory.objects.exclude(class_rank=None).exists())  # ไม่จัดอันดับใน request
+        job = claim_next_job()
+        self.assertEqual((job.kind, job.params['level_name']), ('refresh_rankings', self.level.name))
+        self.assertEqual(run_job(job).status, 'done')
+        self.assertIsNone(claim_next_job())  # บันทึกซ้ำได้งานเดียว
+
+        histories = {h.student_id: h for h in StudentHistory.objects.all()}
+        ranks = [histories[int(study.student_id)].class_rank for study in studies]
+        self.assertEqual(ranks, [3, 2, 1])
+        best = histories[int(studies[2].student_id)]
+        self.assertEqual((best.class_size, best.unit_percentile), (3, 100.0))
+        self.assertEqual(histories[int(studies[0].student_id)].unit_percentile, 0.0)
+
+        first_subject = StudentSubjectResult.objects.filter(subject=subjects[0].subject)
+        self.assertEqual(first_subject.get(history=histories[int(studies[0].student_id)]).subject_rank, 1)
+
+
+class ClassStatisticsTests(GradeSheetTestCase):
+    def test_statistics_are_cached_until_marks_change(self):
+        self.post_sheet('40')
+        stats = get_class_statistics(self.school.name, self.level.name, self.academic_year)
+        subject = stats['subjects'][0]
+        self.assertEqual((subject['count'], subject['mean'], subject['pass_rate']), (3, 40.0, 0.0))
+        self.assertEqual(subject['histogram'][4], 3)
+
+        with self.assertNumQueries(0):
+            get_class_statistics(self.school.name, self.level.name, self.academic_year)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_sheet('80')
+        subject = get_class_statistics(self.school.name, self.level.name, self.academic_year)['subjects'][0]
+        self.assertEqual((subject['median'], subject['max'], subject['pass_rate']), (80.0, 80, 100.0))
+
+    def test_endpoint_requires_class(self):
+        self.login_teacher()
+        url = reverse('class_statistics')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        response = self.client.get(url, {
+            'school': self.school.name, 'level': self.level.name, 'academic_year': self.academic_year,
+        })
+        self.assertEqual(response.json()['subjects'], [])
+
+
+class AcademicYearRegistryTests(GradeSheetTestCase):
+    def test_saving_histories_registers_year_once(self):
+        self.assertEqual(get_academic_years(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            save_grade_sheet(
+                get_class_studies(self.semester, self.school.name, self.level.name),
+                get_level_subjects(self.level.name), self.academic_year, {},
+            )
+
+        self.assertEqual(get_academic_years(), [self.academic_year])
+        with self.assertNumQueries(0):
+            get_academic_years()
+
+    def test_consistency_check_reports_and_fixes(self):
+        AcademicYear.objects.create(year=1999)
+        AcademicYear.objects.create(year=2567)  # พ.ศ. ที่ผู้ดูแลกรอกเอง
+        StudentHistory.objects.bulk_create([StudentHistory(student_id=1, academic_year='2020')])
+
+        self.assertEqual(check_academic_years(), ([2020], [1999, 2567]))
+        with self.captureOnCommitCallbacks(execute=True):
+            check_academic_years(fix=True)
+        self.assertEqual(get_academic_years(), [2024, 2020, 1999])
+        self.assertEqual(check_academic_years(), ([], [1999, 2567]))
+
+
+class MarkCellsEndpointTests(GradeSheetTestCase):
+    def post_cells(self, cells):
+        return self.client.post(reverse('save_mark_cells'), {
+            'school': self.school.name,
+            'level': self.level.name,
+            'academic_year': self.academic_year + 543,
+            'cells': cells,
+        }, content_type='application/json')
+
+    def test_changed_cells_return_updated_totals(self):
+        self.login_teacher()
+        student = self.students[1]
+        response = self.post_cells([
+            {'student': student.id, 'subject': self.subjects[0].subject_id, 'value': 30},
+            {'student': student.id, 'subject': self.subjects[1].subject_id, 'value': '50'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        totals = response.json()['students'][student.id]
+        self.assertEqual(totals['obtained_marks'], 80)
+        self.assertEqual(totals['total_marks'], 200)
+        self.assertEqual(StudentMarkForSubject.objects.count(), 2)
+        self.assertEqual(StudentHistory.objects.count(), 1)
+
+        response = self.post_cells([{'student': student.id, 'subject': self.subjects[0].subject_id, 'value': 60}])
+        self.assertEqual(response.json()['students'][student.id]['obtained_marks'], 110)
+
+    def test_out_of_range_value_is_rejected(self):
+        self.login_teacher()
+        response = self.post_cells([{'student': self.students[0].id, 'subject': self.subjects[0].subject_id, 'value': 101}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StudentMarkForSubject.objects.exists())
+
+    def test_malformed_body_is_rejected(self):
+        self.login_teacher()
+        url = reverse('save_mark_cells')
+        bodies = [[], 5, {'academic_year': 2567, 'cells': 5}, {'academic_year': 2567, 'cells': [1]}]
+        for body in bodies:
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+
+class JobQueueTests(GradeSheetTestCase):
+    def test_grade_sheet_post_enqueues_and_worker_saves(self):
+        self.login_teacher()
+        data = {f"marks_{s.id}_{sts.subject_id}": '70' for s in self.students for sts in self.subjects}
+        data.update(academic_year=self.academic_year + 543, background='1')
+
+        response = self.client.post(f"{reverse('ingr_student')}?school={self.school.name}&level={self.level.name}", data)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(StudentMarkForSubject.objects.exists())
+        job = claim_next_job()
+        self.assertEqual(job.pk, response.json()['job_id'])
+        self.assertEqual(run_job(job).status, 'done')
+        self.assertEqual(StudentMarkForSubject.objects.count(), 12)
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['result'], {'histories_written': 3})
+
+    def test_failed_job_is_retried_then_failed(self):
+        @task('always_fails')
+        def always_fails(job):
+            raise RuntimeError("boom")
+        self.addCleanup(TASKS.pop, 'always_fails')
+
+        job = enqueue('always_fails', max_attempts=2)
+        self.assertEqual(run_job(claim_next_job()).status, 'queued')
+        self.assertIsNone(claim_next_job())  # ยังไม่ถึงเวลา retry
+
+        Job.objects.filter(pk=job.pk).update(run_after=job.created_at)
+        job = run_job(claim_next_job())
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 2)
+        self.assertIn("boom", job.error)
+
+    @override_settings(JOB_TIMEOUT=60)
+    def test_stale_running_job_is_requeued_then_failed(self):
+        job = enqueue('grade_sheet', max_attempts=2)
+        stale = job.created_at - timedelta(minutes=5)
+
+        claim_next_job()
+        Job.objects.filter(pk=job.pk).update(started_at=stale)
+        self.assertEqual(claim_next_job().attempts, 2)  # worker ตาย -> คืนคิวแล้วถูกรับใหม่
+
+        Job.objects.filter(pk=job.pk).update(started_at=stale)
+        self.assertIsNone(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertTrue(job.error)
+
+    def test_cleanup_removes_expired_jobs_and_files(self):
+        job = enqueue('students_pdf')
+        save_result_file(job, 'report.pdf', b'%PDF')
+        path = job.result_file.path
+        Job.objects.filter(pk=job.pk).update(status='done', finished_at=job.created_at - timedelta(days=8))
+        recent = enqueue('students_pdf')
+        Job.objects.filter(pk=recent.pk).update(status='done', finished_at=recent.created_at)
+
+        self.assertEqual(cleanup_jobs(days=7), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(list(Job.objects.values_list('pk', flat=True)), [recent.pk])
+
+    def test_export_jobs_store_downloadable_files(self):
+        self.login_teacher()
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            pdf = self.client.get(reverse('sp_student_report'), {'action': 'download', 'background': '1'}).json()
+            excel = self.client.get(reverse('download_student_results_pdf'), {'background': '1'}).json()
+            while (job := claim_next_job()) is not None:
+                self.assertEqual(run_job(job).status, 'done', job.error)
+
+            for data, content_type in ((pdf, 'application/pdf'), (excel, 'spreadsheetml')):
+                response = self.client.get(data['download_url'])
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(content_type, response['Content-Type'])
+                response.close()
+
+
+class ResultsExcelTests(GradeSheetTestCase):
+    @patch('students.workbooks.EXPORT_CHUNK_SIZE', 2)
+    def test_streamed_workbook_has_every_row(self):
+        self.post_sheet('60')
+        self.login_teacher()
+
+        response = self.client.get(reverse('download_student_results_pdf'), {
+            'school': self.school.name, 'level': self.level.name, 'academic_year': str(self.academic_year),
+        })
+        self.assertEqual(response.status_code, 200)
+        ws = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content))).active
+
+        self.assertIn(self.level.name, ws['A5'].value)
+        self.assertIn('A8:A9', {str(cells) for cells in ws.merged_cells.ranges})
+        rows = list(ws.iter_rows(min_row=10, values_only=True))
+        self.assertEqual([row[0] for row in rows], [1, 2, 3])
+        subject_col = 2 + [cell.value for cell in ws[9]].index("วิชา 0")
+        self.assertEqual({row[subject_col] for row in rows}, {60})
+        self.assertEqual(ws.cell(row=10, column=1).border.left.style, 'thin')
+
+
+    def test_unit_workbook_has_sheet_per_class_and_summary(self):
+        self.post_sheet('60')
+        other = School.objects.create(name="โรงเรียนที่สอง")
+        StudentHistory.objects.create(
+            student_id=999, student_name="นักเรียน อื่น", school_name=other.name, level_name=self.level.name,
+            academic_year=str(self.academic_year), obtained_marks=100, total_marks=400,
+            grade_percentage=25, pass_or_fail="ไม่ผ่าน",
+        )
+        self.login_teacher()
+
+        response = self.client.get(reverse('download_unit_results_excel'), {'academic_year': self.academic_year})
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+
+        self.assertEqual(wb.sheetnames[0], "สรุป")
+        self.assertEqual(len(wb.sheetnames), 3)
+        summary = {row[0]: row[1:] for row in wb["สรุป"].iter_rows(min_row=3, values_only=True)}
+        self.assertEqual(summary[self.school.name], (3, 3, 0, 60))
+        self.assertEqual(summary[other.name], (1, 0, 1, 25))
+        self.assertEqual(summary['รวม'][:3], (4, 3, 1))
+
+
+class ReportCacheTests(GradeSheetTestCase):
+    def test_report_is_reused_until_marks_change(self):
+        self.post_sheet('60')
+        self.login_teacher()
+        url = reverse('download_student_results_pdf')
+        params = {'school': self.school.name, 'level': self.level.name, 'academic_year': str(self.academic_year)}
+
+        first = self.client.get(url, params)
+        first_body = b''.join(first.streaming_content)
+        etag = first['ETag']
+        with patch('students.views.build_student_results_workbook') as build:
+            again = self.client.get(url, params)
+            self.assertEqual(b''.join(again.streaming_content), first_body)
+            self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            build.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_sheet('70')
+        changed = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        changed.close()
+
+    def test_semester_and_level_edits_invalidate_student_reports(self):
+        for instance in (self.semester, self.level):
+            version = data_version(STUDENTS)
+            with self.captureOnCommitCallbacks(execute=True):
+                instance.save()
+            self.assertNotEqual(data_version(STUDENTS), version, instance)
+
+    def test_entry_evicted_before_open_is_rebuilt(self):
+        def build(output):
+            output.write(b'data')
+            return 'report.txt'
+
+        entry = report_cache.store_entry('key', build)
+        shutil.rmtree(os.path.dirname(entry[0]))  # worker อื่น evict ไประหว่างนั้น
+        file, filename = report_cache.open_entry('key', build, entry)
+        with file:
+            self.assertEqual((file.read(), filename), (b'data', 'report.txt'))
+
+    @override_settings(REPORT_CACHE_MAX_BYTES=1)
+    def test_size_cap_evicts_least_recently_used(self):
+        self.login_teacher()
+        url = reverse('download_student_results_pdf')
+        for year in ('2001', '2002'):
+            self.client.get(url, {'academic_year': year}).close()
+        self.assertEqual(len(os.listdir(cache_dir())), 1)
+
+
+class RawExportTests(GradeSheetTestCase):
+    def test_csv_and_jsonl_stream_rows(self):
+        self.post_sheet('45')
+        self.login_teacher()
+
+        response = self.client.get(reverse('export_results_data', args=['histories', 'csv']), {'school': self.school.name})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'student_id', 'student_name'])
+        self.assertEqual(len(lines), 1 + 3)
+
+        response = self.client.get(reverse('export_results_data', args=['subject_marks', 'jsonl']))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 3 * 4)
+        self.assertEqual({row['marks_obtained'] for row in rows}, {45})
+        self.assertEqual(rows[0]['total_marks'], 100.0)
+
+        self.assertEqual(self.client.get(reverse('export_results_data', args=['students', 'csv'])).status_code, 404)
+
+
+class ReportCardTests(GradeSheetTestCase):
+    def test_class_report_cards_as_zip_and_merged_pdf(self):
+        self.post_sheet('65')
+        self.login_teacher()
+        params = {'school': self.school.name, 'level': self.level.name, 'academic_year': self.academic_year}
+
+        with self.assertNumQueries(3):
+            cards = class_report_cards(self.school.name, self.level.name, self.academic_year)
+        self.assertEqual(len(cards), 3)
+        self.assertEqual(len(cards[0]['semester_1_data']), 4)
+
+        response = self.client.get(reverse('class_report_cards'), params)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 3)
+        self.assertTrue(archive.read(archive.namelist()[0]).startswith(b'%PDF'))
+
+        stats = render_report_cards(cards, BytesIO(), 'pdf')
+        self.assertEqual((stats['cards'], stats['pages']), (3, 3))
+
+    def test_student_list_pdf_uses_shared_engine(self):
+        self.login_teacher()
+        response = self.client.get(reverse('sp_student_report'), {'action': 'download'})
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertIs(pdf_engine.paragraph_styles(), pdf_engine.paragraph_styles())
+
+    def test_student_list_is_built_from_one_query(self):
+        self.add_students(30)
+        students = Student.objects.filter(current_study__isnull=False)
+        with self.assertNumQueries(1):
+            render_students_pdf(students, BytesIO())
+
+        student_list = build_student_list(students)
+        self.assertEqual(student_list['total'], 33)
+        self.assertEqual(student_list['gender_counts'], {'ชาย': 33})
+        self.assertEqual((student_list['school'], student_list['level']), (self.school.name, self.level.name))
+        self.assertEqual(student_list['academic_year'], str(self.academic_year + 543))
+        self.assertEqual(student_list['special_status'], None)
+
+        self.login_teacher()
+        response = self.client.get(reverse('sp_student_report'), {'action': 'download_excel'})
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(wb.active.max_row, 3 + 33)
+
+        done = []
+        tables = pdf_engine.chunked_tables(['#'], ([i] for i in range(450)), [50], 'student_list', progress=done.append)
+        self.assertEqual((len(tables), done), (3, [200, 400, 450]))
+
+
+class MarkImportTests(GradeSheetTestCase):
+    def test_import_validates_and_saves_rows(self):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(['รหัสนักเรียน', 'ชื่อ-สกุล'] + [sts.subject.name for sts in self.subjects])
+        ws.append([int(self.students[0].id), 'ok', 10, 20, 30, 40])
+        ws.append([self.students[1].id, 'too high', 10, 200, None, None])
+        ws.append(['999999999', 'unknown', 1, 1, 1, 1])
+        ws.append([self.students[2].id, 'partial', None, 55, None, None])
+        upload = BytesIO()
+        wb.save(upload)
+        upload.seek(0)
+        progress = []
+
+        summary = import_marks_workbook(upload, self.academic_year, batch_size=2, progress=lambda *p: progress.append(p))
+
+        self.assertEqual(summary['rows'], 4)
+        self.assertEqual(summary['imported'], 2)
+        self.assertEqual(summary['cells'], 5)
+        self.assertEqual(len(summary['errors']), 2)
+        self.assertTrue(summary['errors'][0].startswith('row 3:'))
+        self.assertEqual(progress[-1], (4, 4))
+        history = StudentHistory.objects.get(student_id=self.students[0].id)
+        self.assertEqual(history.obtained_marks, 100)
+        self.assertFalse(StudentMarkForSubject.objects.filter(student=self.students[1]).exists())
+
+
+class StudentSearchTests(GradeSheetTestCase):
+    def test_index_covers_names_and_ids_and_follows_edits(self):
+        student = self.students[0]
+        student.first_name, student.last_name = "สมชาย", "ใจดี"
+        student.english_first_name, student.arabic_first_name = "Somchai", "مُحَمَّد"
+        student.save()
+        students = Student.objects.all()
+
+        def found(text):
+            return list(search_students(students, text).values_list('pk', flat=True))
+
+        for text in ("มชา", "เด็กชายสมชาย ใจดี", "เด็กชาย สมชาย", "นาย สมชาย ใจดี", "สมชายใจดี", "SOMCHAI", "محمد",
+                     student.id_number, student.id):
+            self.assertEqual(found(text), [student.pk], text)
+        self.assertEqual(found("ใจ"), [student.pk])
+        self.assertEqual(found("สมชาย ไม่มี"), [])
+
+        student.delete()
+        self.assertEqual(found("สมชาย"), [])
+
+        self.students[1].last_name = "บุญมาก"
+        self.students[1].save()
+        self.login_teacher()
+        response = self.client.get(reverse('sp_student_report'), {'search': "บุญมาก"})
+        self.assertEqual([s.pk for s in response.context['students']], [self.students[1].pk])
+
+
+class KeysetPaginationTests(GradeSheetTestCase):
+    def test_pages_follow_cursors_and_keep_filters(self):
+        self.add_students(22)
+        self.login_teacher()
+        url = reverse('sp_student_report')
+        params = {'school': self.school.id, 'items_per_page': 10, 'sort': 'name'}
+        expected = list(Student.objects.order_by('first_name', 'last_name', 'id').values_list('pk', flat=True))
+
+        seen, cursor, starts = [], '', []
+        while True:
+            response = self.client.get(url, {**params, 'cursor': cursor} if cursor else params)
+            seen += [s.pk for s in response.context['students']]
+            starts.append(response.context['start'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(starts, [0, 10, 20])
+        self.assertIn('school=', response.context['filter_params'])
+        self.assertNotIn('cursor', response.context['filter_params'])
+
+        response = self.client.get(url, {**params, 'cursor': response.context['prev_cursor']})
+        self.assertEqual([s.pk for s in response.context['students']], expected[10:20])
+        self.assertEqual(response.context['start'], 10)
+
+        response = self.client.get(url, {'items_per_page': 100000, 'cursor': 'garbage', 'count': 'estimate'})
+        self.assertEqual(response.context['current_filters']['items_per_page'], 100)
+        self.assertEqual(response.context['start'], 0)
+        self.assertEqual((response.context['total_students'], response.context['total_exact']), (25, True))
+
+
+class FacetCountTests(GradeSheetTestCase):
+    def test_facets_come_from_one_query_and_ignore_their_own_filter(self):
+        other_school = School.objects.create(name="โรงเรียนอื่น")
+        self.add_students(2)
+        for student in self.students[-2:]:
+            student.gender = 'หญิง'
+            student.special_status = 'เด็กกำพร้า'
+            student.save()
+        CurrentStudy.objects.filter(student=self.students[-1]).update(school=other_school)
+        students = Student.objects.filter(current_study__isnull=False)
+
+        with self.assertNumQueries(1):
+            counts = student_counts(students)
+        self.assertEqual(counts['total'], 5)
+        self.assertEqual(counts['gender'], {'ชาย': 3, 'หญิง': 2})
+        self.assertEqual(counts['special_status']['เด็กกำพร้า'], 2)
+
+        with self.assertNumQueries(1):
+            facets = student_facets(students, {'school': str(self.school.id), 'gender': 'หญิง'})
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['facets']['school'], {self.school.id: 1, other_school.id: 1})
+        self.assertEqual(facets['facets']['gender'], {'ชาย': 3, 'หญิง': 1})
+
+        self.login_teacher()
+        response = self.client.get(reverse('sp_student_report'), {'school': self.school.id})
+        self.assertEqual(
+            (response.context['total_students'], response.context['male_students'], response.context['female_students']),
+            (4, 3, 1),
+        )
+        school_counts = {s.id: s.facet_count for s in response.context['schools']}
+        self.assertEqual((school_counts[self.school.id], school_counts[other_school.id]), (4, 1))
+
+
+class ReferenceDataTests(GradeSheetTestCase):
+    def test_reference_data_is_cached_until_a_signal_bumps_the_version(self):
+        names = [s.name for s in reference_data.schools()]
+        self.assertIn(self.school.name, names)
+        with self.assertNumQueries(0):
+            reference_data.schools()
+            reference_data.current_semester()
+            response = self.client.get(reverse('get-schools'))
+        self.assertIn({'id': self.school.id, 'name': self.school.name}, response.json())
+
+        # process อื่นที่ยังไม่มีข้อมูลใน memory ใช้ชุดที่อยู่ใน shared cache
+        reference_data._local['version'] = None
+        with self.assertNumQueries(0):
+            reference_data.levels()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            School.objects.create(name="โรงเรียนใหม่")
+        self.assertIn("โรงเรียนใหม่", [s.name for s in reference_data.schools()])
+
+
+class TypeaheadTests(GradeSheetTestCase):
+    def test_prefix_lookup_by_name_and_ids_follows_edits(self):
+        student = self.students[0]
+        student.first_name, student.last_name, student.english_first_name = "สมชาย", "ใจดี", "Somchai"
+        with self.captureOnCommitCallbacks(execute=True):
+            student.save()
+        self.login_teacher()
+        url = reverse('student_typeahead')
+
+        def found(q):
+            return [row['id'] for row in self.client.get(url, {'q': q}).json()['results']]
+
+        for q in ("สมช", "สมชาย ใจ", "สมชายใจ", "som", student.id, student.id_number):
+            self.assertEqual(found(q), [student.id], q)
+        self.assertEqual(len(found("นักเรียน")), 2)
+        self.assertEqual(self.client.get(url, {'q': "นักเรียน", 'limit': 1}).json()['results'][0]['school'], self.school.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.delete_status = 'deleted'
+            student.save()
+        self.assertEqual(found("สมช"), [])
@@ -0,0 +1,100 @@
+# students/typeahead.py
+"""
+In-memory prefix index for the student typeahead.
+
+Every active student contributes a few normalized keys (first name, last
+name, full name with and without the space, English and Arabic names,
+student ID and ``id_number``) to one sorted list of ``(key, position)``
+pairs. A lookup is a ``bisect`` to the first key >= the prefix followed by a
+short scan while keys still start with it, so it takes microseconds
+whatever the number of students.
+
+The index lives in process memory and is tagged with the ``STUDENTS`` data
+version from :mod:`students.report_cache`; the existing Student /
+CurrentStudy / School signals bump that version, and each process rebuilds
+its index on the next lookup.
+"""
+import threading
+from bisect import bisect_left
+
+from .models import Student
+from .report_cache import STUDENTS, data_version
+from .search import normalize, query_terms
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_SCAN = 500  # จำนวน key สูงสุดที่ไล่ดูต่อหนึ่งคำค้น
+
+_lock = threading.Lock()
+_index = {'version': None, 'keys': [], 'students': []}
+
+
+def student_keys(first_name, last_name, english_first_name, english_last_name,
+                 arabic_first_name, arabic_last_name, student_id, id_number):
+    names = [first_name, last_name, f"{first_name} {last_name}", f"{first_name}{last_name}",
+             english_first_name, english_last_name, arabic_first_name, arabic_last_name]
+    if english_first_name and english_last_name:
+        names.append(f"{english_first_name} {english_last_name}")
+    keys = {normalize(name) for name in names if name}
+    keys.update(str(value) for value in (student_id, id_number) if value)
+    keys.discard('')
+    return keys
+
+
+def build_index():
+    keys = []
+    students = []
+    rows = (
+        Student.objects.filter(delete_status='not_deleted')
+        .values_list(
+            'first_name', 'last_name', 'english_first_name', 'english_last_name',
+            'arabic_first_name', 'arabic_last_name', 'id', 'id_number',
+            'current_study__school__name', 'current_study__level__name',
+        )
+        .order_by('id')
+        .iterator(chunk_size=2000)
+    )
+    for row in rows:
+        first_name, last_name, *_, student_id, id_number, school, level = row
+        position = len(students)
+        students.append({
+            'id': student_id,
+            'name': f"{first_name} {last_name}",
+            'school': school,
+            'level': level,
+        })
+        keys.extend((key, position) for key in student_keys(*row[:8]))
+    keys.sort()
+    return keys, students
+
+
+def get_index():
+    version = data_version(STUDENTS)
+    if _index['version'] != version:
+        with _lock:
+            if _index['version'] != version:
+                keys, students = build_index()
+                _index.update(version=version, keys=keys, students=students)
+    return _index['keys'], _index['students']
+
+
+def lookup(text, limit=DEFAULT_LIMIT):
+    """
+    Top ``limit`` students with a key starting with ``text``.
+
+    Exact matches come first, then shorter keys (a closer match), then name.
+    """
+    prefix = ' '.join(query_terms(text))
+    if not prefix:
+        return []
+    keys, students = get_index()
+    best = {}
+    start = bisect_left(keys, (prefix,))
+    for key, position in keys[start:start + MAX_SCAN]:
+        if not key.startswith(prefix):
+            break
+        rank = (key != prefix, len(key))
+        if position not in best or rank < best[position]:
+            best[position] = rank
+    ranked = sorted(best, key=lambda position: (best[position], students[position]['name']))
+    return [students[position] for position in ranked[:limit]]
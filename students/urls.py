@@ -11,6 +11,8 @@ urlpatterns = [
     # path('student_report', Student_Rp, name='student_report'),
     path('sp_student_report', Student_Rp, name='sp_student_report'),
     path('gr_student', GR_Student, name='gr_student'),
+    path('gr_student/stats', class_statistics_view, name='class_statistics'),
+    path('students/typeahead', student_typeahead, name='student_typeahead'),
     path('get-provinces', get_provinces, name='get-provinces'),
     path('get-districts', get_districts, name='get-districts'),
     path('get-subdistricts', get_subdistricts, name='get-subdistricts'),
@@ -22,6 +24,8 @@ urlpatterns = [
     path('student_results/<int:student_id>/', student_Results, name='student_results'),
     # ใส่ข้อมูล
     path('ingr_student', student_marks_view, name='ingr_student'),
+    path('ingr_student/import', import_marks, name='import_marks'),
+    path('ingr_student/cells', save_mark_cells, name='save_mark_cells'),
     path('delete_student/<int:student_id>/', delete_student, name='delete_student'),
     # เพิ่มข้อมูล
     path('in_profile/', Input_Profile, name='in_profile'),  # For creating a new profile
@@ -38,6 +42,12 @@ urlpatterns = [
     path('get-subdistricts/', get_subdistricts, name='get_subdistricts'),
     path('get-zipcode/', get_zipcode, name='get_zipcode'),
     path('download_student_results_pdf/', download_student_results_excel, name='download_student_results_pdf'),
+    path('download_unit_results_excel/', download_unit_results_excel, name='download_unit_results_excel'),
+    path('export/<str:dataset>.<str:fmt>', export_results_data, name='export_results_data'),
+    path('report_cards/', class_report_cards_view, name='class_report_cards'),
+    # งานเบื้องหลัง
+    path('jobs/<int:job_id>/', job_status, name='job_status'),
+    path('jobs/<int:job_id>/download/', job_download, name='job_download'),
 
 
     path('error/403/', test_403_view, name='test_403'),
@@ -1,17 +1,14 @@
 # students/views.py
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from .models import *
 from django.db.models import Q
 from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
-from django.http import JsonResponse, HttpResponse, HttpResponseRedirect,Http404,HttpResponseForbidden
+from django.http import JsonResponse, HttpResponse, HttpResponseRedirect,Http404,HttpResponseForbidden, FileResponse, StreamingHttpResponse
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib import colors
+from reportlab.platypus import Paragraph, Spacer
 from reportlab.lib.units import inch
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from datetime import datetime  # Import the datetime module
 import json
 from urllib.parse import urlencode
@@ -23,6 +20,7 @@ from django.utils.timezone import now
 from axes.handlers.proxy import AxesProxyHandler
 from axes.models import AccessAttempt
 from django.conf import settings
+from django.core.files.storage import default_storage
 from datetime import timedelta
 import os
 from reportlab.graphics.shapes import Drawing, String
@@ -32,8 +30,24 @@ from openpyxl.styles import Alignment, Font, Border, Side
 from openpyxl.utils import get_column_letter  # เพิ่มตรงนี้
 from openpyxl.drawing.image import Image as XLImage
 from urllib.parse import quote
-
-pdfmetrics.registerFont(TTFont('THSarabunNew', 'static/fonts/THSarabunNew.ttf'))
+from .marks import (
+    InvalidMarkError, attach_subject_columns, get_class_studies, get_level_subjects,
+    load_mark_matrix, parse_grade_sheet, save_grade_sheet,
+)
+from .jobs import enqueue, job_payload
+from .academic_years import get_academic_years
+from .statistics import get_class_statistics
+from .workbooks import build_student_list_workbook, build_student_results_workbook, build_unit_workbook
+from .facets import student_counts, student_facets
+from .pagination import estimated_count, keyset_page, page_size
+from .search import search_students
+from .student_lists import STUDENT_LIST_HEADERS, build_student_list, header_text, report_filename
+from .report_cache import RESULTS, STUDENTS, cached_report_response
+from .exports import DATASETS as EXPORT_DATASETS, FORMATS as EXPORT_FORMATS, export_rows
+from .report_cards import class_report_cards, render_report_cards, report_card_elements
+from . import pdf_engine, reference_data, typeahead
+
+pdf_engine.register_fonts()
 
 
 def rotated_paragraph(text, width=40, height=100):
@@ -77,8 +91,7 @@ def delete_student(request, student_id):
     return redirect('sp_student_report')  # Replace 'student_report' with the correct URL name for your student list page
 
 def get_schools(request):
-    schools = list(School.objects.values('id', 'name'))
-    return JsonResponse(schools, safe=False)
+    return HttpResponse(reference_data.schools_json(), content_type='application/json')
 
 def safe_int(value):
     """Convert a value to int or return 0 if it's not valid."""
@@ -97,8 +110,7 @@ def add_school(request):
         return JsonResponse({'error': 'Invalid data'}, status=400)
                             
 def get_provinces(request):
-    provinces = list(Province.objects.all().values('id', 'name'))
-    return JsonResponse(provinces, safe=False)
+    return HttpResponse(reference_data.provinces_json(), content_type='application/json')
 
 
 
@@ -224,23 +236,17 @@ def Home(request):
             return redirect('login_view')  # Redirect if student not found
 
         # Get student statistics
-        students = Student.objects.filter(delete_status='not_deleted')
-        male_students = students.filter(gender='ชาย').count()
-        female_students = students.filter(gender='หญิง').count()
-        orphans = students.filter(special_status='เด็กกำพร้า').count()
-        underprivileged = students.filter(special_status='เด็กยากไร้').count()
-        disabled = students.filter(special_status='เด็กพิการ').count()
-        new_muslims = students.filter(special_status='เด็กมุอัลลัฟ').count()
+        counts = student_counts(Student.objects.filter(delete_status='not_deleted'))
 
         context = {
             'user_type': user_type,
-            'total_students': students.count(),
-            'male_students': male_students,
-            'female_students': female_students,
-            'orphans': orphans,
-            'underprivileged': underprivileged,
-            'disabled': disabled,
-            'new_muslims': new_muslims,
+            'total_students': counts['total'],
+            'male_students': counts['gender']['ชาย'],
+            'female_students': counts['gender']['หญิง'],
+            'orphans': counts['special_status']['เด็กกำพร้า'],
+            'underprivileged': counts['special_status']['เด็กยากไร้'],
+            'disabled': counts['special_status']['เด็กพิการ'],
+            'new_muslims': counts['special_status']['เด็กมุอัลลัฟ'],
             'student': student
         }
         return render(request, 'student_home.html', context)
@@ -248,23 +254,17 @@ def Home(request):
     elif user_type in ['teacher', 'superuser']:
         
         # Get student statistics
-        students = Student.objects.filter(delete_status='not_deleted')
-        male_students = students.filter(gender='ชาย').count()
-        female_students = students.filter(gender='หญิง').count()
-        orphans = students.filter(special_status='เด็กกำพร้า').count()
-        underprivileged = students.filter(special_status='เด็กยากไร้').count()
-        disabled = students.filter(special_status='เด็กพิการ').count()
-        new_muslims = students.filter(special_status='เด็กมุอัลลัฟ').count()
+        counts = student_counts(Student.objects.filter(delete_status='not_deleted'))
 
         context = {
             'user_type': user_type,
-            'total_students': students.count(),
-            'male_students': male_students,
-            'female_students': female_students,
-            'orphans': orphans,
-            'underprivileged': underprivileged,
-            'disabled': disabled,
-            'new_muslims': new_muslims,
+            'total_students': counts['total'],
+            'male_students': counts['gender']['ชาย'],
+            'female_students': counts['gender']['หญิง'],
+            'orphans': counts['special_status']['เด็กกำพร้า'],
+            'underprivileged': counts['special_status']['เด็กยากไร้'],
+            'disabled': counts['special_status']['เด็กพิการ'],
+            'new_muslims': counts['special_status']['เด็กมุอัลลัฟ'],
         }
         return render(request, 'teacher_home.html', context)
     else:
@@ -279,9 +279,9 @@ def Input_Profile(request, student_id=None):
     if not user_type:
         return redirect('login_view')  # Redirect to login if user_type is not in session
     
-    provinces = Province.objects.all()
-    schools = School.objects.all()
-    levels = Level.objects.all()
+    provinces = reference_data.provinces()
+    schools = reference_data.schools()
+    levels = reference_data.levels()
 
     student = None
     father, mother, guardian, current_study = None, None, None, None
@@ -428,6 +428,56 @@ def Profile(request, student_id=None):
 
     return render(request, 'student/profile.html', context)
 
+# ลำดับการเรียงของรายชื่อนักเรียน (ต้องจบด้วยคอลัมน์ที่ไม่ซ้ำ สำหรับ keyset pagination)
+STUDENT_SORT_ORDERINGS = {
+    'id': ['id'],
+    '-id': ['-id'],
+    'name': ['first_name', 'last_name', 'id'],
+}
+
+STUDENT_FILTER_KEYS = ('search', 'school', 'level', 'academic_year', 'gender', 'special_status')
+
+
+def filter_students(params):
+    """Apply the sp_student_report filters in ``params`` to the active students."""
+    search = params.get('search', '').strip()
+    school = params.get('school')
+    level = params.get('level')
+    academic_year = params.get('academic_year')
+    gender = params.get('gender')
+    special_status = params.get('special_status')
+
+    students = Student.objects.filter(current_study__isnull=False, delete_status='not_deleted')
+
+    if search:
+        students = search_students(students, search)
+    if school:
+        students = students.filter(current_study__school__id=school)
+    if level:
+        students = students.filter(current_study__level__id=level)
+    if academic_year:
+        students = students.filter(current_study__current_semester__year=academic_year)
+    if gender:
+        students = students.filter(gender=gender)
+    if special_status:
+        students = students.filter(special_status=special_status)
+    return students
+
+
+def filter_params_for_job(params):
+    return {key: params.get(key) for key in STUDENT_FILTER_KEYS if params.get(key)}
+
+
+def job_accepted(job, **extra):
+    """202 response telling the browser which job to poll."""
+    return JsonResponse({
+        'job_id': job.pk,
+        'status_url': reverse('job_status', args=[job.pk]),
+        'download_url': reverse('job_download', args=[job.pk]),
+        **extra,
+    }, status=202)
+
+
 def Student_Rp(request):
     # Check if 'user_type' is in the session
     user_type = request.session.get('user_type')
@@ -444,50 +494,69 @@ def Student_Rp(request):
     gender = request.GET.get('gender')
     special_status = request.GET.get('special_status')
     action = request.GET.get('action')
-    items_per_page = int(request.GET.get('items_per_page', 10))  # รับค่าจำนวนข้อมูลต่อหน้า (ค่าเริ่มต้นคือ 10)
+    items_per_page = page_size(request.GET.get('items_per_page'))  # จำนวนข้อมูลต่อหน้า (ค่าเริ่มต้น 10, สูงสุด 100)
 
     # Query นักเรียน
-    students = Student.objects.filter(current_study__isnull=False, delete_status='not_deleted')
-
-    if search:
-        students = students.filter(
-            Q(first_name__icontains=search) | Q(last_name__icontains=search)
-        )
-    if school:
-        students = students.filter(current_study__school__id=school)
-    if level:
-        students = students.filter(current_study__level__id=level)
-    if academic_year:
-        students = students.filter(current_study__current_semester__year=academic_year)
-    if gender:
-        students = students.filter(gender=gender)
-    if special_status:
-        students = students.filter(special_status=special_status)
+    students = filter_students(request.GET)
 
     if action == 'download':
-        return download_students_pdf(students)
+        if 'background' in request.GET:
+            job = enqueue('students_pdf', filters=filter_params_for_job(request.GET))
+            return job_accepted(job)
+        return download_students_pdf(request, students)
+    if action == 'download_excel':
+        return download_students_excel(request, students)
+
+    # Pagination (keyset: ?cursor=<token>, ไม่ใช้ OFFSET)
+    sort = request.GET.get('sort') if request.GET.get('sort') in STUDENT_SORT_ORDERINGS else 'id'
+    page = keyset_page(
+        students.select_related('current_study__school', 'current_study__level'),
+        STUDENT_SORT_ORDERINGS[sort], request.GET.get('cursor'), items_per_page,
+    )
 
-    # Pagination
-    students = students.order_by('id')  # หรือ 'first_name', 'current_study__level__name' ตามที่ต้องการ
-    paginator = Paginator(students, items_per_page)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # ?count=estimate: นับแบบประมาณ ไม่นับแยกตามตัวเลือก (สำหรับรายการขนาดใหญ่)
+    if request.GET.get('count') == 'estimate':
+        total_students, total_exact = estimated_count(students)
+        option_counts = None
+        male_students = female_students = None
+    else:
+        # นับทุกตัวเลือกของฟิลเตอร์จาก query เดียว
+        facets = student_facets(filter_students({'search': search}), request.GET)
+        option_counts = facets['facets']
+        total_students, total_exact = facets['total'], True
+        male_students = facets['matched']['gender'].get('ชาย', 0)
+        female_students = facets['matched']['gender'].get('หญิง', 0)
+
+    def option_count(facet, value):
+        return option_counts[facet].get(value, 0) if option_counts is not None else None
 
     # ดึงข้อมูลสำหรับตัวเลือก
-    levels = Level.objects.all()
-    schools = School.objects.all()
-    academic_years = CurrentSemester.objects.values_list('year', flat=True).distinct()
+    levels = reference_data.levels()
+    for option in levels:
+        option.facet_count = option_count('level', option.id)
+    schools = reference_data.schools()
+    for option in schools:
+        option.facet_count = option_count('school', option.id)
+    academic_years = [
+        (year, option_count('academic_year', year))
+        for year in CurrentSemester.objects.values_list('year', flat=True).distinct()
+    ]
 
     # สร้าง URL ที่รวมฟิลเตอร์ทั้งหมด
     query_params = request.GET.copy()
     query_params.pop('page', None)  # ลบพารามิเตอร์ page ออกเพื่อไม่ให้ URL ซ้ำกัน
+    query_params.pop('cursor', None)
     filter_params = query_params.urlencode()  # สร้าง URL ของพารามิเตอร์ที่เหลือ
 
     context = {
-        'students': page_obj,
-        'total_students': students.count(),
-        'male_students': students.filter(gender='ชาย').count(),
-        'female_students': students.filter(gender='หญิง').count(),
+        'students': page['rows'],
+        'start': page['start'],
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor'],
+        'total_students': total_students,
+        'total_exact': total_exact,
+        'male_students': male_students,
+        'female_students': female_students,
         'levels': levels,
         'schools': schools,
         'academic_years': academic_years,
@@ -499,6 +568,7 @@ def Student_Rp(request):
             'gender': gender,
             'special_status': special_status,
             'items_per_page': items_per_page,
+            'sort': sort,
         },
         'filter_params': filter_params,  # ส่งค่าพารามิเตอร์ฟิลเตอร์
     }
@@ -506,144 +576,63 @@ def Student_Rp(request):
     return render(request, 'student/sp_student.html', context)
 
 
-def download_students_pdf(students):
-    # Check if there are any students
-    if not students.exists():
-        student_data = [['ไม่มีข้อมูล']]
-    else:
-        student_data = [
-            ['ลำดับ', 'ชื่อ', 'นามสกุล', 'เพศ', 'โรงเรียน', 'สถานะพิเศษ'],
-        ]
-        for i, student in enumerate(students, start=1):
-            student_data.append([
-                i,
-                student.first_name,
-                student.last_name,
-                student.gender or 'ไม่มีข้อมูล',
-                student.current_study.school.name if student.current_study else 'ไม่มีข้อมูล',
-                student.special_status or 'ไม่มีข้อมูล',
-            ])
+def download_students_pdf(request, students):
+    return cached_report_response(
+        request, 'students_pdf', filter_params_for_job(request.GET), (STUDENTS,),
+        lambda output: render_students_pdf(students, output), 'application/pdf',
+    )
 
 
-    
-    # Dynamically determine unique values from the queryset
-    unique_genders = students.values_list('gender', flat=True).distinct()
-    unique_special_statuses = students.values_list('special_status', flat=True).distinct()
-    unique_schools = students.values_list('current_study__school__name', flat=True).distinct()
-    unique_levels = students.values_list('current_study__level__name', flat=True).distinct()
-    unique_academic_years = students.values_list('current_study__current_semester__year', flat=True).distinct()
-
-    # Function to handle the display logic based on the number of unique values
-    def get_unique_text(unique_values, default_text):
-        if len(unique_values) == 1:
-            return unique_values[0]
-        return default_text
-
-    # Gender and Special Status Text
-    gender_text = get_unique_text(unique_genders, "ทุกเพศ")
-    status_text = get_unique_text(unique_special_statuses, "ทุกสถานะพิเศษ")
-    # School, Level, and Academic Year Text
-    school_name = get_unique_text(unique_schools, "ทุกโรงเรียน")
-    level_name = get_unique_text(unique_levels, "ทุกชั้น")
-    academic_year_text = get_unique_text(unique_academic_years, "ทุกปี")
-    academic_year_text_thai = convert_year_to_thai(academic_year_text)
-    header_info = f"ชั้น: {level_name} | ปีการศึกษา: {academic_year_text_thai} | เพศ: {gender_text} | สถานะพิเศษ: {status_text}"
-    
+def render_students_pdf(students, output, progress=None):
+    """
+    Write the student list PDF to ``output`` and return its file name.
 
-    # Create PDF Response
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="students_report_{academic_year_text_thai or "all"}.pdf"'
+    Rows and header come from one ``build_student_list`` query and are laid
+    out as chunked tables (see ``pdf_engine.chunked_tables``), so a whole
+    exam unit renders in seconds.
+    """
+    student_list = build_student_list(students)
 
+    styles = pdf_engine.paragraph_styles()
+    school_paragraph = Paragraph(f"<b>{student_list['school']}</b>", styles['list_title'])
+    info_paragraph = Paragraph(header_text(student_list), styles['list_info'])
 
-    # Create PDF Document (A4 Landscape)
-    doc = SimpleDocTemplate(
-        response,
-        pagesize=landscape(A4),
-        topMargin=0.5 * inch,
-        bottomMargin=0.5 * inch,
-        leftMargin=0.5 * inch,
-        rightMargin=0.5 * inch,
+    # Header: logo | school | filters
+    header_table = pdf_engine.header_row(
+        [pdf_engine.logo(1 * inch), school_paragraph, info_paragraph],
+        [2 * inch, 5 * inch, 3 * inch],
     )
 
-    # Logo
-    logo_path = "static/images/logo.ico"
-    logo = Image(logo_path, width=1 * inch, height=1 * inch)
-
-    # School Title
-    styles = getSampleStyleSheet()
-    styles['Normal'].fontName = 'THSarabunNew'
-    styles['Normal'].fontSize = 20
-    styles['Normal'].alignment = 1
-    school_paragraph = Paragraph(f"<b>{school_name}</b>", styles['Normal'])
-
-    # Info Paragraph
-    # Custom Style for Info Paragraph
-    custom_style = styles['Normal'].clone('CustomNormal')
-    custom_style.fontName = 'THSarabunNew'
-    custom_style.fontSize = 18
-    custom_style.leading = 19  # เพิ่มระยะห่างระหว่างบรรทัด
-    custom_style.alignment = 1
-
-    # Info Paragraph
-    info_paragraph = Paragraph(header_info, custom_style)
-
-    # Header Table Layout
-    header_table_data = [
-        [logo, school_paragraph, info_paragraph]
-    ]
-    header_table = Table(
-        header_table_data,
-        colWidths=[2 * inch, 5 * inch, 3 * inch]
+    # Student Table
+    tables = pdf_engine.chunked_tables(
+        STUDENT_LIST_HEADERS, student_list['rows'], [50, 150, 150, 100, 250, 100], 'student_list',
+        progress=progress,
     )
-    header_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('GRID', (0, 0), (-1, -1), 0.8, colors.grey),
-        ('BOX', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('BOTTOMPADDING', (1, 0), (-1, -1), 15),
-    ]))
 
-    # Add spacing
-    spacer = Spacer(1, 0.3 * inch)
+    # Build PDF (A4 Landscape)
+    pdf_engine.render([header_table, Spacer(1, 0.3 * inch)] + tables, output, pagesize=landscape(A4))
 
-    # Student Table
-    table = Table(
-        student_data,
-        colWidths=[50, 150, 150, 100, 250, 100]
-    )
-    table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, 0), 'THSarabunNew'),
-        ('FONTSIZE', (0, 0), (-1, 0), 16),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 15),
-
-        ('FONTNAME', (0, 1), (-1, -1), 'THSarabunNew'),
-        ('FONTSIZE', (0, 1), (-1, -1), 14),
-        ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 1), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 1), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 12),
-
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-
-    # Build PDF
-    elements = [header_table, spacer, table]
-    doc.build(elements)
+    return report_filename(student_list, 'pdf')
 
-    return response
+
+def download_students_excel(request, students):
+    def build(output):
+        student_list = build_student_list(students)
+        build_student_list_workbook(student_list).save(output)
+        return report_filename(student_list, 'xlsx')
+
+    return cached_report_response(
+        request, 'students_xlsx', filter_params_for_job(request.GET), (STUDENTS,), build, XLSX_CONTENT_TYPE,
+    )
 
 #grade input
 def student_marks_view(request):
     user_type = request.session.get('user_type')
-    current_semester = CurrentSemester.objects.first()
+    current_semester = reference_data.current_semester()
 
     current_thai_year = datetime.now().year + 543
-    thai_years_from_db = StudentHistory.objects.values_list('academic_year', flat=True).distinct()
-    clean_years = {str(int(y)) for y in thai_years_from_db if str(y).isdigit()}
+    # ปีในทะเบียนเก็บเป็น ค.ศ. แปลงเป็น พ.ศ. ให้ตรงกับตัวเลือกในฟอร์ม
+    clean_years = {str(year + 543) for year in get_academic_years()}
     extra_years = {str(current_thai_year + offset) for offset in range(-3, 1)}
     years = sorted(clean_years.union(extra_years), reverse=True)
 
@@ -664,35 +653,16 @@ def student_marks_view(request):
     school_name = request.GET.get('school')
     level_name = request.GET.get('level')
 
-    schools = School.objects.all()
-    levels = Level.objects.all()
+    schools = reference_data.schools()
+    levels = reference_data.levels()
     students = []
     subjects = []
     student_marks_data = []
 
     if school_name and level_name:
-        students_query = CurrentStudy.objects.filter(
-            current_semester=current_semester,
-            school__name__iexact=school_name,
-            level__name__iexact=level_name,
-        ).select_related('student', 'level', 'school')
-
-        students = list(students_query)
-
-        subjects = SubjectToStudy.objects.filter(
-            level__name__iexact=level_name
-        ).select_related('subject')
-
-        for student in students:
-            marks_row = {'student': student.student}
-            for subject in subjects:
-                mark_obj = StudentMarkForSubject.objects.filter(
-                    student=student.student,
-                    subject_to_study=subject,
-                    academic_year=academic_year_int
-                ).first()
-                marks_row[subject.subject.id] = mark_obj.marks_obtained if mark_obj else ''
-            student_marks_data.append(marks_row)
+        students = get_class_studies(current_semester, school_name, level_name)
+        subjects = get_level_subjects(level_name)
+        student_marks_data = load_mark_matrix(students, subjects, academic_year_int)
 
     if request.method == 'POST':
         academic_year = request.POST.get('academic_year') or academic_year
@@ -701,65 +671,19 @@ def student_marks_view(request):
         except:
             academic_year_int = datetime.now().year
 
-        students_query = CurrentStudy.objects.filter(
-            current_semester=current_semester,
-            school__name__iexact=school_name,
-            level__name__iexact=level_name,
-            student__delete_status='not_deleted'
-        ).select_related('student', 'level', 'school')
-
-        subjects = SubjectToStudy.objects.filter(
-            level__name__iexact=level_name
-        ).select_related('subject')
-
-        for student in students_query:
-            student_subject_marks = {}
-            total_marks = 0
-            obtained_marks = 0
-
-            for subject in subjects:
-                field_name = f"marks_{student.student.id}_{subject.subject.id}"
-                marks = request.POST.get(field_name)
-
-                if marks:
-                    try:
-                        marks = int(marks)
-                        student_subject_marks[subject.subject.name] = marks
-                        total_marks += subject.subject.total_marks
-                        obtained_marks += marks
-
-                        StudentMarkForSubject.objects.update_or_create(
-                            student=student.student,
-                            subject_to_study=subject,
-                            category=subject.subject.category,
-                            academic_year=academic_year_int,
-                            defaults={'marks_obtained': marks},
-                        )
-                    except ValueError:
-                        return render(request, 'inputdata/ingr_student.html', {
-                            'error': f"Invalid marks for {student.student.first_name} in {subject.subject.name}.",
-                            'schools': schools,
-                            'levels': levels,
-                            'students': students,
-                            'subjects': subjects,
-                        })
-
-            grade_percentage = (obtained_marks / total_marks) * 100 if total_marks > 0 else 0
-
-            StudentHistory.objects.update_or_create(
-                student_id=student.student.id,
-                student_name=f"{student.student.first_name} {student.student.last_name}",
-                school_name=student.school.name,
-                level_name=student.level.name,
-                academic_year=academic_year_int,
-                defaults={
-                    'total_marks': total_marks,
-                    'obtained_marks': obtained_marks,
-                    'grade_percentage': grade_percentage,
-                    'subject_marks': student_subject_marks,
-                    'pass_or_fail': "ผ่าน" if grade_percentage >= 50 else "ไม่ผ่าน"
-                }
-            )
+        students_query = get_class_studies(current_semester, school_name, level_name, active_only=True)
+        subjects = get_level_subjects(level_name)
+
+        try:
+            cells = parse_grade_sheet(request.POST, students_query, subjects)
+        except InvalidMarkError as exc:
+            return render(request, 'inputdata/ingr_student.html', {
+                'error': str(exc),
+                'schools': schools,
+                'levels': levels,
+                'students': students,
+                'subjects': subjects,
+            })
 
         query_params = {
             'school': school_name,
@@ -768,6 +692,18 @@ def student_marks_view(request):
         }
         query_params = {k: v for k, v in query_params.items() if v}
         redirect_url = f"{reverse('gr_student')}?{urlencode(query_params)}"
+
+        if 'background' in request.POST:
+            job = enqueue(
+                'grade_sheet',
+                school_name=school_name,
+                level_name=level_name,
+                academic_year=academic_year_int,
+                cells=[[student_id, sts_id, value] for (student_id, sts_id), value in cells.items()],
+            )
+            return job_accepted(job, redirect_url=redirect_url)
+
+        save_grade_sheet(students_query, subjects, academic_year_int, cells)
         return HttpResponseRedirect(redirect_url)
 
     context = {
@@ -784,7 +720,127 @@ def student_marks_view(request):
 
     return render(request, 'inputdata/ingr_student.html', context)
 
+def save_mark_cells(request):
+    """
+    บันทึกเฉพาะช่องคะแนนที่แก้ไข (JSON) แล้วส่งคะแนนรวมของนักเรียนที่เกี่ยวข้องกลับไป
+
+    Body: ``{"school", "level", "academic_year" (พ.ศ.), "cells": [{"student", "subject", "value"}]}``
+    where ``subject`` is the Subject id used in the grade form field names.
+    """
+    user_type = request.session.get('user_type')
+    if not user_type or user_type == 'student':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST only'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise TypeError
+        academic_year_int = int(data.get('academic_year')) - 543
+        cells_in = data['cells']
+        if not isinstance(cells_in, list) or not all(isinstance(cell, dict) for cell in cells_in):
+            raise TypeError
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'error': 'Invalid data'}, status=400)
+
+    studies = {
+        study.student_id: study
+        for study in get_class_studies(
+            reference_data.current_semester(), data.get('school'), data.get('level'), active_only=True,
+        )
+    }
+    subjects = get_level_subjects(data.get('level'))
+    subjects_by_subject_id = {sts.subject_id: sts for sts in subjects}
+
+    cells = {}
+    for cell in cells_in:
+        study = studies.get(str(cell.get('student')))
+        sts = subjects_by_subject_id.get(safe_int(cell.get('subject')))
+        if study is None or sts is None:
+            return JsonResponse({'error': f"Unknown student or subject: {cell}"}, status=400)
+        try:
+            value = int(cell.get('value'))
+        except (TypeError, ValueError):
+            return JsonResponse({'error': str(InvalidMarkError(study, sts))}, status=400)
+        if not 0 <= value <= sts.subject.total_marks:
+            return JsonResponse({'error': str(InvalidMarkError(study, sts))}, status=400)
+        cells[(study.student_id, sts.id)] = value
+
+    touched = [studies[student_id] for student_id in {student_id for student_id, _ in cells}]
+    histories = save_grade_sheet(touched, subjects, academic_year_int, cells)
+    missing = [int(study.student_id) for study in touched if int(study.student_id) not in histories]
+    if missing:
+        for history in StudentHistory.objects.filter(
+            student_id__in=missing,
+            academic_year=str(academic_year_int),
+            level_name__in={study.level.name for study in touched},
+        ):
+            histories.setdefault(history.student_id, history)
+
+    return JsonResponse({'students': {
+        str(student_id): {
+            'total_marks': int(history.total_marks or 0),
+            'obtained_marks': int(history.obtained_marks or 0),
+            'grade_percentage': round(float(history.grade_percentage or 0), 2),
+            'pass_or_fail': history.pass_or_fail,
+        }
+        for student_id, history in histories.items()
+    }})
+
+
+def import_marks(request):
+    """รับไฟล์ xlsx คะแนนทั้งหน่วยสอบ แล้วส่งไปนำเข้าเป็นงานเบื้องหลัง"""
+    user_type = request.session.get('user_type')
+    if not user_type:
+        return redirect('login_view')
+    if user_type == 'student':
+        return redirect('home')
+    if request.method != 'POST':
+        return redirect('ingr_student')
+
+    upload = request.FILES.get('marks_file')
+    if not upload or not upload.name.lower().endswith('.xlsx'):
+        return JsonResponse({'error': 'กรุณาเลือกไฟล์ .xlsx'}, status=400)
+    try:
+        academic_year_int = int(request.POST.get('academic_year')) - 543
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'ปีการศึกษาไม่ถูกต้อง'}, status=400)
+
+    path = default_storage.save(f"imports/{upload.name}", upload)
+    job = enqueue('import_marks', max_attempts=1, path=path, academic_year=academic_year_int)
+    return job_accepted(job)
+
 #grade output
+GR_PAGE_SIZE = 100
+GR_STREAM_CHUNK = 500
+GR_TABLE_FIELDS = ('id', 'student_name', 'obtained_marks', 'grade_percentage', 'pass_or_fail')
+GR_ROWS_MARKER = '<!-- gr-student-rows -->'
+
+
+def stream_history_rows(head, tail, histories, subject_columns):
+    """Yield the results page around table rows rendered ``GR_STREAM_CHUNK`` histories at a time."""
+    yield head
+    chunk = []
+    start = 0
+    for history in histories.iterator(chunk_size=GR_STREAM_CHUNK):
+        chunk.append(history)
+        if len(chunk) == GR_STREAM_CHUNK:
+            yield render_history_rows(chunk, subject_columns, start)
+            start += len(chunk)
+            chunk = []
+    if chunk:
+        yield render_history_rows(chunk, subject_columns, start)
+    yield tail
+
+
+def render_history_rows(histories, subject_columns, start):
+    return render_to_string('student/gr_student_rows.html', {
+        'students': attach_subject_columns(histories, subject_columns),
+        'start': start,
+    })
+
+
 def GR_Student(request):
     user_type = request.session.get('user_type')
     if not user_type:
@@ -792,18 +848,18 @@ def GR_Student(request):
     if user_type == 'student':
         return redirect('home')
 
-    schools = School.objects.all()
-    levels = Level.objects.all()
-    current_semester = CurrentSemester.objects.first()
+    schools = reference_data.schools()
+    levels = reference_data.levels()
+    current_semester = reference_data.current_semester()
     current_year = int(current_semester.year) if current_semester else datetime.now().year + 543
 
-    academic_years = StudentHistory.objects.values_list('academic_year', flat=True).distinct().order_by('-academic_year')
+    academic_years = get_academic_years()
 
     school_name = request.GET.get('school')
     level_name = request.GET.get('level')
     academic_year = request.GET.get('academic_year') or str(current_year)
 
-    histories = StudentHistory.objects.all()
+    histories = StudentHistory.objects.only(*GR_TABLE_FIELDS).order_by('id')
     if school_name:
         histories = histories.filter(school_name=school_name)
     if level_name:
@@ -811,24 +867,28 @@ def GR_Student(request):
     if academic_year:
         histories = histories.filter(academic_year=academic_year)
 
-    # เก็บชื่อวิชาที่นักเรียนมีใน subject_marks
-    used_subject_names = set()
-    for history in histories:
-        if history.subject_marks:
-            used_subject_names.update(history.subject_marks.keys())
-
     # ดึงวิชา และแยกตามประเภท (category)
-    subject_study_qs = SubjectToStudy.objects.filter(level__name=level_name)
-    practical_subjects = [s.subject.name for s in subject_study_qs if s.subject.category == 2]
-    theory_subjects = [s.subject.name for s in subject_study_qs if s.subject.category == 1]
+    subject_study_qs = get_level_subjects(level_name)
+    practical = [s.subject for s in subject_study_qs if s.subject.category == 2]
+    theory = [s.subject for s in subject_study_qs if s.subject.category == 1]
+    practical_subjects = [subject.name for subject in practical]
+    theory_subjects = [subject.name for subject in theory]
     subject_totals = {s.subject.name: s.subject.total_marks for s in subject_study_qs}
+    subject_columns = {
+        'theory_marks': [subject.id for subject in theory],
+        'practical_marks': [subject.id for subject in practical],
+    }
+
+    statistics = None
+    if school_name and level_name and academic_year:
+        statistics = get_class_statistics(school_name, level_name, academic_year)
 
     context = {
         'user_type': user_type,
         'schools': schools,
         'levels': levels,
         'academic_years': academic_years,
-        'students': histories,
+        'statistics': statistics,
         'academic_year': academic_year,
         'school_name': school_name,
         'level_name': level_name,
@@ -836,150 +896,123 @@ def GR_Student(request):
         'theory_subjects': theory_subjects,
         'subject_totals': subject_totals,
     }
+
+    if request.GET.get('stream'):
+        # แสดงทั้งชั้นแบบ stream: ดึงทีละ chunk ไม่โหลดทั้งหมดเข้าหน่วยความจำ
+        context['streaming'] = True
+        head, tail = render(request, 'student/gr_student.html', context).content.decode().split(GR_ROWS_MARKER, 1)
+        return StreamingHttpResponse(
+            stream_history_rows(head, tail, histories, subject_columns),
+            content_type='text/html; charset=utf-8',
+        )
+
+    # keyset pagination: ?after=<id ของแถวสุดท้าย>&start=<ลำดับที่แสดงไปแล้ว>
+    try:
+        after = int(request.GET.get('after', 0))
+        start = int(request.GET.get('start', 0))
+    except ValueError:
+        after, start = 0, 0
+    page = list(histories.filter(id__gt=after)[:GR_PAGE_SIZE + 1])
+    has_next = len(page) > GR_PAGE_SIZE
+    page = attach_subject_columns(page[:GR_PAGE_SIZE], subject_columns)
+
+    params = {key: request.GET[key] for key in ('school', 'level', 'academic_year') if request.GET.get(key)}
+    context.update({
+        'students': page,
+        'start': start,
+        'next_url': f"?{urlencode({**params, 'after': page[-1].id, 'start': start + len(page)})}" if has_next else '',
+        'first_url': f"?{urlencode(params)}" if after else '',
+        'stream_url': f"?{urlencode({**params, 'stream': 1})}",
+    })
     return render(request, 'student/gr_student.html', context)
 
+def class_statistics_view(request):
+    """สถิติรายวิชาของชั้นเรียน (JSON) - ``?school=&level=&academic_year=`` (ค.ศ.)"""
+    user_type = request.session.get('user_type')
+    if not user_type or user_type == 'student':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    school_name = request.GET.get('school')
+    level_name = request.GET.get('level')
+    academic_year = request.GET.get('academic_year')
+    if not (school_name and level_name and academic_year):
+        return JsonResponse({'error': 'school, level and academic_year are required'}, status=400)
+    return JsonResponse(get_class_statistics(school_name, level_name, academic_year))
+
+
+def student_typeahead(request):
+    """ค้นหานักเรียนจากคำขึ้นต้น (ชื่อ, รหัสนักเรียน, เลขบัตรประชาชน) - ``?q=&limit=``"""
+    user_type = request.session.get('user_type')
+    if not user_type or user_type == 'student':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    limit = page_size(request.GET.get('limit'), default=typeahead.DEFAULT_LIMIT, maximum=typeahead.MAX_LIMIT)
+    return JsonResponse({'results': typeahead.lookup(request.GET.get('q', ''), limit)})
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def save_workbook(output, wb, filename):
+    wb.save(output)
+    return filename
+
+
 def download_student_results_excel(request):
     school_name = request.GET.get('school')
     level_name = request.GET.get('level')
     academic_year = request.GET.get('academic_year')
 
-    histories = StudentHistory.objects.all()
-    if school_name:
-        histories = histories.filter(school_name=school_name)
-    if level_name:
-        histories = histories.filter(level_name=level_name)
-    if academic_year:
-        histories = histories.filter(academic_year=academic_year)
+    if 'background' in request.GET:
+        job = enqueue('student_results_excel', school_name=school_name, level_name=level_name, academic_year=academic_year)
+        return job_accepted(job)
 
-    theory_subjects = list(Subject.objects.filter(category=1).values_list('name', flat=True))
-    practical_subjects = list(Subject.objects.filter(category=2).values_list('name', flat=True))
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "ผลการเรียน"
-
-    # --- โลโก้ตรงกลาง (แถว 1–2) ---
-    logo_path = 'static/images/logo.png'
-    if os.path.exists(logo_path):
-        logo = XLImage(logo_path)
-        logo.width = 80
-        logo.height = 80
-        ws.add_image(logo, 'F1')  # ประมาณกลางหน้า
-
-    academic_year_thai = str(int(academic_year) + 543) if academic_year and academic_year.isdigit() else "ทุกปี"
-    level_display = level_name or "ทุกระดับชั้น"
-    school_display = school_name or "ทุกโรงเรียน"
-    province = "จังหวัดกระบี่"
-
-    # --- คำนวณจำนวนคอลัมน์ทั้งหมด ---
-    last_col = 2 + len(theory_subjects) + len(practical_subjects) + 3
-    last_col_letter = get_column_letter(last_col)
-
-    # --- แถว 5: ชื่อสมาคมฯ ---
-    ws.merge_cells(f'A5:{last_col_letter}5')
-    ws['A5'] = f'สมาคมวิชาการศาสนาอิสลามภาคฟัรฎูกิฟายะห์ ปีการศึกษา {academic_year_thai} ระดับชั้นปี {level_display}'
-    ws['A5'].font = Font(size=14, bold=True)
-    ws['A5'].alignment = Alignment(horizontal='center', vertical='center')
-
-    # --- แถว 6: โรงเรียน จังหวัด ---
-    ws.merge_cells(f'A6:{last_col_letter}6')
-    ws['A6'] = f'{school_display} {province}'
-    ws['A6'].font = Font(size=12)
-    ws['A6'].alignment = Alignment(horizontal='center', vertical='center')
-
-    start_row = 8
-
-    # --- หัวตารางหลัก ---
-    ws.merge_cells(start_row=start_row, start_column=1, end_row=start_row+1, end_column=1)
-    ws.cell(row=start_row, column=1).value = 'ลำดับ'
-    ws.merge_cells(start_row=start_row, start_column=2, end_row=start_row+1, end_column=2)
-    ws.cell(row=start_row, column=2).value = 'ชื่อ-สกุล'
-
-    col_index = 3
-    if theory_subjects:
-        end_col = col_index + len(theory_subjects) - 1
-        ws.merge_cells(start_row=start_row, start_column=col_index, end_row=start_row, end_column=end_col)
-        ws.cell(row=start_row, column=col_index).value = 'ภาคทฤษฎี'
-        col_index = end_col + 1
-
-    if practical_subjects:
-        end_col = col_index + len(practical_subjects) - 1
-        ws.merge_cells(start_row=start_row, start_column=col_index, end_row=start_row, end_column=end_col)
-        ws.cell(row=start_row, column=col_index).value = 'ภาคปฏิบัติ'
-        col_index = end_col + 1
-
-    ws.merge_cells(start_row=start_row, start_column=col_index, end_row=start_row, end_column=col_index + 2)
-    ws.cell(row=start_row, column=col_index).value = 'สรุปผล'
-
-    # --- Subheader: วิชา + สรุป ---
-    col = 3
-    for subject in theory_subjects:
-        ws.cell(row=start_row+1, column=col).value = subject
-        ws.cell(row=start_row+1, column=col).alignment = Alignment(horizontal='center', vertical='center', textRotation=90)
-        col += 1
-    for subject in practical_subjects:
-        ws.cell(row=start_row+1, column=col).value = subject
-        ws.cell(row=start_row+1, column=col).alignment = Alignment(horizontal='center', vertical='center', textRotation=90)
-        col += 1
-    for i, title in enumerate(['คะแนนรวม', 'คิดเป็นร้อยละ', 'ผลตัดสิน']):
-        ws.cell(row=start_row+1, column=col+i).value = title
-        ws.cell(row=start_row+1, column=col+i).alignment = Alignment(horizontal='center', vertical='center')
-
-    # --- หัวตาราง font + alignment ---
-    for cell in ws[start_row]:
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    for cell in ws[start_row+1]:
-        cell.font = Font(bold=True)
-
-    # --- ข้อมูลนักเรียน ---
-    for idx, student in enumerate(histories, start=1):
-        row = start_row + 1 + idx
-        ws.cell(row=row, column=1).value = idx
-        ws.cell(row=row, column=2).value = student.student_name
-        col = 3
-        for subject in theory_subjects:
-            ws.cell(row=row, column=col).value = student.subject_marks.get(subject, '-') if student.subject_marks else '-'
-            col += 1
-        for subject in practical_subjects:
-            ws.cell(row=row, column=col).value = student.subject_marks.get(subject, '-') if student.subject_marks else '-'
-            col += 1
-        ws.cell(row=row, column=col).value = student.obtained_marks or 0
-        ws.cell(row=row, column=col+1).value = round(student.grade_percentage, 1) if student.grade_percentage is not None else '-'
-        ws.cell(row=row, column=col+2).value = student.pass_or_fail or '-'
-
-        for c in range(1, col + 3):
-            ws.cell(row=row, column=c).alignment = Alignment(horizontal='center', vertical='center')
-
-    # --- ใส่ border ให้ทุก cell ที่ใช้ ---
-    thin = Side(border_style="thin", color="000000")
-    border = Border(top=thin, left=thin, right=thin, bottom=thin)
-
-    for row in ws.iter_rows(min_row=start_row, max_row=ws.max_row, min_col=1, max_col=last_col):
-        for cell in row:
-            cell.border = border
-
-
-    for idx in range(1, last_col + 1):
-        col_letter = get_column_letter(idx)
-        if idx == 1:
-            ws.column_dimensions[col_letter].width = 7   # ลำดับ
-        elif idx == 2:
-            ws.column_dimensions[col_letter].width = 22  # ชื่อ
-        elif 3 <= idx < 3 + len(theory_subjects) + len(practical_subjects):
-            ws.column_dimensions[col_letter].width = 5   # วิชา
-        else:
-            ws.column_dimensions[col_letter].width = 13  # คะแนนรวม ฯลฯ
+    return cached_report_response(
+        request, 'student_results_excel',
+        {'school': school_name, 'level': level_name, 'academic_year': academic_year}, (RESULTS,),
+        lambda output: save_workbook(output, *build_student_results_workbook(school_name, level_name, academic_year)),
+        XLSX_CONTENT_TYPE,
+    )
+
+
+def download_unit_results_excel(request):
+    """ไฟล์ Excel เดียวของทั้งหน่วยสอบ: หน้าสรุป + หนึ่ง sheet ต่อ (โรงเรียน, ชั้น)"""
+    user_type = request.session.get('user_type')
+    if not user_type or user_type == 'student':
+        return redirect('login_view')
+
+    level_name = request.GET.get('level') or None
+    academic_year = request.GET.get('academic_year')
+    if not academic_year:
+        return HttpResponse("academic_year is required", status=400)
+
+    if 'background' in request.GET:
+        job = enqueue('unit_results_excel', level_name=level_name, academic_year=academic_year)
+        return job_accepted(job)
 
+    return cached_report_response(
+        request, 'unit_results_excel', {'level': level_name, 'academic_year': academic_year}, (RESULTS,),
+        lambda output: save_workbook(output, *build_unit_workbook(academic_year, level_name)),
+        XLSX_CONTENT_TYPE,
+    )
 
-    # --- ชื่อไฟล์ ---
-    filename = f"ผลการเรียน_{school_display}_{academic_year_thai}.xlsx"
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    encoded_filename = quote(filename)
-    response['Content-Disposition'] = f"attachment; filename*=UTF-8''{encoded_filename}"    
-    wb.save(response)
+
+def export_results_data(request, dataset, fmt):
+    """ข้อมูลดิบแบบ CSV / JSON Lines (stream) - ``?school=&level=&academic_year=`` (ค.ศ.)"""
+    user_type = request.session.get('user_type')
+    if not user_type or user_type == 'student':
+        return HttpResponseForbidden()
+    if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+        raise Http404
+
+    names, rows = export_rows(dataset, request.GET)
+    encode, content_type = EXPORT_FORMATS[fmt]
+    filename = '_'.join([dataset] + [request.GET[key] for key in ('school', 'level', 'academic_year') if request.GET.get(key)])
+    response = StreamingHttpResponse(encode(names, rows), content_type=content_type)
+    response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}.{fmt}"
     return response
 
+
 #grade output
 def student_Results(request, student_id):
     user_type = request.session.get('user_type')
@@ -988,7 +1021,7 @@ def student_Results(request, student_id):
 
     student = get_object_or_404(Student, id=student_id)
     current_study = CurrentStudy.objects.filter(student=student).first()
-    current_semester = CurrentSemester.objects.first()
+    current_semester = reference_data.current_semester()
 
     academic_years = StudentHistory.objects.filter(student_id=student.id) \
         .values_list('academic_year', flat=True).distinct().order_by('-academic_year')
@@ -1051,6 +1084,8 @@ def student_Results(request, student_id):
         'academic_years': academic_years,
         'subjects_cat1': subjects_cat1,
         'subjects_cat2': subjects_cat2,
+        'cat1_data': cat1_data,
+        'cat2_data': cat2_data,
     }
 
     return render(request, 'student/student_results.html', context)
@@ -1069,117 +1104,68 @@ def download_result_pdfs(
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{student_name}_results_{academic_year}.pdf"'
 
-    doc = SimpleDocTemplate(
-        response,
-        pagesize=A4,
-        topMargin=0.5 * inch,
-        bottomMargin=0.5 * inch,
-        leftMargin=0.5 * inch,
-        rightMargin=0.5 * inch,
-    )
+    # สร้าง PDF
+    pdf_engine.render(report_card_elements(
+        student.gender, semester_1_data, semester_2_data, academic_year,
+        student_name, school_name, level_name, selected_semester,
+    ), response)
+    return response
 
-    # Styles
-    styles = getSampleStyleSheet()
-    styles['Normal'].fontName = 'THSarabunNew'
-    styles['Normal'].fontSize = 18
 
-    title_style = ParagraphStyle(
-        name='Title',
-        fontName='THSarabunNew',
-        fontSize=16,
-        alignment=1
-    )
-    sub_title_style = ParagraphStyle(
-        name='SubTitle',
-        fontName='THSarabunNew',
-        fontSize=16,
-        alignment=1
-    )
-    normal_style = ParagraphStyle(
-        name='Normal',
-        fontName='THSarabunNew',
-        fontSize=16,
-        alignment=0
+def class_report_cards_view(request):
+    """
+    ใบแจ้งผลการเรียนของนักเรียนทั้งชั้น - ``?school=&level=&academic_year=`` (ค.ศ.) ``&format=zip|pdf``
+
+    The request renders in one process; ``&background=1`` hands a zip to
+    ``run_worker``, which spreads it over a process pool.
+    """
+    user_type = request.session.get('user_type')
+    if not user_type or user_type == 'student':
+        return redirect('login_view')
+
+    school_name = request.GET.get('school')
+    level_name = request.GET.get('level')
+    academic_year = request.GET.get('academic_year')
+    fmt = 'pdf' if request.GET.get('format') == 'pdf' else 'zip'
+    if not (school_name and level_name and academic_year and academic_year.isdigit()):
+        return HttpResponse("school, level and academic_year are required", status=400)
+
+    if 'background' in request.GET:
+        job = enqueue('report_cards', school_name=school_name, level_name=level_name, academic_year=academic_year, fmt=fmt)
+        return job_accepted(job)
+
+    def build(output):
+        render_report_cards(class_report_cards(school_name, level_name, academic_year), output, fmt)
+        return f"ผลการเรียน_{school_name}_{level_name}_{convert_to_thai_year(academic_year)}.{fmt}"
+
+    return cached_report_response(
+        request, 'report_cards', {'school': school_name, 'level': level_name, 'academic_year': academic_year, 'format': fmt},
+        (RESULTS, STUDENTS), build, 'application/pdf' if fmt == 'pdf' else 'application/zip',
     )
 
-    # Logo
-    logo_path = "static/images/logo.ico"
-    logo = Image(logo_path, width=80, height=80)
-    logo.hAlign = 'CENTER'
-
-    # Header
-    header = Paragraph("สมาคมคุรุสัมพันธ์อิสลามแห่งประเทศไทย ประจำหน่วยสอบที่ 80", title_style)
-    school_name_paragraph = Paragraph(f"โรงเรียน {school_name}", sub_title_style)
-    prefix = 'เด็กชาย' if student.gender == 'ชาย' else 'เด็กหญิง' if student.gender == 'หญิง' else ''
-    student_info = Paragraph(f"ผลการเรียนของ {prefix} {student_name} {level_name}", normal_style)
-    academic_year_text = Paragraph(f"ประจำปีการศึกษา {academic_year}", normal_style)
-
-    # Tables
-    def generate_table(data):
-        if not data:
-            return Paragraph("ยังไม่มีข้อมูลสำหรับภาคนี้", sub_title_style)
-        table_data = [['วิชา', 'คะแนน', 'เกรด', 'ผ่าน/ไม่ผ่าน']] + data
-        table = Table(table_data, colWidths=[200, 100, 100, 100])
-        table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'THSarabunNew'),
-            ('FONTSIZE', (0, 0), (-1, -1), 14),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('TOPPADDING', (0, 0), (-1, 0), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        return table
-
-    # Elements
-    elements = [
-        logo,
-        Spacer(1, 10),
-        header,
-        Spacer(1, 20),
-        school_name_paragraph,
-        Spacer(1, 20),
-        student_info,
-        Spacer(1, 10),
-        academic_year_text,
-        Spacer(1, 20),
-    ]
 
-    if selected_semester == '1':
-        if semester_1_data:
-            elements += [
-                Paragraph("ผลการเรียนภาคทฤษฎี", title_style),
-                Spacer(1, 20),
-                generate_table(semester_1_data)
-            ]
-    elif selected_semester == '2':
-        if semester_2_data:
-            elements += [
-                Paragraph("ผลการเรียนภาคปฏิบัติ", title_style),
-                Spacer(1, 20),
-                generate_table(semester_2_data)
-            ]
-    else:
-        if semester_1_data:
-            elements += [
-                Paragraph("ผลการเรียนภาคทฤษฎี", title_style),
-                Spacer(1, 20),
-                generate_table(semester_1_data),
-                Spacer(1, 15),
-            ]
-        if semester_2_data:
-            elements += [
-                Paragraph("ผลการเรียนภาคปฏิบัติ", title_style),
-                Spacer(1, 20),
-                generate_table(semester_2_data),
-            ]
+def job_status(request, job_id):
+    user_type = request.session.get('user_type')
+    if not user_type or user_type == 'student':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    job = get_object_or_404(Job, id=job_id)
+    return JsonResponse(job_payload(job))
 
-    # สร้าง PDF
-    doc.build(elements)
-    return response
 
+def job_download(request, job_id):
+    user_type = request.session.get('user_type')
+    if not user_type or user_type == 'student':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    job = get_object_or_404(Job, id=job_id)
+    if job.status != 'done' or not job.result_file:
+        return JsonResponse(job_payload(job), status=409)
+    return FileResponse(
+        job.result_file.open('rb'),
+        as_attachment=True,
+        filename=(job.result or {}).get('filename') or os.path.basename(job.result_file.name),
+    )
 
 
 # error
@@ -0,0 +1,360 @@
+# students/workbooks.py
+"""
+Results workbooks (xlsx).
+
+Everything is written with openpyxl write-only worksheets and shared named
+styles, reading histories in chunks, so memory does not grow with the number
+of rows. :func:`build_student_results_workbook` is the single-class export;
+:func:`build_unit_workbook` puts a whole exam unit in one workbook, a sheet per
+(school, level) plus a summary sheet, from one ordered query.
+:func:`build_student_list_workbook` is the Excel form of the student list.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+import openpyxl
+from django.db import connections
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.image import Image as XLImage
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, Side
+from openpyxl.utils import get_column_letter
+
+from .marks import attach_subject_columns
+from .models import StudentHistory, Subject
+from .student_lists import STUDENT_LIST_HEADERS, header_text
+
+SUMMARY_TITLES = ['คะแนนรวม', 'คิดเป็นร้อยละ', 'ผลตัดสิน', 'อันดับในชั้น', 'เปอร์เซ็นไทล์']
+UNIT_SUMMARY_TITLES = ['โรงเรียน', 'จำนวนนักเรียน', 'ผ่าน', 'ไม่ผ่าน', 'ร้อยละเฉลี่ย']
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_HISTORY_FIELDS = (
+    'id', 'student_name', 'school_name', 'level_name', 'obtained_marks', 'grade_percentage',
+    'pass_or_fail', 'class_rank', 'class_size', 'unit_percentile',
+)
+PROVINCE = "จังหวัดกระบี่"
+LOGO_PATH = 'static/images/logo.png'
+
+
+def add_result_styles(wb):
+    """Register the shared named styles used by the results workbooks."""
+    thin = Side(border_style="thin", color="000000")
+    border = Border(top=thin, left=thin, right=thin, bottom=thin)
+    center = Alignment(horizontal='center', vertical='center')
+    styles = [
+        NamedStyle(name='result_title', font=Font(size=14, bold=True), alignment=center),
+        NamedStyle(name='result_subtitle', font=Font(size=12), alignment=center),
+        NamedStyle(name='result_header', font=Font(bold=True), alignment=center, border=border),
+        NamedStyle(
+            name='result_subject', font=Font(bold=True), border=border,
+            alignment=Alignment(horizontal='center', vertical='center', textRotation=90),
+        ),
+        NamedStyle(name='result_cell', alignment=center, border=border),
+    ]
+    for style in styles:
+        wb.add_named_style(style)
+
+
+def styled_row(ws, values, style):
+    """Write-only cells of ``values`` with the named style ``style`` (registered by :func:`add_result_styles`)."""
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        cells.append(cell)
+    return cells
+
+
+def result_subjects():
+    """``(theory, practical)`` lists of ``(Subject id, name)`` used as workbook columns."""
+    theory = list(Subject.objects.filter(category=1).values_list('id', 'name'))
+    practical = list(Subject.objects.filter(category=2).values_list('id', 'name'))
+    return theory, practical
+
+
+def filtered_histories(school_name=None, level_name=None, academic_year=None):
+    histories = StudentHistory.objects.only(*EXPORT_HISTORY_FIELDS)
+    if school_name:
+        histories = histories.filter(school_name=school_name)
+    if level_name:
+        histories = histories.filter(level_name=level_name)
+    if academic_year:
+        histories = histories.filter(academic_year=academic_year)
+    return histories
+
+
+def thai_year_text(academic_year):
+    return str(int(academic_year) + 543) if academic_year and str(academic_year).isdigit() else "ทุกปี"
+
+
+def sheet_title(name, used):
+    """A unique sheet name Excel accepts (31 characters, no ``[]:*?/\\``)."""
+    base = re.sub(r'[\[\]:*?/\\]', '-', name).strip()[:31] or 'Sheet'
+    title, n = base, 1
+    while title in used:
+        n += 1
+        suffix = f" ({n})"
+        title = base[:31 - len(suffix)] + suffix
+    used.add(title)
+    return title
+
+
+def write_results_sheet(ws, histories, school_name, level_name, academic_year, theory, practical, progress=None):
+    """
+    Write the class results layout (title, two header rows, one row per history) to ``ws``.
+
+    Args:
+        ws: a write-only worksheet with nothing appended yet.
+        histories (iterable): StudentHistory rows in output order.
+        theory, practical (list): ``(Subject id, name)`` column lists.
+        progress (callable): called as ``progress(rows written)`` every 100 rows.
+
+    Returns:
+        int: number of student rows written.
+    """
+    theory_subjects = [name for _, name in theory]
+    practical_subjects = [name for _, name in practical]
+    subject_columns = {'subject_columns': [subject_id for subject_id, _ in theory + practical]}
+
+    # --- คำนวณจำนวนคอลัมน์ทั้งหมด ---
+    subject_count = len(theory_subjects) + len(practical_subjects)
+    last_col = 2 + subject_count + len(SUMMARY_TITLES)
+    last_col_letter = get_column_letter(last_col)
+
+    # --- ความกว้างคอลัมน์ (ต้องกำหนดก่อนเขียนแถวแรก) ---
+    for idx in range(1, last_col + 1):
+        col_letter = get_column_letter(idx)
+        if idx == 1:
+            ws.column_dimensions[col_letter].width = 7   # ลำดับ
+        elif idx == 2:
+            ws.column_dimensions[col_letter].width = 22  # ชื่อ
+        elif idx < 3 + subject_count:
+            ws.column_dimensions[col_letter].width = 5   # วิชา
+        else:
+            ws.column_dimensions[col_letter].width = 13  # คะแนนรวม ฯลฯ
+
+    # --- โลโก้ตรงกลาง (แถว 1–2) ---
+    if os.path.exists(LOGO_PATH):
+        logo = XLImage(LOGO_PATH)
+        logo.width = 80
+        logo.height = 80
+        ws.add_image(logo, 'F1')  # ประมาณกลางหน้า
+
+    for _ in range(4):
+        ws.append([])
+
+    # --- แถว 5: ชื่อสมาคมฯ / แถว 6: โรงเรียน จังหวัด ---
+    ws.merged_cells.add(f'A5:{last_col_letter}5')
+    ws.append(styled_row(ws, [
+        f'สมาคมวิชาการศาสนาอิสลามภาคฟัรฎูกิฟายะห์ ปีการศึกษา {thai_year_text(academic_year)} '
+        f'ระดับชั้นปี {level_name or "ทุกระดับชั้น"}'
+    ], 'result_title'))
+    ws.merged_cells.add(f'A6:{last_col_letter}6')
+    ws.append(styled_row(ws, [f'{school_name or "ทุกโรงเรียน"} {PROVINCE}'], 'result_subtitle'))
+    ws.append([])
+
+    # --- หัวตารางหลัก (แถว 8) ---
+    start_row = 8
+    header = ['ลำดับ', 'ชื่อ-สกุล']
+    ws.merged_cells.add(f'A{start_row}:A{start_row + 1}')
+    ws.merged_cells.add(f'B{start_row}:B{start_row + 1}')
+    col_index = 3
+    for title, subjects in (('ภาคทฤษฎี', theory_subjects), ('ภาคปฏิบัติ', practical_subjects)):
+        if subjects:
+            end_col = col_index + len(subjects) - 1
+            ws.merged_cells.add(f'{get_column_letter(col_index)}{start_row}:{get_column_letter(end_col)}{start_row}')
+            header += [title] + [None] * (len(subjects) - 1)
+            col_index = end_col + 1
+    ws.merged_cells.add(f'{get_column_letter(col_index)}{start_row}:{last_col_letter}{start_row}')
+    header += ['สรุปผล'] + [None] * (len(SUMMARY_TITLES) - 1)
+    ws.append(styled_row(ws, header, 'result_header'))
+
+    # --- Subheader: วิชา + สรุป (แถว 9) ---
+    ws.append(
+        styled_row(ws, [None, None], 'result_header')
+        + styled_row(ws, theory_subjects + practical_subjects, 'result_subject')
+        + styled_row(ws, SUMMARY_TITLES, 'result_header')
+    )
+
+    # --- ข้อมูลนักเรียน ---
+    idx = 0
+    chunk = []
+    for history in histories:
+        chunk.append(history)
+        if len(chunk) < EXPORT_CHUNK_SIZE:
+            continue
+        idx = write_result_rows(ws, attach_subject_columns(chunk, subject_columns), idx, progress)
+        chunk = []
+    if chunk:
+        idx = write_result_rows(ws, attach_subject_columns(chunk, subject_columns), idx, progress)
+    return idx
+
+
+def write_result_rows(ws, histories, idx, progress=None):
+    """Append one chunk of student rows; returns the last row number written."""
+    for student in histories:
+        idx += 1
+        ws.append(styled_row(ws, [
+            idx,
+            student.student_name,
+            *student.subject_columns,
+            student.obtained_marks or 0,
+            round(student.grade_percentage, 1) if student.grade_percentage is not None else '-',
+            student.pass_or_fail or '-',
+            f"{student.class_rank}/{student.class_size}" if student.class_rank else '-',
+            student.unit_percentile if student.unit_percentile is not None else '-',
+        ], 'result_cell'))
+        if progress and idx % 100 == 0:
+            progress(idx)
+    return idx
+
+
+def build_student_results_workbook(school_name, level_name, academic_year, progress=None):
+    """
+    Build the class results workbook; returns ``(workbook, file name)``.
+
+    The workbook is write-only and histories are read ``EXPORT_CHUNK_SIZE`` at
+    a time, so memory does not grow with the number of rows. Call
+    ``wb.save()`` exactly once.
+    """
+    histories = filtered_histories(school_name, level_name, academic_year).order_by('id')
+    theory, practical = result_subjects()
+
+    wb = openpyxl.Workbook(write_only=True)
+    add_result_styles(wb)
+    ws = wb.create_sheet("ผลการเรียน")
+    write_results_sheet(
+        ws, histories.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        school_name, level_name, academic_year, theory, practical, progress,
+    )
+
+    # --- ชื่อไฟล์ ---
+    filename = f"ผลการเรียน_{school_name or 'ทุกโรงเรียน'}_{thai_year_text(academic_year)}.xlsx"
+    return wb, filename
+
+
+def build_unit_workbook(academic_year, level_name=None, school_names=None, progress=None):
+    """
+    One workbook for a whole exam unit: a summary sheet, then a sheet per (school, level).
+
+    Histories come from a single query ordered by school, level and id and are
+    split into sheets in one pass with :func:`itertools.groupby`; the summary
+    (students, passed, failed and average percentage per school) is totalled
+    during the same pass.
+
+    Args:
+        academic_year (str): Gregorian academic year.
+        level_name (str): optional, limit to one level.
+        school_names (list): optional, limit to these schools.
+        progress (callable): called as ``progress(rows written)``.
+
+    Returns:
+        tuple: ``(workbook, file name)``; call ``wb.save()`` exactly once.
+    """
+    histories = filtered_histories(level_name=level_name, academic_year=academic_year)
+    if school_names is not None:
+        histories = histories.filter(school_name__in=school_names)
+    histories = histories.order_by('school_name', 'level_name', 'id').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    theory, practical = result_subjects()
+
+    wb = openpyxl.Workbook(write_only=True)
+    add_result_styles(wb)
+    summary_ws = wb.create_sheet("สรุป")
+    used_titles = {"สรุป"}
+
+    totals = {}
+    done = 0
+    for (school_name, group_level), group in groupby(histories, key=lambda h: (h.school_name, h.level_name)):
+        school_totals = totals.setdefault(school_name, {'students': 0, 'passed': 0, 'percentage': 0})
+
+        def counted(rows):
+            for history in rows:
+                school_totals['students'] += 1
+                school_totals['passed'] += history.pass_or_fail == "ผ่าน"
+                school_totals['percentage'] += float(history.grade_percentage or 0)
+                yield history
+
+        ws = wb.create_sheet(sheet_title(f"{school_name or '-'} {group_level or '-'}", used_titles))
+        offset = done
+        done += write_results_sheet(
+            ws, counted(group), school_name, group_level, academic_year, theory, practical,
+            progress=(lambda n: progress(offset + n)) if progress else None,
+        )
+        if progress:
+            progress(done)
+
+    for col_letter, width in zip('ABCDE', (40, 15, 10, 10, 15)):
+        summary_ws.column_dimensions[col_letter].width = width
+    summary_ws.merged_cells.add('A1:E1')
+    summary_ws.append(styled_row(summary_ws, [
+        f'สรุปผลการเรียน ปีการศึกษา {thai_year_text(academic_year)} {level_name or "ทุกระดับชั้น"}'
+    ], 'result_title'))
+    summary_ws.append(styled_row(summary_ws, UNIT_SUMMARY_TITLES, 'result_header'))
+    for school_name, school_totals in totals.items():
+        students = school_totals['students']
+        summary_ws.append(styled_row(summary_ws, [
+            school_name or '-',
+            students,
+            school_totals['passed'],
+            students - school_totals['passed'],
+            round(school_totals['percentage'] / students, 2) if students else 0,
+        ], 'result_cell'))
+    all_students = sum(t['students'] for t in totals.values())
+    all_passed = sum(t['passed'] for t in totals.values())
+    all_percentage = sum(t['percentage'] for t in totals.values())
+    summary_ws.append(styled_row(summary_ws, [
+        'รวม', all_students, all_passed, all_students - all_passed,
+        round(all_percentage / all_students, 2) if all_students else 0,
+    ], 'result_header'))
+
+    filename = f"ผลการเรียน_หน่วยสอบ_{level_name or 'ทุกระดับชั้น'}_{thai_year_text(academic_year)}.xlsx"
+    return wb, filename
+
+
+def build_student_list_workbook(student_list):
+    """
+    The student list as a write-only workbook; call ``wb.save()`` exactly once.
+
+    Args:
+        student_list (dict): from ``student_lists.build_student_list``.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    add_result_styles(wb)
+    ws = wb.create_sheet("รายชื่อนักเรียน")
+    for col_letter, width in zip('ABCDEF', (7, 20, 20, 10, 35, 15)):
+        ws.column_dimensions[col_letter].width = width
+    ws.merged_cells.add('A1:F1')
+    ws.append(styled_row(ws, [student_list['school']], 'result_title'))
+    ws.merged_cells.add('A2:F2')
+    ws.append(styled_row(ws, [header_text(student_list)], 'result_subtitle'))
+    ws.append(styled_row(ws, STUDENT_LIST_HEADERS, 'result_header'))
+    for row in student_list['rows']:
+        ws.append(styled_row(ws, row, 'result_cell'))
+    return wb
+
+
+def _write_school_workbook(args):
+    academic_year, level_name, school_name, directory = args
+    wb, _ = build_unit_workbook(academic_year, level_name, school_names=[school_name])
+    path = os.path.join(directory, f"{sheet_title(school_name or '-', set())}.xlsx")
+    wb.save(path)
+    return path
+
+
+def write_unit_workbooks_parallel(academic_year, directory, level_name=None, workers=4):
+    """
+    Write one workbook per school into ``directory`` using a process pool.
+
+    openpyxl cannot merge workbooks, so for large units the parallel form
+    splits by school: each process runs :func:`build_unit_workbook` for one
+    school. Returns the list of written paths.
+    """
+    histories = filtered_histories(level_name=level_name, academic_year=academic_year)
+    schools = list(histories.values_list('school_name', flat=True).distinct().order_by('school_name'))
+    # connection ที่เปิดอยู่ห้ามส่งต่อให้ process ลูก
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(
+            _write_school_workbook,
+            [(academic_year, level_name, school_name, directory) for school_name in schools],
+        ))